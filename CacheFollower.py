@@ -0,0 +1,91 @@
+import abc
+import hashlib
+
+from SqliteDatabase import SqliteDatabase
+
+
+class CacheFollower:
+    """Something kept in its own SQLite file that follows the cached team-season tables, like PlayerIndex and
+    DerivedAggregates. The scrapers hand it every table they cache (SportsDataScraper._track_derived), and sync()
+    catches up on whatever was cached some other way.
+
+    It remembers a hash of every table it has taken in, in a sources table keyed by (league, table_name, year,
+    team), so a table whose text hasn't changed is skipped outright. Subclasses say which tables they want
+    (_follows) and fold the changed ones in (_apply), in the same transaction that checks the hashes."""
+    __metaclass__ = abc.ABCMeta
+
+    _sync_batch_size = 1000  # tables read from the cache at a time, and folded in per transaction, in sync()
+
+    def __init__(self, db_filename, schema, cache_store=None, upgrade=None):
+        self._cache_store = cache_store
+        # autocommit, so updates can take the write lock up front with BEGIN IMMEDIATE
+        self._db = SqliteDatabase(db_filename, schema, autocommit=True, upgrade=upgrade)
+
+    @property
+    def cache_store(self):
+        if self._cache_store is None:
+            from SportsDataScraper import SportsDataScraper
+            return SportsDataScraper._cache_store
+        return self._cache_store
+
+    def _connection(self):
+        return self._db.connection()
+
+    def on_cache_write(self, data_by_filename):
+        # the cache listener: anything _follows doesn't want is ignored
+        store = self.cache_store
+        return self.update_many((store.key_for(f), data) for f, data in data_by_filename.items())
+
+    def update(self, key, csv_text):
+        return self.update_many([(key, csv_text)])
+
+    def update_many(self, items):
+        # items are (CacheKey, csv text); returns how many tables actually changed something
+        items = [(key, csv_text or '') for key, csv_text in items if key.year and key.team and self._follows(key)]
+        if not items:
+            return 0
+
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            changed = []
+            for key, csv_text in items:
+                content_hash = hashlib.sha1(csv_text.encode('utf-8')).hexdigest()
+                row = conn.execute('SELECT content_hash FROM sources WHERE league = ? AND table_name = ? '
+                                   'AND year = ? AND team = ?', (key.league, key.table, key.year, key.team)).fetchone()
+                if not row or row[0] != content_hash:
+                    changed.append((key, csv_text, content_hash))
+            if changed:
+                self._apply(conn, changed)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return len(changed)
+
+    def sync(self, league='nhl'):
+        # takes in every cached table that's new or different since it was last seen; returns how many
+        store = self.cache_store
+        keys = {}
+        for filename in store.filenames():
+            key = store.key_for(filename)
+            if key.league == league and key.year and key.team and self._follows(key):
+                keys[filename] = key
+
+        # tables go in large batches, so anything a lot of them touch is only redone once per batch
+        filenames = sorted(keys, key=lambda f: keys[f])
+        changed = 0
+        for i in range(0, len(filenames), self._sync_batch_size):
+            batch = filenames[i:i + self._sync_batch_size]
+            data = store.read_many(batch)
+            changed += self.update_many((keys[f], data[f]) for f in batch if f in data)
+        return changed
+
+    @abc.abstractmethod
+    def _follows(self, key):
+        """Whether a team-season table (a CacheKey with a year and a team) is one of ours."""
+
+    @abc.abstractmethod
+    def _apply(self, conn, changed):
+        """Folds in [(CacheKey, csv text, content hash)], recording each hash in sources, inside the caller's
+        transaction."""
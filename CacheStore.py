@@ -0,0 +1,379 @@
+import collections
+import csv
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from SqliteDatabase import SqliteDatabase
+
+
+# every cached table is identified by these, e.g. ('nhl', 2017, 'PIT', 'skaters') for
+# cache/nhl/teams/2017/PIT/skaters.csv, or ('nhl', 2017, '', 'seasons') for cache/nhl/seasons/2017.csv.
+# anything else under the league directory keeps its relative path as the table name, with no year or team.
+CacheKey = collections.namedtuple('CacheKey', ['league', 'year', 'team', 'table'])
+
+
+class FileCacheStore:
+    """The original cache layout: one csv file per table under cache/<league>/..."""
+
+    def __init__(self, cache_root=None):
+        self._cache_root = cache_root or os.path.join(os.path.curdir, 'cache')
+
+    @property
+    def cache_root(self):
+        return self._cache_root
+
+    def read(self, filename):
+        data = None
+        if os.path.exists(filename):
+            with open(filename, 'r') as copy_file:
+                data = copy_file.read()
+        return data
+
+    def read_many(self, filenames):
+        ret_val = {}
+        for filename in filenames:
+            data = self.read(filename)
+            if data is not None:
+                ret_val[filename] = data
+        return ret_val
+
+    def write(self, filename, data):
+        cache_dir = os.path.dirname(os.path.realpath(filename))
+        os.makedirs(cache_dir, exist_ok=True)  # several crawler threads may race to create the same directory
+
+        # write then rename, so other threads and processes sharing the cache never read a half-written table
+        temp_filename = '{0}.{1}.{2}.tmp'.format(filename, os.getpid(), threading.get_ident())
+        with open(temp_filename, 'w') as debug_file:
+            debug_file.write(data)
+        os.replace(temp_filename, filename)
+
+    def write_many(self, data_by_filename):
+        for filename, data in data_by_filename.items():
+            self.write(filename, data)
+
+    def exists(self, filename):
+        return filename in self.exists_many([filename])
+
+    def exists_many(self, filenames):
+        return set(f for f in filenames if os.path.exists(f))
+
+    def stat_many(self, filenames):
+        # {filename: (mtime, size)} for the ones that exist, so a copy held in memory can tell it's out of date
+        # (say, another WorkQueue worker rewrote the table)
+        ret_val = {}
+        for filename in filenames:
+            try:
+                stat = os.stat(filename)
+            except OSError:
+                continue
+            ret_val[filename] = (stat.st_mtime_ns, stat.st_size)
+        return ret_val
+
+    def read_columns(self, filename, columns):
+        # tables are stored as csv text, so this still reads and parses the whole table; it only hands back less
+        data = self.read(filename)
+        return FileCacheStore.select_columns(data, columns) if data is not None else None
+
+    def filenames(self):
+        for directory, subdirectories, files in os.walk(self._cache_root):
+            for f in files:
+                if f.endswith('.csv'):
+                    yield os.path.join(directory, f)
+
+    def key_for(self, filename):
+        relative = os.path.relpath(os.path.realpath(filename), os.path.realpath(self._cache_root))
+        parts = os.path.splitext(relative)[0].split(os.sep)
+        league, rest = parts[0], parts[1:]
+
+        if len(rest) == 4 and rest[0] == 'teams' and rest[1].isdigit():
+            return CacheKey(league, int(rest[1]), rest[2], rest[3])
+        if len(rest) == 2 and rest[0] == 'seasons' and rest[1].isdigit():
+            return CacheKey(league, int(rest[1]), '', 'seasons')
+        return CacheKey(league, 0, '', '/'.join(rest))
+
+    def filename_for(self, key):
+        if key.table == 'seasons' and key.year:
+            relative = os.path.join(key.league, 'seasons', str(key.year))
+        elif key.year and key.team:
+            relative = os.path.join(key.league, 'teams', str(key.year), key.team, key.table)
+        else:
+            relative = os.path.join(key.league, *key.table.split('/'))
+        return os.path.join(self._cache_root, relative + '.csv')
+
+    @staticmethod
+    def select_columns(data, columns):
+        # the header is the first of the first two lines that mentions any of the columns we want,
+        # since a lot of tables start with a row that only categorizes the stats (e.g. ",,,Scoring,,,")
+        with io.StringIO(data) as csv_file:
+            rows = list(csv.reader(csv_file))
+
+        header_index = 0
+        for i, row in enumerate(rows[:2]):
+            if any(c in row for c in columns):
+                header_index = i
+                break
+
+        header = rows[header_index] if rows else []
+        indexes = [header.index(c) for c in columns if c in header]
+
+        ret_val = []
+        for row in rows[header_index:]:
+            ret_val.append([row[i] if i < len(row) else '' for i in indexes])
+        return ret_val
+
+
+class SqliteCacheStore(FileCacheStore):
+    """Keeps every cached table in a single SQLite file keyed by (league, year, team, table), so a warm-cache
+    run does a handful of indexed queries instead of stat-ing and opening tens of thousands of tiny files.
+    Callers keep using the same cache filenames; they're only turned into keys. The file tree can still
+    be imported and exported with import_tree and export_tree."""
+
+    __batch_size = 200  # 4 bound parameters per key, which keeps us under older SQLite builds' limit of 999
+
+    def __init__(self, db_filename=None, cache_root=None):
+        super().__init__(cache_root)
+        self._db = SqliteDatabase(db_filename or os.path.join(self._cache_root, 'cache.sqlite3'), schema=(
+            'CREATE TABLE IF NOT EXISTS cached_tables ('
+            'league TEXT NOT NULL, year INTEGER NOT NULL, team TEXT NOT NULL, '
+            'table_name TEXT NOT NULL, data TEXT NOT NULL, '
+            'PRIMARY KEY (league, year, team, table_name))'))
+        self._connection()  # the file and its table are made up front, so a bad path fails here
+
+    def _connection(self):
+        return self._db.connection()
+
+    def read(self, filename):
+        return self.read_many([filename]).get(filename)
+
+    def read_many(self, filenames):
+        ret_val = {}
+        keys = {self.key_for(f): f for f in filenames}
+        for key, data in self.__select(list(keys), 'data'):
+            ret_val[keys[key]] = data
+        return ret_val
+
+    def write(self, filename, data):
+        self.write_many({filename: data})
+
+    def write_many(self, data_by_filename):
+        rows = [tuple(self.key_for(f)) + (data,) for f, data in data_by_filename.items()]
+        with self._connection() as conn:  # one transaction for the whole batch
+            conn.executemany('INSERT OR REPLACE INTO cached_tables (league, year, team, table_name, data) '
+                             'VALUES (?, ?, ?, ?, ?)', rows)
+
+    def exists_many(self, filenames):
+        keys = {self.key_for(f): f for f in filenames}
+        return set(keys[key] for key, _ in self.__select(list(keys), '1'))
+
+    def stat_many(self, filenames):
+        return None  # rows don't keep a modification time, so copies held in memory are trusted as they are
+
+    def filenames(self):
+        for row in self._connection().execute('SELECT league, year, team, table_name FROM cached_tables'):
+            yield self.filename_for(CacheKey(*row))
+
+    def import_tree(self, cache_root=None):
+        # pull an existing cache/ file tree into the database
+        file_store = FileCacheStore(cache_root or self._cache_root)
+        batch = {}
+        for filename in file_store.filenames():
+            batch[self.filename_for(file_store.key_for(filename))] = file_store.read(filename)
+            if len(batch) >= SqliteCacheStore.__batch_size:
+                self.write_many(batch)
+                batch = {}
+        self.write_many(batch)
+
+    def export_tree(self, cache_root=None):
+        # and write the database back out in the original layout
+        file_store = FileCacheStore(cache_root or self._cache_root)
+        for row in self._connection().execute('SELECT league, year, team, table_name, data FROM cached_tables'):
+            file_store.write(file_store.filename_for(CacheKey(*row[:4])), row[4])
+
+    def __select(self, keys, column):
+        conn = self._connection()
+        for i in range(0, len(keys), SqliteCacheStore.__batch_size):
+            batch = keys[i:i + SqliteCacheStore.__batch_size]
+            where = ' OR '.join(['(league = ? AND year = ? AND team = ? AND table_name = ?)'] * len(batch))
+            params = [value for key in batch for value in key]
+            query = 'SELECT league, year, team, table_name, {0} FROM cached_tables WHERE {1}'.format(column, where)
+            for row in conn.execute(query, params):
+                yield CacheKey(*row[:4]), row[4]
+
+
+class MemoryCacheStore:
+    """An LRU of recently read and written tables in front of another store (a FileCacheStore by default), so a
+    table that's read over and over in one run (team_identities.csv, the franchise lists, the season files) only
+    touches the disk once. Entries are keyed by CacheKey, so './cache/nhl/x.csv' and 'cache/nhl/x.csv' are one
+    entry, and the least recently used ones are dropped once they add up to more than max_bytes.
+    preload() reads a whole slice of the cache into memory in one sweep, on a thread pool.
+
+    Other processes can share the cache (see WorkQueue.py), so before an entry is served the file's mtime and size
+    are checked against the ones it was read with, and a table that's changed underneath us is read again."""
+
+    def __init__(self, store=None, max_bytes=128 * 1024 * 1024, preload_threads=8, max_keys=64 * 1024):
+        self._store = store or FileCacheStore()
+        self._max_bytes = max_bytes
+        self._preload_threads = preload_threads
+        self._max_keys = max_keys
+        self._entries = collections.OrderedDict()  # CacheKey -> data, least recently used first
+        self._stamps = {}  # CacheKey -> the store's (mtime, size) for the data we have, or None if we don't know it
+        # filename -> CacheKey, since working one out means a realpath, which hits the disk. least recently used
+        # first, and capped at max_keys, since a walk over the whole cache would otherwise leave every filename in here
+        self._keys = collections.OrderedDict()
+        self._keys_lock = threading.Lock()  # key_for is called with and without self._lock held
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._lock = threading.Lock()
+
+    @property
+    def store(self):
+        return self._store
+
+    @property
+    def cache_root(self):
+        return self._store.cache_root
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self._hits, 'misses': self._misses, 'evictions': self._evictions,
+                    'entries': len(self._entries), 'bytes': self._bytes, 'max_bytes': self._max_bytes}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._stamps.clear()
+            self._bytes = 0
+
+    def read(self, filename):
+        return self.read_many([filename]).get(filename)
+
+    def read_many(self, filenames):
+        ret_val = {}
+        with self._lock:
+            held = [f for f in filenames if self.key_for(f) in self._entries]
+        # stat outside the lock, so threads reading different tables don't queue up behind each other's disk
+        stamps = self._store.stat_many(held)
+        missing = []
+        with self._lock:
+            for filename in filenames:
+                key = self.key_for(filename)
+                if key in self._entries and (stamps is None or stamps.get(filename) == self._stamps.get(key)):
+                    self._entries.move_to_end(key)
+                    ret_val[filename] = self._entries[key]
+                    self._hits += 1
+                else:
+                    missing.append(filename)
+                    self._misses += 1
+
+        if missing:
+            self.__read_through(missing, ret_val)
+        return ret_val
+
+    def write(self, filename, data):
+        self.write_many({filename: data})
+
+    def write_many(self, data_by_filename):
+        self._store.write_many(data_by_filename)
+        # stamped as unknown: by the time we could stat it, someone else may have written it again. the first read
+        # goes back to the store once, and stamps it then
+        self.__remember(data_by_filename, {})
+
+    def exists(self, filename):
+        return filename in self.exists_many([filename])
+
+    def exists_many(self, filenames):
+        with self._lock:
+            in_memory = set(f for f in filenames if self.key_for(f) in self._entries)
+        return in_memory | self._store.exists_many([f for f in filenames if f not in in_memory])
+
+    def read_columns(self, filename, columns):
+        data = self.read(filename)
+        return FileCacheStore.select_columns(data, columns) if data is not None else None
+
+    def filenames(self):
+        return self._store.filenames()
+
+    def key_for(self, filename):
+        with self._keys_lock:
+            key = self._keys.get(filename)
+            if key is not None:
+                self._keys.move_to_end(filename)
+                return key
+        key = self._store.key_for(filename)
+        with self._keys_lock:
+            self._keys[filename] = key
+            while len(self._keys) > self._max_keys:
+                self._keys.popitem(last=False)
+        return key
+
+    def filename_for(self, key):
+        return self._store.filename_for(key)
+
+    def preload(self, years=None, teams=None, tables=None, league=None):
+        # reads every cached table matching the filters into memory; returns how many were read.
+        # years, teams and tables are collections to match against; anything left as None matches everything
+        years = set(int(y) for y in years) if years is not None else None
+        teams = set(teams) if teams is not None else None
+        tables = set(tables) if tables is not None else None
+
+        wanted = []
+        for filename in self._store.filenames():
+            key = self.key_for(filename)
+            if (league is not None and key.league != league) or (years is not None and key.year not in years):
+                continue
+            if (teams is not None and key.team not in teams) or (tables is not None and key.table not in tables):
+                continue
+            wanted.append(filename)
+        return self.preload_files(wanted)
+
+    def preload_files(self, filenames):
+        # reads whichever of these tables exist and aren't in memory yet; returns how many were read
+        with self._lock:
+            wanted = [f for f in filenames if self.key_for(f) not in self._entries]
+
+        # the store's own bulk read, a chunk per thread, so slow opens and reads overlap
+        chunk_size = max(len(wanted) // (self._preload_threads * 4), 16)
+        chunks = [wanted[i:i + chunk_size] for i in range(0, len(wanted), chunk_size)]
+        if len(chunks) <= 1:
+            return len(self.__read_through(wanted, {})) if wanted else 0  # not worth starting threads for
+        read = 0
+        with ThreadPoolExecutor(max_workers=self._preload_threads) as pool:
+            for data_by_filename in pool.map(lambda chunk: self.__read_through(chunk, {}), chunks):
+                read += len(data_by_filename)
+        return read
+
+    def __read_through(self, filenames, ret_val):
+        # reads from the store into ret_val and remembers what was read. the stat comes first: if the file changes
+        # in between, the stamp is older than the data and the next read just fetches it again
+        stamps = self._store.stat_many(filenames)
+        from_store = self._store.read_many(filenames)
+        self.__remember({f: from_store.get(f) for f in filenames}, stamps)  # and forgets any that are gone now
+        ret_val.update(from_store)
+        return ret_val
+
+    def __remember(self, data_by_filename, stamps):
+        # stamps is the store's stat_many for these files (None if the store can't tell). None for data means the
+        # table isn't there (any more)
+        with self._lock:
+            for filename, data in data_by_filename.items():
+                key = self.key_for(filename)
+                if key in self._entries:
+                    self._bytes -= len(self._entries.pop(key))
+                    self._stamps.pop(key, None)
+                if data is None:
+                    continue
+                if len(data) > self._max_bytes:
+                    continue  # bigger than the whole budget, so there's no point pushing everything else out
+                self._entries[key] = data
+                self._stamps[key] = stamps.get(filename) if stamps is not None else None
+                self._bytes += len(data)
+
+            while self._bytes > self._max_bytes:
+                key, data = self._entries.popitem(last=False)
+                self._stamps.pop(key, None)
+                self._bytes -= len(data)
+                self._evictions += 1
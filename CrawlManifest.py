@@ -0,0 +1,99 @@
+import collections
+import hashlib
+import time
+
+from SqliteDatabase import SqliteDatabase
+
+
+ManifestRecord = collections.namedtuple('ManifestRecord', ['url', 'table', 'status', 'fetched_at', 'content_hash',
+                                                           'etag', 'last_modified', 'error'])
+
+
+class CrawlManifest:
+    """Remembers what happened to every (url, table) we've tried to scrape: whether it's in progress, done,
+    came back empty (e.g. the 2004-05 lockout) or failed, when it was fetched, a hash of what we got, and
+    the ETag/Last-Modified the server sent. A crashed crawl picks up where it stopped, known-empty tables
+    are never asked for again, and only stale tables are re-fetched, conditionally where the server allows."""
+
+    IN_PROGRESS = 'in_progress'
+    DONE = 'done'
+    EMPTY = 'empty'
+    FAILED = 'failed'
+
+    def __init__(self, db_filename):
+        self._db = SqliteDatabase(db_filename, schema=(
+            'CREATE TABLE IF NOT EXISTS work_units ('
+            'url TEXT NOT NULL, table_name TEXT NOT NULL, status TEXT NOT NULL, fetched_at REAL, '
+            'content_hash TEXT, etag TEXT, last_modified TEXT, error TEXT, '
+            'PRIMARY KEY (url, table_name))'))
+
+    def _connection(self, create=True):
+        # nothing touches the disk until something is recorded. looking things up in a manifest that doesn't
+        # exist yet (plan and status do) finds nothing, rather than leaving an empty one behind
+        return self._db.connection(create)
+
+    def get(self, url, table):
+        return self.get_many(url, [table]).get(table)
+
+    def get_many(self, url, tables):
+        conn = self._connection(create=False)
+        if conn is None:
+            return {}
+        placeholders = ','.join('?' * len(tables))
+        query = 'SELECT * FROM work_units WHERE url = ? AND table_name IN ({0})'.format(placeholders)
+        rows = conn.execute(query, [url] + list(tables))
+        return {row[1]: ManifestRecord(*row) for row in rows}
+
+    def mark_in_progress(self, url, tables):
+        with self._connection() as conn:
+            conn.executemany('INSERT INTO work_units (url, table_name, status) VALUES (?, ?, ?) '
+                             'ON CONFLICT (url, table_name) DO UPDATE SET status = excluded.status',
+                             [(url, t, CrawlManifest.IN_PROGRESS) for t in tables])
+
+    def record_results(self, url, data_by_table, etag=None, last_modified=None):
+        now = time.time()
+        rows = []
+        for table, data in data_by_table.items():
+            status = CrawlManifest.DONE if data else CrawlManifest.EMPTY
+            content_hash = hashlib.sha1((data or '').encode('utf-8')).hexdigest()
+            rows.append((url, table, status, now, content_hash, etag, last_modified))
+
+        with self._connection() as conn:
+            conn.executemany('INSERT OR REPLACE INTO work_units (url, table_name, status, fetched_at, content_hash, '
+                             'etag, last_modified, error) VALUES (?, ?, ?, ?, ?, ?, ?, NULL)', rows)
+
+    def record_not_modified(self, url, tables):
+        # the server says nothing changed, so the copy we have is as good as new
+        with self._connection() as conn:
+            conn.executemany('UPDATE work_units SET status = ?, fetched_at = ?, error = NULL '
+                             'WHERE url = ? AND table_name = ?',
+                             [(CrawlManifest.DONE, time.time(), url, t) for t in tables])
+
+    def record_failure(self, url, tables, error):
+        with self._connection() as conn:
+            conn.executemany('INSERT INTO work_units (url, table_name, status, error) VALUES (?, ?, ?, ?) '
+                             'ON CONFLICT (url, table_name) DO UPDATE SET status = excluded.status, '
+                             'error = excluded.error',
+                             [(url, t, CrawlManifest.FAILED, str(error)) for t in tables])
+
+    def unfinished(self):
+        # what a crashed or interrupted run left behind
+        conn = self._connection(create=False)
+        if conn is None:
+            return []
+        rows = conn.execute('SELECT * FROM work_units WHERE status IN (?, ?) ORDER BY url',
+                            (CrawlManifest.IN_PROGRESS, CrawlManifest.FAILED))
+        return [ManifestRecord(*row) for row in rows]
+
+    def summary(self):
+        conn = self._connection(create=False)
+        return dict(conn.execute('SELECT status, COUNT(*) FROM work_units GROUP BY status')) if conn else {}
+
+    @staticmethod
+    def is_fresh(record, max_age=None):
+        # with no max_age, anything we've finished is fresh forever; finished seasons don't change
+        if not record or record.status not in (CrawlManifest.DONE, CrawlManifest.EMPTY):
+            return False
+        if max_age is None:
+            return True
+        return record.fetched_at is not None and time.time() - record.fetched_at < max_age
@@ -0,0 +1,152 @@
+import collections
+import random
+import threading
+import time
+import urllib.parse
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+# key identifies the unit (e.g., (year, team)), run() does the work and is_cached() says
+# whether run() can be answered from disk without touching the network
+WorkUnit = collections.namedtuple('WorkUnit', ['key', 'run', 'is_cached'])
+
+
+class TokenBucket:
+    def __init__(self, rate, burst=1):
+        self._rate = float(rate)  # tokens per second
+        self._capacity = float(max(burst, 1))
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+                self._updated = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self._rate
+            time.sleep(wait)
+
+
+class HostRateLimiter:
+    """One token bucket per host, shared by every thread, so the whole crawl stays polite no matter
+    how many workers are running."""
+
+    def __init__(self, requests_per_minute=20, burst=3):
+        self._rate = requests_per_minute / 60.0
+        self._burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, url):
+        host = urllib.parse.urlsplit(url).netloc
+        with self._lock:
+            if host not in self._buckets:
+                self._buckets[host] = TokenBucket(self._rate, self._burst)
+            bucket = self._buckets[host]
+        bucket.acquire()
+
+
+class CrawlScheduler:
+    def __init__(self, workers=4, max_retries=3, backoff_seconds=2.0, debug=False, after_unit=None,
+                 permanent_errors=()):
+        self._workers = max(int(workers), 1)
+        # exception types that mean trying again is pointless, so they fail the unit straight away
+        self._permanent_errors = tuple(permanent_errors)
+        # called on the worker's own thread once it's done with a unit, e.g. to hand its browser back to a pool
+        self._after_unit = after_unit
+        self._max_retries = max_retries
+        self._backoff_seconds = backoff_seconds
+        self._debug = debug
+        self.failures = {}
+
+    def run(self, units):
+        return dict(self.iter_results(units))
+
+    def iter_results(self, units):
+        # yields (key, result) pairs as they finish. cached units are answered right here on the calling
+        # thread while the pool works on the ones that need the network, so they never queue behind a fetch.
+        # only a couple of units per worker are handed to the pool at a time, and each result is let go of as
+        # soon as it's yielded, so a whole crawl never sits in memory. closing the generator early cancels
+        # everything that hasn't started.
+        self.failures = {}
+        cached_units = []
+        network_units = collections.deque()
+        for unit in units:
+            if unit.is_cached and unit.is_cached():
+                cached_units.append(unit)
+            else:
+                network_units.append(unit)
+
+        pool = ThreadPoolExecutor(max_workers=self._workers)
+        futures = {}  # only the units in flight
+
+        def top_up():
+            while network_units and len(futures) < self._workers * 2:
+                unit = network_units.popleft()
+                futures[pool.submit(self._run_with_retries, unit)] = unit
+
+        try:
+            top_up()
+            for unit in cached_units:
+                try:
+                    result = unit.run()
+                except Exception as e:
+                    self.failures[unit.key] = e
+                else:
+                    yield unit.key, result
+                for key, result in self.__finished(futures, block=False):
+                    yield key, result
+                top_up()
+
+            while futures:
+                for key, result in self.__finished(futures, block=True):
+                    yield key, result
+                top_up()
+        finally:
+            for future in futures:
+                future.cancel()
+            pool.shutdown(wait=True)  # at most one unit per worker is still running by now
+
+    def __finished(self, futures, block):
+        # (key, result) for the futures that are done, dropping each from futures as it goes
+        done, _ = wait(list(futures), timeout=None if block else 0, return_when=FIRST_COMPLETED)
+        for future in done:
+            unit = futures.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                self.failures[unit.key] = e
+                self._dbg_print('Giving up on {0} after {1} attempts: {2}'.format(unit.key, self._max_retries + 1, e))
+                continue
+            yield unit.key, result
+
+    def _run_with_retries(self, unit):
+        try:
+            return self.__run_with_retries(unit)
+        finally:
+            if self._after_unit:
+                self._after_unit()
+
+    def __run_with_retries(self, unit):
+        attempt = 0
+        while True:
+            try:
+                return unit.run()
+            except Exception as e:
+                if attempt >= self._max_retries or isinstance(e, self._permanent_errors):
+                    raise
+                # exponential backoff with a little jitter, so failed workers don't all come back at once
+                delay = self._backoff_seconds * (2 ** attempt) * (1 + random.random() / 2)
+                self._dbg_print('{0} failed ({1}), retrying in {2:.1f}s'.format(unit.key, e, delay))
+                time.sleep(delay)
+                attempt += 1
+
+    def _dbg_print(self, s):
+        if self._debug:
+            print('[{0}]:\t{1}'.format(time.asctime(time.localtime()), s))
@@ -0,0 +1,270 @@
+import os
+
+from CacheFollower import CacheFollower
+from CacheStore import FileCacheStore
+
+
+class DerivedAggregates(CacheFollower):
+    """Rollups of the scraped skater and goalie tables, kept up to date as tables are written instead of being
+    recomputed from every csv: each team's season totals, each player's career line, and the shooting numbers
+    by age and position (which is what the Tableau dashboard in the README was built on).
+
+    Every player line from every (year, team, table) is kept as-is, and a rollup group is only recomputed from
+    those lines when one of its lines changes. When a refresh brings in one team-season's skaters, that's one
+    team total, the careers of ~25 players and a few dozen age/position groups, not the whole history.
+    Tables whose text hasn't changed since they were last folded in are skipped outright.
+
+    It's a CacheFollower: every scraper hands it the tables it caches, and sync() picks up whatever was cached some
+    other way. The first sync builds everything; later ones only read and hash the files."""
+
+    # the columns that get summed, for each kind of table
+    __stats = {
+        'skaters': ['GP', 'G', 'A', 'PTS', '+/-', 'PIM', 'S', 'TOI'],
+        'skaters_playoffs': ['GP', 'G', 'A', 'PTS', '+/-', 'PIM', 'S', 'TOI'],
+        'goalies': ['GP', 'GS', 'W', 'L', 'T/O', 'GA', 'SA', 'SV', 'SO', 'MIN'],
+        'goalies_playoffs': ['GP', 'GS', 'W', 'L', 'T/O', 'GA', 'SA', 'SV', 'SO', 'MIN'],
+    }
+    # rates worked out from the sums: name -> (numerator, denominator). shots weren't counted before 1959-60 (or
+    # shots against before 1983-84), so each rate only uses numerators from lines that have the denominator too
+    __rates = {'S%': ('G', 'S'), 'SV%': ('GA', 'SA')}
+    __batch_size = 200  # keeps every IN (...) under older SQLite builds' limit of 999 parameters
+    __seasons_stat = 'Player Seasons'  # how many player-seasons make up an age/position group, kept as a stat row
+
+    def __init__(self, db_filename=None, cache_store=None):
+        super().__init__(db_filename or os.path.join(os.path.curdir, 'cache', 'aggregates.sqlite3'), (
+            'CREATE TABLE IF NOT EXISTS sources (league TEXT NOT NULL, year INTEGER NOT NULL, '
+            'team TEXT NOT NULL, table_name TEXT NOT NULL, content_hash TEXT NOT NULL, '
+            'PRIMARY KEY (league, year, team, table_name));'
+            'CREATE TABLE IF NOT EXISTS player_lines (league TEXT NOT NULL, year INTEGER NOT NULL, '
+            'team TEXT NOT NULL, table_name TEXT NOT NULL, player_id TEXT NOT NULL, name TEXT, age INTEGER, '
+            'pos TEXT, stat TEXT NOT NULL, value REAL NOT NULL, '
+            'PRIMARY KEY (league, year, team, table_name, player_id, stat));'
+            'CREATE INDEX IF NOT EXISTS player_lines_by_player ON player_lines (league, table_name, player_id);'
+            'CREATE INDEX IF NOT EXISTS player_lines_by_age ON player_lines (league, table_name, age, pos);'
+            'CREATE TABLE IF NOT EXISTS team_totals (league TEXT NOT NULL, year INTEGER NOT NULL, '
+            'team TEXT NOT NULL, table_name TEXT NOT NULL, stat TEXT NOT NULL, value REAL NOT NULL, '
+            'PRIMARY KEY (league, year, team, table_name, stat));'
+            'CREATE TABLE IF NOT EXISTS careers (league TEXT NOT NULL, table_name TEXT NOT NULL, '
+            'player_id TEXT NOT NULL, name TEXT, first_year INTEGER, last_year INTEGER, seasons INTEGER, '
+            'teams INTEGER, PRIMARY KEY (league, table_name, player_id));'
+            'CREATE TABLE IF NOT EXISTS career_stats (league TEXT NOT NULL, table_name TEXT NOT NULL, '
+            'player_id TEXT NOT NULL, stat TEXT NOT NULL, value REAL NOT NULL, '
+            'PRIMARY KEY (league, table_name, player_id, stat));'
+            'CREATE TABLE IF NOT EXISTS age_position (league TEXT NOT NULL, table_name TEXT NOT NULL, '
+            'age INTEGER NOT NULL, pos TEXT NOT NULL, stat TEXT NOT NULL, value REAL NOT NULL, '
+            'PRIMARY KEY (league, table_name, age, pos, stat));'), cache_store, upgrade=DerivedAggregates.__upgrade)
+
+    @staticmethod
+    def tables():
+        return sorted(DerivedAggregates.__stats)
+
+    def _follows(self, key):
+        return key.table in DerivedAggregates.__stats
+
+    def _apply(self, conn, changed):
+        players = set()  # (league, table, player id) whose careers need redoing
+        age_groups = set()  # (league, table, age, pos)
+        for key, csv_text, content_hash in changed:
+            source = (key.league, key.year, key.team, key.table)
+            # the groups the old lines were in need redoing as much as the ones the new lines are in
+            for player_id, age, pos in conn.execute(
+                    'SELECT DISTINCT player_id, age, pos FROM player_lines WHERE league = ? AND year = ? '
+                    'AND team = ? AND table_name = ?', source):
+                players.add((key.league, key.table, player_id))
+                if age is not None:
+                    age_groups.add((key.league, key.table, age, pos))
+            conn.execute('DELETE FROM player_lines WHERE league = ? AND year = ? AND team = ? AND table_name = ?',
+                         source)
+
+            lines = DerivedAggregates.__player_lines(csv_text, key.table)
+            conn.executemany('INSERT OR REPLACE INTO player_lines (league, year, team, table_name, player_id, '
+                             'name, age, pos, stat, value) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                             [source + (player_id, name, age, pos, stat, value)
+                              for player_id, name, age, pos, stats in lines for stat, value in stats.items()])
+            for player_id, name, age, pos, stats in lines:
+                players.add((key.league, key.table, player_id))
+                if age is not None:
+                    age_groups.add((key.league, key.table, age, pos))
+
+            self.__update_team_totals(conn, source)
+            conn.execute('INSERT OR REPLACE INTO sources (league, year, team, table_name, content_hash) '
+                         'VALUES (?, ?, ?, ?, ?)', source + (content_hash,))
+
+        self.__update_careers(conn, sorted(players))
+        self.__update_age_groups(conn, sorted(age_groups))
+
+    def team_totals(self, table='skaters', league='nhl', year=None, team=None):
+        # [{'Year': 2017, 'Team': 'PIT', 'GP': ..., 'G': ..., 'S%': ...}, ...]
+        query = 'SELECT year, team, stat, value FROM team_totals WHERE league = ? AND table_name = ?'
+        params = [league, table]
+        if year is not None:
+            query += ' AND year = ?'
+            params.append(int(year))
+        if team is not None:
+            query += ' AND team = ?'
+            params.append(team)
+        return DerivedAggregates.__pivot(self._connection().execute(query + ' ORDER BY year, team', params),
+                                         ['Year', 'Team'])
+
+    def career(self, player_id, table='skaters', league='nhl'):
+        careers = self.careers(table, league, player_ids=[player_id])
+        return careers[0] if careers else None
+
+    def careers(self, table='skaters', league='nhl', player_ids=None, min_seasons=1):
+        # [{'Player': 'kesseph01', 'Name': 'Phil Kessel', 'From': 2007, 'To': 2017, 'Seasons': 11, 'Teams': 3,
+        #   'GP': ..., 'G': ..., 'S%': ...}, ...]
+        query = ('SELECT c.player_id, c.name, c.first_year, c.last_year, c.seasons, c.teams, s.stat, s.value '
+                 'FROM careers c JOIN career_stats s ON s.league = c.league AND s.table_name = c.table_name '
+                 'AND s.player_id = c.player_id WHERE c.league = ? AND c.table_name = ? AND c.seasons >= ?')
+        params = [league, table, min_seasons]
+        if player_ids is not None:
+            player_ids = list(player_ids)
+            if not player_ids:
+                return []
+            query += ' AND c.player_id IN ({0})'.format(','.join('?' * len(player_ids)))
+            params += player_ids
+        return DerivedAggregates.__pivot(self._connection().execute(query + ' ORDER BY c.player_id', params),
+                                         ['Player', 'Name', 'From', 'To', 'Seasons', 'Teams'])
+
+    def shooting_by_age_position(self, table='skaters', league='nhl', min_shots=0):
+        # [{'Age': 25, 'Pos': 'C', 'Player Seasons': 1234, 'G': ..., 'S': ..., 'S%': ...}, ...]. groups with
+        # nobody from after 1959-60 have no S (or S%), since shots weren't counted before then
+        rows = self._connection().execute(
+            'SELECT age, pos, stat, value FROM age_position WHERE league = ? AND table_name = ? '
+            'AND stat IN (?, ?, ?, ?) ORDER BY age, pos',
+            (league, table, DerivedAggregates.__seasons_stat, 'G', 'S', DerivedAggregates.__with('G', 'S')))
+        ret_val = []
+        for row in DerivedAggregates.__pivot(rows, ['Age', 'Pos']):
+            row[DerivedAggregates.__seasons_stat] = int(row.get(DerivedAggregates.__seasons_stat, 0))
+            if row.get('S', 0) >= min_shots:
+                ret_val.append(row)
+        return ret_val
+
+    @staticmethod
+    def __player_lines(csv_text, table_name):
+        # [(player id, name, age, pos, {stat: value})] for every player row; totals and blank cells are skipped
+        stat_columns = DerivedAggregates.__stats[table_name]
+        rows = FileCacheStore.select_columns(csv_text, ['Rk', 'Player', 'Age', 'Pos'] + stat_columns) \
+            if csv_text else []
+        if not rows or 'Player' not in rows[0]:
+            return []
+
+        header = rows[0]
+        ret_val = []
+        for row in rows[1:]:
+            cells = dict(zip(header, row))
+            if not cells.get('Rk', '').isdigit() or not cells.get('Player'):  # 'Team Total' and the like
+                continue
+
+            name, _, player_id = cells['Player'].rpartition('\\')
+            name = name or player_id
+            stats = {}
+            for stat in stat_columns:
+                try:
+                    stats[stat] = float(cells.get(stat, ''))
+                except ValueError:
+                    pass
+            for numerator, denominator in DerivedAggregates.__rates.values():
+                if numerator in stats and denominator in stats:
+                    stats[DerivedAggregates.__with(numerator, denominator)] = stats[numerator]
+
+            age = cells.get('Age', '')
+            pos = cells.get('Pos') or ('G' if table_name.startswith('goalies') else '')
+            ret_val.append((player_id, name, int(age) if age.isdigit() else None, pos, stats))
+        return ret_val
+
+    @staticmethod
+    def __update_team_totals(conn, source):
+        conn.execute('DELETE FROM team_totals WHERE league = ? AND year = ? AND team = ? AND table_name = ?', source)
+        conn.execute('INSERT INTO team_totals (league, year, team, table_name, stat, value) '
+                     'SELECT league, year, team, table_name, stat, SUM(value) FROM player_lines '
+                     'WHERE league = ? AND year = ? AND team = ? AND table_name = ? GROUP BY stat', source)
+
+    @staticmethod
+    def __update_careers(conn, players):
+        for league, table_name, player_ids in DerivedAggregates.__batches(players):
+            placeholders = ','.join('?' * len(player_ids))
+            params = [league, table_name] + player_ids
+            where = 'league = ? AND table_name = ? AND player_id IN ({0})'.format(placeholders)
+            conn.execute('DELETE FROM careers WHERE ' + where, params)
+            conn.execute('DELETE FROM career_stats WHERE ' + where, params)
+            # a player traded mid-season has a line with each team, but it's still one season
+            conn.execute('INSERT INTO careers (league, table_name, player_id, name, first_year, last_year, seasons, '
+                         'teams) SELECT league, table_name, player_id, MAX(name), MIN(year), MAX(year), '
+                         'COUNT(DISTINCT year), COUNT(DISTINCT team) FROM player_lines WHERE ' + where +
+                         ' GROUP BY player_id', params)
+            conn.execute('INSERT INTO career_stats (league, table_name, player_id, stat, value) '
+                         'SELECT league, table_name, player_id, stat, SUM(value) FROM player_lines WHERE ' + where +
+                         ' GROUP BY player_id, stat', params)
+
+    @staticmethod
+    def __update_age_groups(conn, age_groups):
+        for league, table_name, age, pos in age_groups:
+            params = (league, table_name, age, pos)
+            where = 'WHERE league = ? AND table_name = ? AND age = ? AND pos = ?'
+            conn.execute('DELETE FROM age_position ' + where, params)
+            conn.execute('INSERT INTO age_position (league, table_name, age, pos, stat, value) '
+                         'SELECT league, table_name, age, pos, stat, SUM(value) FROM player_lines ' + where +
+                         ' GROUP BY stat', params)
+            # counted once for the whole group, not per stat: a pre-1960 line has G but no S, and it's still a
+            # player-season in the group either way
+            conn.execute('INSERT INTO age_position (league, table_name, age, pos, stat, value) '
+                         'SELECT league, table_name, age, pos, ?, COUNT(DISTINCT year || \'/\' || player_id) '
+                         'FROM player_lines ' + where + ' GROUP BY league',
+                         (DerivedAggregates.__seasons_stat,) + params)
+
+    @staticmethod
+    def __upgrade(conn):
+        # age_position used to carry player_seasons on every stat's row, which split groups with pre-1960 lines
+        # in two. it's all derived from player_lines, so the old table is rebuilt rather than migrated
+        columns = [row[1] for row in conn.execute('PRAGMA table_info(age_position)')]
+        if 'player_seasons' not in columns:
+            return
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('DROP TABLE age_position')
+            conn.execute('CREATE TABLE age_position (league TEXT NOT NULL, table_name TEXT NOT NULL, '
+                         'age INTEGER NOT NULL, pos TEXT NOT NULL, stat TEXT NOT NULL, value REAL NOT NULL, '
+                         'PRIMARY KEY (league, table_name, age, pos, stat))')
+            DerivedAggregates.__update_age_groups(conn, list(conn.execute(
+                'SELECT DISTINCT league, table_name, age, pos FROM player_lines WHERE age IS NOT NULL')))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    @staticmethod
+    def __batches(players):
+        # (league, table, [player ids]) in batches small enough for one IN (...)
+        by_table = {}
+        for league, table_name, player_id in players:
+            by_table.setdefault((league, table_name), []).append(player_id)
+        for (league, table_name), player_ids in sorted(by_table.items()):
+            for i in range(0, len(player_ids), DerivedAggregates.__batch_size):
+                yield league, table_name, player_ids[i:i + DerivedAggregates.__batch_size]
+
+    @staticmethod
+    def __pivot(rows, label_columns):
+        # rows are (labels..., stat, value); one dict per distinct set of labels, with the rates worked out
+        ret_val = []
+        for row in rows:
+            labels = row[:len(label_columns)]
+            if not ret_val or ret_val[-1][1] != labels:
+                ret_val.append((dict(zip(label_columns, labels)), labels))
+            ret_val[-1][0][row[-2]] = row[-1]
+
+        for values, _ in ret_val:
+            for rate, (numerator, denominator) in sorted(DerivedAggregates.__rates.items()):
+                counted = values.pop(DerivedAggregates.__with(numerator, denominator), 0)
+                if values.get(denominator):
+                    values[rate] = counted / values[denominator]
+            # the site shows S% as a percentage and SV% as a fraction
+            if 'S%' in values:
+                values['S%'] = round(100.0 * values['S%'], 2)
+            if 'SV%' in values:
+                values['SV%'] = round(1.0 - values['SV%'], 3)
+        return [values for values, _ in ret_val]
+
+    @staticmethod
+    def __with(numerator, denominator):
+        return '{0} with {1}'.format(numerator, denominator)
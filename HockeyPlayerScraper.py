@@ -0,0 +1,136 @@
+import abc
+import collections
+import os
+
+from CrawlManifest import CrawlManifest
+from CrawlScheduler import WorkUnit
+from HttpTableBackend import PageNotFoundError
+from SportConfig import SportConfig
+from SportsDataScraper import SportsDataScraper as SDS
+
+
+# one scraped table from one player's page; frame is a pandas DataFrame
+PlayerTableRecord = collections.namedtuple('PlayerTableRecord', ['player', 'table', 'frame'])
+
+
+class HockeyPlayerScraper(SDS):
+    """Scrapes player pages like /players/k/kesseph01.html for every player on the rosters HockeyTeamScraper has
+    already cached. A player on 15 team-season rosters is still only one page load: the ids are collected and
+    de-duplicated across every roster first, and every table on a player's page is pulled from that one load."""
+
+    _config = SportConfig.NHL()
+
+    # e.g. '-SITE-/players/k/kesseph01.html', where the player token stands for 'k/kesseph01'
+    __player_url_base = SDS._site_token + '/players/' + SDS._player_token + '.html'
+    __table_list_name = '_tables'  # which tables the player's page had, so a warm cache knows what to read
+
+    @abc.abstractmethod
+    def scrape(self, start_year, end_year, read_cache=True, write_cache=True):
+        # everything ends up in the cache; use iter_players to do something with it as it comes in
+        for _ in self.__iter_player_pages(start_year, end_year, None, read_cache, write_cache):
+            pass
+
+    def iter_players(self, start_year=None, end_year=None, players=None, read_cache=True, write_cache=True):
+        # yields a PlayerTableRecord for every table on every player's page, as each page is scraped
+        from TableSchema import TableSchema  # pandas is only needed by callers who want frames
+
+        for player, tables in self.__iter_player_pages(start_year, end_year, players, read_cache, write_cache):
+            for table_name, csv_text in tables.items():
+                with self._metrics.span('assemble', player=player, table=table_name):
+                    frame = TableSchema.csv_to_frame(csv_text, table_name)
+                if 'Player' not in frame.columns:
+                    frame.insert(0, 'Player', player)
+                yield PlayerTableRecord(player, table_name, frame)
+
+    def get_roster_players(self, start_year=None, end_year=None):
+        # {player id: (name, last season on any cached roster)}, from every cached roster.csv in the year range.
+        # roster cells look like "Phil Kessel\kesseph01", same as the site's own csv
+        first, last = SDS.validate_start_end_years(start_year or self._config.minimum_year,
+                                                   end_year or self._config.maximum_year, self._config)
+        ret_val = {}
+        for key, filename in SDS._cached_tables('roster'):
+            if key.league != self._config.league_name or not first <= key.year <= last:
+                continue
+
+            for row in (SDS._read_cache_columns(filename, ['Player']) or [])[1:]:
+                name, _, player_id = (row[0] if row else '').rpartition('\\')
+                if not player_id:
+                    continue
+                if player_id not in ret_val or ret_val[player_id][1] < key.year:
+                    ret_val[player_id] = (name, key.year)
+        return ret_val
+
+    def get_player_tables(self, player_id, read_cache=True, write_cache=True, max_age=None):
+        # {table name: csv text} for every table on the player's page, from at most one page load
+        url = self.__get_url(player_id)
+        list_filename = self.__get_cache_filename(player_id, self.__table_list_name)
+
+        table_list = SDS._read_cache_data(list_filename) if read_cache else None
+        css_table_names = [t for t in (table_list or '').splitlines() if t]
+        if table_list is None or not self.__is_table_list_fresh(url, css_table_names, max_age):
+            # a player who's still playing picks up new tables (their first playoffs, say), so their list gets the
+            # same freshness rule as the tables themselves
+            try:
+                css_table_names = self.get_page_table_names(url)
+            except PageNotFoundError:
+                self._dbg_print('There is no page for player {0}.'.format(player_id))
+                return {}
+
+        css_names = {css: css.replace('#all_', '', 1) for css in css_table_names}
+        cache_filenames = {css: self.__get_cache_filename(player_id, t) for css, t in css_names.items()}
+        csv_tables = self.get_csv_tables(url, css_table_names, read_cache, write_cache, cache_filenames,
+                                         max_age=max_age) if css_table_names else {}
+
+        if write_cache and table_list != '\n'.join(css_table_names):
+            SDS._write_cache_data('\n'.join(css_table_names), list_filename, self._derived)
+
+        return {css_names[css]: data for css, data in csv_tables.items()}
+
+    def __iter_player_pages(self, start_year, end_year, players, read_cache=True, write_cache=True):
+        roster_players = self.get_roster_players(start_year, end_year)
+        if players is not None:
+            roster_players = {p: v for p, v in roster_players.items() if p in set(players)}
+        print('Scraping {0} players\' pages'.format(len(roster_players)))
+
+        units = []
+        for player_id, (name, last_season) in sorted(roster_players.items()):
+            # a player who's still playing has a page that's still changing
+            max_age = self._max_age_for_year(last_season)
+            units.append(WorkUnit(key=player_id,
+                                  run=lambda p=player_id, m=max_age: self.get_player_tables(p, read_cache,
+                                                                                            write_cache, m),
+                                  is_cached=lambda p=player_id, m=max_age: read_cache and m is None and
+                                  self.__is_cached(p)))
+
+        for player_id, tables in self._scheduler.iter_results(units):
+            if tables:
+                yield player_id, tables
+
+        for player_id, error in self._scheduler.failures.items():
+            print('Could not scrape player {0}: {1}'.format(player_id, error))
+
+    def __is_cached(self, player_id):
+        table_list = SDS._read_cache_data(self.__get_cache_filename(player_id, self.__table_list_name))
+        if table_list is None:
+            return False
+
+        filenames = [self.__get_cache_filename(player_id, t.replace('#all_', '', 1))
+                     for t in table_list.splitlines() if t]
+        return len(SDS._cached_filenames(filenames)) == len(filenames)
+
+    def __is_table_list_fresh(self, url, css_table_names, max_age):
+        # the list is as fresh as the last time the page was checked, which is when its tables were. with no
+        # max_age it's good forever, like they are
+        if max_age is None:
+            return True
+        if not self._manifest or not css_table_names:
+            return False
+        records = self._manifest.get_many(url, css_table_names)
+        return all(CrawlManifest.is_fresh(records.get(t), max_age) for t in css_table_names)
+
+    def __get_cache_filename(self, player_id, table_name):
+        return os.path.join(self._get_base_cache_path_for_sport(), 'players', player_id, '{0}.csv'.format(table_name))
+
+    def __get_url(self, player_id):
+        return self._site_url(HockeyPlayerScraper.__player_url_base).replace(
+            SDS._player_token, '{0}/{1}'.format(player_id[0], player_id))
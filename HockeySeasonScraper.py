@@ -1,81 +1,87 @@
 import abc
-import csv
-import io
 import os
 import re
 
-import pandas as pd
-
+from CrawlScheduler import WorkUnit
 from SportConfig import SportConfig
 from SportsDataScraper import SportsDataScraper
 
 
 class HockeySeasonScraper(SportsDataScraper):
-    _url_base = 'http://www.hockey-reference.com/leagues/NHL_' + \
+    _url_base = SportsDataScraper._site_token + '/leagues/NHL_' + \
                 SportsDataScraper._year_token + '.html'
 
     _config = SportConfig.NHL()
 
-    @staticmethod
-    def __get_url(year):
+    def _page_kind(self, url):
+        match = re.search('/leagues/NHL_([0-9]{4})\\.html$', url)
+        return ('season', int(match.group(1))) if match else super()._page_kind(url)
+
+    def __get_url(self, year):
         return re.sub(HockeySeasonScraper._year_token,
                       str(year),
-                      HockeySeasonScraper._url_base)
+                      self._site_url(HockeySeasonScraper._url_base))
 
     @staticmethod
     def __assemble_dataset(all_stats):
-        combined_years = pd.DataFrame()
-
-        for year in all_stats:
-            # remove header categorizing the stat
-            # and last row with calculated 'League Average' stats
-            year_stats = all_stats[year][1:-1]
-
-            '''Let's add a header for the Team Name field they left unlabeled.
-            Maybe they omit it so you don't join on it. For example, the
-            Winnipeg Jets (2011-) are not the same team as the Winnipeg
-            Jets (1979-1995); the former were previously known as the Atlanta
-            Thrashers and the latter are now known as the Arizona Coyotes.'''
-            found_header_row = False
-            if len(year_stats) > 0:
-                matched = re.sub('^Rk,,', 'Rk,Team,', year_stats[0])
-                if matched:
-                    found_header_row = True
-                header_row = 'Year,' + matched
-
-            if len(year_stats) > 1:  # prepend $year to non-header lines
-                year_stats = ['{0},{1}'.format(str(year), item) for item in year_stats[1:]]
-
-            if found_header_row and len(header_row):
-                year_stats.insert(0, header_row)  # put the header back up top
-
-            year_stats_string = ''.join(year_stats)
-            with io.StringIO(year_stats_string) as csv_file:
-                reader = list(csv.reader(csv_file))
-                if reader:  # Still cursing the 04-05 lockout a decade later!
-                    year_dataframe = pd.DataFrame(data=reader[1:],
-                                                  columns=reader[0],
-                                                  index=None)
-
-                    combined_years = combined_years.append(year_dataframe, ignore_index=True)
-
-        return combined_years
+        # TableSchema knows to drop the 'League Average' row and name the Team column they left unlabeled
+        from TableSchema import TableSchema  # pandas, only once there's something to assemble
+        year_frames = [TableSchema.read_frame(all_stats[year], 'seasons', year=year) for year in all_stats]
+        return TableSchema.concat(year_frames, 'seasons')
 
-    def __get_team_stats(self, year, read_cache=True, write_cache=True):
+    def plan_pages(self, start_year, end_year):
+        # every (year, team, page) a season scrape would load; seasons have no team
+        first, last = SportsDataScraper.validate_start_end_years(start_year, end_year, self._config)
+        return [(year, '', 'season') for year in range(first, last + 1)]
+
+    def remaining_pages(self, start_year, end_year):
+        # the plan_pages a scrape would still have to load, from the cache and the manifest alone
+        return [(year, team, page) for year, team, page in self.plan_pages(start_year, end_year)
+                if self.needs_fetch(self.__get_url(year), ['#all-stats'],
+                                    {'#all-stats': self.__get_cache_filename(year)}, self._max_age_for_year(year))]
+
+    def scrape_page(self, year, team='', page='season', read_cache=True, write_cache=True):
+        # one season's page, as {table name: csv text}
+        return {'seasons': self.__get_team_stats(year, read_cache, write_cache)}
+
+    def __get_cache_filename(self, year):
         cache_directory = os.path.join(self._get_base_cache_path_for_sport(), 'seasons')
-        cache_filename = os.path.join(cache_directory, str(year) + '.csv')
+        return os.path.join(cache_directory, str(year) + '.csv')
 
-        this_years_stats = self.get_csv_table(HockeySeasonScraper.__get_url(year), '#all-stats',
-                                              read_cache, write_cache, cache_filename)
+    def __get_team_stats(self, year, read_cache=True, write_cache=True):
+        cache_filename = self.__get_cache_filename(year)
+
+        this_years_stats = self.get_csv_table(self.__get_url(year), '#all-stats',
+                                              read_cache, write_cache, cache_filename,
+                                              max_age=self._max_age_for_year(year))
         return this_years_stats
 
     @abc.abstractmethod
     def scrape(self, start_year, end_year, read_cache=True, write_cache=True):
         first, last = SportsDataScraper.validate_start_end_years(start_year, end_year, self._config)
 
-        stats_dict = {}
         print('Scraping hockey team stats, {0} to {1}'.format(first, last))
-        for year in range(first, last):
-            stats_dict[year] = self.__get_team_stats(year)
-
-        return HockeySeasonScraper.__assemble_dataset(stats_dict)
+        years = list(range(first, last + 1))
+        cached_filenames = set()
+        if read_cache:
+            cached_filenames = self._cached_filenames([self.__get_cache_filename(y) for y in years])
+        # each season's file is read into memory just ahead of the unit that needs it, not all of them up front
+        preload = self._preloader([[self.__get_cache_filename(y)] for y in years] if read_cache else [])
+
+        def run(i, year):
+            preload(i)
+            return self.__get_team_stats(year, read_cache, write_cache)
+
+        units = [WorkUnit(key=year,
+                          run=lambda i=i, y=year: run(i, y),
+                          is_cached=lambda y=year: (self.__get_cache_filename(y) in cached_filenames
+                                                    and self._max_age_for_year(y) is None))
+                 for i, year in enumerate(years)]
+
+        stats_dict = self._scheduler.run(units)
+        for year, error in self._scheduler.failures.items():
+            print('Could not scrape the {0} season: {1}'.format(year, error))
+
+        stats_dict = {year: stats_dict[year] for year in sorted(stats_dict)}  # keep the seasons in order
+        with self._metrics.span('assemble', seasons=len(stats_dict)):
+            return HockeySeasonScraper.__assemble_dataset(stats_dict)
@@ -1,41 +1,184 @@
 import abc
+import collections
 import csv
 import io
 import os
 import re
 
+from CrawlScheduler import WorkUnit
 from SportConfig import SportConfig
 from SportsDataScraper import SportsDataScraper as SDS
+from TeamDirectory import TeamDirectory
+
+
+# one scraped table for one team-season; frame is a pandas DataFrame labelled with Year and Team columns
+TeamTableRecord = collections.namedtuple('TeamTableRecord', ['year', 'team', 'table', 'frame'])
 
 
 class HockeyTeamScraper(SDS):
     @property
     def all_team_names(self):
-        if not self.__team_names:
+        if self.__team_names is None:
             self.__team_names = self.__init_team_names()
         return self.__team_names
 
+    @property
+    def team_directory(self):
+        if self.__team_directory is None:
+            self.__team_directory = TeamDirectory(self.all_team_names, self.__defunct_tag)
+        return self.__team_directory
+
     _config = SportConfig.NHL()
 
-    __team_names = []
-    __url_base = 'http://www.hockey-reference.com/teams/'
-    __team_url_base = __url_base + SDS._team_token + '/' + SDS._year_token + '.html'
-    __url_regex = __url_base + '(.*)/'
+    __url_base_template = SDS._site_token + '/teams/'
+    __team_url_base = __url_base_template + SDS._team_token + '/' + SDS._year_token + '.html'
+    __url_regex = '/teams/(.*)/'
+    __page_regex = '/teams/[^/]+/([0-9]{4})(_games)?\\.html$'
+    # every table we'd take from each of a team-season's pages, if the page has it
+    __page_tables = {'team': ['roster', 'goalies', 'skaters', 'stats_adv_rs', 'stats_toi', 'shootout',
+                              'shootout_goalies', 'goalies_playoffs', 'skaters_playoffs', 'stats_adv_pl'],
+                     'games': ['games', 'games_playoffs']}
+    __playoff_tables = {'goalies_playoffs', 'skaters_playoffs', 'stats_adv_pl', 'games_playoffs'}
     __defunct_tag = ' (defunct)'
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.__team_names = None
+        self.__team_directory = None
+
+    @property
+    def __url_base(self):
+        return self._site_url(self.__url_base_template)
+
     @abc.abstractmethod
     def scrape(self, start_year, end_year, read_cache=True, write_cache=True):
-        return self.scrape_teams(start_year, end_year,
-                                 set([x['Abbrev'] for x in self.all_team_names]),
-                                 read_cache, write_cache)
+        return self.scrape_teams(start_year, end_year, None, read_cache, write_cache)
 
     def scrape_teams(self, start_year, end_year, teams, read_cache=True, write_cache=True):
-        first, last = SDS.validate_start_end_years(start_year, end_year, self._config)
+        # everything ends up in the cache; use iter_teams or scrape_to_file to do something with it as it comes in
+        for _ in self.__iter_team_seasons(start_year, end_year, teams, read_cache, write_cache):
+            pass
+
+    def plan_pages(self, start_year=None, end_year=None, teams=None):
+        # every (year, team, page) a team scrape would load, e.g. for handing out through a WorkQueue
+        first, last = SDS.validate_start_end_years(start_year or self._config.minimum_year,
+                                                   end_year or self._config.maximum_year, self._config)
+        return [(year, team, page) for year, team in self.team_directory.team_seasons(range(last, first - 1, -1), teams)
+                for page, url, table_names in self.__get_table_plan(year, team)]
+
+    def remaining_pages(self, start_year=None, end_year=None, teams=None):
+        # the plan_pages a scrape would still have to load, from team_identities.csv, the cache and the manifest
+        # alone. without a cached team list this would need the browser, so that's an error instead
+        if not SDS._cached_filenames([self.team_identities_filename]):
+            raise LookupError('There is no cached team list ({0}) to plan from yet; scrape the teams first.'
+                              .format(self.team_identities_filename))
 
-        for year in range(last, first, -1):
-            for team in teams:
-                # TODO: are we going to save this, or just write to disk?
-                self.__get_team_for_year(year, team, read_cache, write_cache)
+        ret_val = []
+        for year, team, page in self.plan_pages(start_year, end_year, teams):
+            url, table_names = {p: (u, t) for p, u, t in self.__get_table_plan(year, team)}[page]
+            cache_filenames = {'#all_' + t: self.__get_cache_filename(year, team, t) for t in table_names}
+            if self.needs_fetch(url, list(cache_filenames), cache_filenames, self._max_age_for_year(year)):
+                ret_val.append((year, team, page))
+        return ret_val
+
+    @property
+    def team_identities_filename(self):
+        return os.path.join(os.path.curdir, 'cache', self._config.league_name, 'team_identities.csv')
+
+    def scrape_page(self, year, team, page, read_cache=True, write_cache=True):
+        # just one of a team-season's pages ('team' or 'games'), as {table name: csv text}
+        if not self.__did_team_exist(team, year):
+            return {}
+        for plan_page, url, table_names in self.__get_table_plan(year, team):
+            if plan_page == page:
+                return self.__get_team_page_components(table_names, year, team, url, read_cache, write_cache)
+        raise ValueError('Team-seasons have no "{0}" page!'.format(page))
+
+    def iter_teams(self, start_year=None, end_year=None, teams=None, read_cache=True, write_cache=True):
+        # yields a TeamTableRecord for every table as soon as its team-season is scraped (or read from the cache),
+        # so callers can get started while the crawl is still running
+        from TableSchema import TableSchema  # pandas is only needed by callers who want frames
+
+        for year, team, tables in self.__iter_team_seasons(start_year, end_year, teams, read_cache, write_cache):
+            for table_name, csv_text in tables.items():
+                with self._metrics.span('assemble', year=year, team=team, table=table_name):
+                    frame = TableSchema.csv_to_frame(csv_text, table_name, year=year, team=team)
+                yield TeamTableRecord(year, team, table_name, frame)
+
+    def scrape_to_file(self, output_filename=None, start_year=None, end_year=None, read_cache=True, write_cache=True):
+        # for teams, output_filename is a directory that gets one consolidated csv per table (skaters.csv, ...)
+        if not output_filename:
+            return self.scrape(start_year or self._config.minimum_year, end_year or self._config.maximum_year,
+                               read_cache, write_cache)
+
+        from TableSinks import ConsolidatedCsvSink
+
+        self._dbg_print('Writing team stats ({0}-{1}) to directory: {2}'.format(start_year, end_year, output_filename))
+        # the headers are fixed before anything's written, so the csvs can be appended to (and read) as the crawl goes
+        columns = self.newest_columns(start_year, end_year, None, read_cache, write_cache)
+        with ConsolidatedCsvSink(output_filename, self._debug, columns) as sink:
+            sink.write_all(self.iter_teams(start_year, end_year, read_cache=read_cache, write_cache=write_cache))
+
+    def newest_columns(self, start_year=None, end_year=None, teams=None, read_cache=True, write_cache=True):
+        # {table name: [column, ...]} as of the newest season in the range, which tracks the most stats. a team
+        # that missed the playoffs has no playoff tables, so its teams are tried until every table that season has
+        # has turned up. the crawl needs these pages anyway, and they're cached, so nothing's loaded twice
+        from TableSchema import TableSchema
+
+        first, last = SDS.validate_start_end_years(start_year or self._config.minimum_year,
+                                                   end_year or self._config.maximum_year, self._config)
+        team_seasons = self.team_directory.team_seasons([last], teams)
+        wanted = set(t for year, team in team_seasons
+                     for page, url, table_names in self.__get_table_plan(year, team) for t in table_names)
+        ret_val = {}
+        for year, team in team_seasons:
+            if wanted.issubset(ret_val):
+                break
+            try:
+                tables = self.__get_team_for_year(year, team, read_cache, write_cache) or {}
+            except Exception as e:
+                self._dbg_print('Could not get the {0} {1} columns ({2}); the crawl will try again.'
+                                .format(year, team, e))
+                continue
+            for table_name, csv_text in tables.items():
+                if table_name not in ret_val and csv_text:
+                    frame = TableSchema.read_frame(csv_text, table_name, year=year, team=team)
+                    if len(frame.columns):
+                        ret_val[table_name] = list(frame.columns)
+        return ret_val
+
+    def __iter_team_seasons(self, start_year, end_year, teams, read_cache=True, write_cache=True):
+        first, last = SDS.validate_start_end_years(start_year or self._config.minimum_year,
+                                                   end_year or self._config.maximum_year, self._config)
+        directory = self.team_directory  # load the team list up front, rather than having every worker race to do it
+        self._driver_pool.release()  # and give back the browser that may have taken, so a worker can have it
+
+        team_seasons = directory.team_seasons(range(last, first - 1, -1), teams)  # only teams that existed
+        # the cached tables are read into memory a season at a time, just ahead of the units that need them
+        batches = collections.OrderedDict()  # year -> its cache filenames, newest season first like the units
+        for year, team in team_seasons:
+            batches.setdefault(year, [])
+            if read_cache:
+                batches[year] += [self.__get_cache_filename(year, team, t)
+                                  for page, url, table_names in self.__get_table_plan(year, team) for t in table_names]
+        preload = SDS._preloader(list(batches.values()))
+        batch_of = {year: i for i, year in enumerate(batches)}
+
+        def run(year, team):
+            preload(batch_of[year])
+            return self.__get_team_for_year(year, team, read_cache, write_cache)
+
+        units = []
+        for year, team in team_seasons:
+            units.append(WorkUnit(key=(year, team), run=lambda y=year, t=team: run(y, t),
+                                  is_cached=lambda y=year, t=team: read_cache and self.__is_cached(y, t)))
+
+        for (year, team), tables in self._scheduler.iter_results(units):
+            if tables:
+                yield year, team, tables
+
+        for key, error in self._scheduler.failures.items():
+            print('Could not scrape {1} {0}: {2}'.format(key[0], key[1], error))
 
     def get_teams_overview(self, read_cache=True, write_cache=True, cache_filename=None):
         if (read_cache or write_cache) and not cache_filename:
@@ -46,17 +189,14 @@ class HockeyTeamScraper(SDS):
         # header = raw_team_data[0]  # in case I need to pass it to csv.DictReader as fieldnames
         team_data = [re.sub('^Franchise,Lg,', 'Abbrev,Franchise,Lg,', raw_team_data[0])]
         for this_team in raw_team_data[1:]:  # skip the header, naturally
-            this_name = this_team.split(',')[0]  # team name is the first field
-            matching_abbrevs = [abbr for abbr, name in self.all_team_names if name == this_name]
-            this_abbrev = ''
-            if matching_abbrevs:
-                this_abbrev = matching_abbrevs[0]
+            this_name = next(csv.reader([this_team]))[0]  # team name is the first field
+            this_abbrev = self.team_directory.franchise_for_name(this_name) or ''
             this_team = this_abbrev + ',' + this_team
             team_data.append(this_team)
 
         str_team_data = '\n'.join(team_data)
         if write_cache and cache_filename and team_data:
-            SDS._write_cache_data(str_team_data, cache_filename)
+            SDS._write_cache_data(str_team_data, cache_filename, self._derived)
 
         with io.StringIO(str_team_data) as in_file:
             return list(csv.DictReader(in_file))
@@ -76,7 +216,7 @@ class HockeyTeamScraper(SDS):
             reg = re.match(link_pattern, inner_html)
             if reg:
                 abbrev, year, name, made_playoffs = reg.groups()
-                ret_val.append([year, league, abbrev, name, len(made_playoffs) > 0])
+                ret_val.append([year, league, abbrev, name, len(made_playoffs) > 0, abbr])
         return ret_val
 
     def __init_team_names(self, read_cache=True, write_cache=True, cache_filename=None):
@@ -85,15 +225,18 @@ class HockeyTeamScraper(SDS):
         team_identities = []
 
         if (read_cache or write_cache) and not cache_filename:
-            cache_filename = os.path.join(os.path.curdir, 'cache', self._config.league_name, 'team_identities.csv')
+            cache_filename = self.team_identities_filename
 
         if read_cache and cache_filename:
             cached_stats = self._read_cache_data(cache_filename)
 
-        if not cached_stats:
+        scraped = not cached_stats
+        if scraped:
+            from selenium.webdriver.common.by import By
+
             for table_name in ('#all_active_franchises', '#all_defunct_franchises'):
                 team_table = self.get_html_table(self.__url_base, table_name)
-                team_links = team_table.find_elements_by_css_selector('a')
+                team_links = team_table.find_elements(By.CSS_SELECTOR, 'a')
 
                 for link in team_links:
                     name = link.text
@@ -109,7 +252,7 @@ class HockeyTeamScraper(SDS):
                     for a in team_abbrevs:
                         team_identities.append(a)
 
-            cached_stats = 'Year,League,Abbrev,Name,Made_Playoffs\n'
+            cached_stats = 'Year,League,Abbrev,Name,Made_Playoffs,Franchise\n'
             for rv in sorted(team_identities[:-1]):  # all except the last, so there's not a trailing newline
                 cached_stats += ','.join([str(x) for x in rv]) + '\n'
             cached_stats += ','.join([str(x) for x in team_identities[-1]])  # last line only, no newline
@@ -117,8 +260,8 @@ class HockeyTeamScraper(SDS):
         with io.StringIO(cached_stats) as in_file:
             ret_val_csv = list(csv.DictReader(in_file))
 
-        if write_cache:
-            self._write_cache_data(cached_stats, cache_filename)
+        if write_cache and scraped:  # no need to write back what we just read
+            self._write_cache_data(cached_stats, cache_filename, self._derived)
 
         return ret_val_csv
 
@@ -160,6 +303,14 @@ class HockeyTeamScraper(SDS):
             self._dbg_print('Team {0} did not exist in the year {1}. Skipping...'.format(team, year))
             return None
 
+        # every table on a page comes back from a single page load
+        for page, url, table_names in self.__get_table_plan(year, team):
+            ret_val.update(self.__get_team_page_components(table_names, year, team, url, read_cache, write_cache))
+
+        return ret_val
+
+    def __get_table_plan(self, year, team):
+        # which tables we expect to find on which of the team-season's pages, as a list of (page, url, [table names])
         season_tables = ['roster', 'goalies', 'skaters']
         playoff_tables = ['goalies_playoffs', 'skaters_playoffs']
         games_tables = ['games']  # games live on a different url, e.g., '/teams/MTL/1943_games.html'
@@ -170,45 +321,77 @@ class HockeyTeamScraper(SDS):
         if int(year) > 2008:
             season_tables += ['shootout', 'shootout_goalies']
 
-        for t in season_tables:
-            ret_val[t] = self.__get_team_page_component(t, year, team,
-                                                        read_cache=read_cache, write_cache=write_cache)
-
-        if self.__did_team_make_playoffs(team, year):
-            for t in playoff_tables:
-                ret_val[t] = self.__get_team_page_component(t, year, team,
-                                                            read_cache=read_cache, write_cache=write_cache)
-
-        games_url = self.__get_url(year, team).replace('.html', '_games.html')
         if self.__did_team_make_playoffs(team, year):
+            season_tables += playoff_tables
             games_tables += ['games_playoffs']
-        for t in games_tables:
-            ret_val[t] = self.__get_team_page_component(t, year, team, games_url, read_cache, write_cache)
-
-        return ret_val
 
-    def __get_team_page_component(self, table_name, year, team, url='', read_cache=True, write_cache=True):
-        cache_directory = os.path.join(self._get_base_cache_path_for_sport(), 'teams', str(year), team)
-        cache_filename = os.path.join(cache_directory, '{0}.csv'.format(table_name))
+        team_url = self.__get_url(year, team)
+        games_url = team_url.replace('.html', '_games.html')
+        return [('team', team_url, self.__known_tables('team', team_url, year, season_tables)),
+                ('games', games_url, self.__known_tables('games', games_url, year, games_tables))]
+
+    def __known_tables(self, page, url, year, guessed_tables):
+        # the guess above, checked against what the inventory has seen: the tables on this very page if we've
+        # loaded it before, or else the tables on any of that season's pages of the same kind. a season that's
+        # still being played can still grow tables, so it's left to the guess
+        if not self._inventory or self._max_age_for_year(year) is not None:
+            return guessed_tables
+
+        candidates = HockeyTeamScraper.__page_tables[page]
+        on_page = self._inventory.tables_on(url)
+        if on_page is not None:
+            return [t for t in candidates if t in on_page]
+
+        in_season = self._inventory.season_tables(page, year)
+        if in_season is None:
+            return guessed_tables
+        # every team's page has the same regular-season tables in a given season, but only playoff teams' pages have
+        # playoff tables, and the pages seen so far may all have been non-playoff teams'. those stick to the guess
+        return [t for t in candidates
+                if (t in guessed_tables if t in HockeyTeamScraper.__playoff_tables else t in in_season)]
+
+    def _page_kind(self, url):
+        match = re.search(HockeyTeamScraper.__page_regex, url)
+        if not match:
+            return super()._page_kind(url)
+        return ('games' if match.group(2) else 'team'), int(match.group(1))
+
+    def __is_cached(self, year, team):
+        if not self.__did_team_exist(team, year):
+            return True  # nothing to fetch, so there's no reason to hand it to a network worker
+        if self._max_age_for_year(year) is not None:
+            return False  # the season's still going, so let a worker check whether it needs refreshing
+
+        # tables the page doesn't have aren't in the cache, but the manifest knows they're empty
+        for page, url, table_names in self.__get_table_plan(year, team):
+            cache_filenames = {'#all_' + t: self.__get_cache_filename(year, team, t) for t in table_names}
+            if self.needs_fetch(url, list(cache_filenames), cache_filenames):
+                return False
+        return True
+
+    def __get_cache_filename(self, year, team, table_name):
+        return os.path.join(self._get_base_cache_path_for_sport(), 'teams', str(year), team,
+                            '{0}.csv'.format(table_name))
+
+    def __get_team_page_components(self, table_names, year, team, url='', read_cache=True, write_cache=True):
         if not url:
-            url = HockeyTeamScraper.__get_url(year, team)
+            url = self.__get_url(year, team)
+
+        self._dbg_print('Pulling {1} "{2}" stats for {0}'.format(team, year, '", "'.join(table_names)))
 
-        self._dbg_print('Pulling {1} "{2}" stats for {0}'.format(team, year, table_name))
+        css_names = {'#all_{0}'.format(t): t for t in table_names}
+        cache_filenames = {css: self.__get_cache_filename(year, team, t) for css, t in css_names.items()}
 
-        return self.get_csv_table(url, '#all_{0}'.format(table_name), read_cache, write_cache, cache_filename)
+        csv_tables = self.get_csv_tables(url, list(css_names), read_cache, write_cache, cache_filenames,
+                                         max_age=self._max_age_for_year(year))
+        return {css_names[css]: data for css, data in csv_tables.items()}
 
-    @staticmethod
-    def __get_url(year, team_name):
-        return HockeyTeamScraper.__team_url_base.replace(SDS._team_token, team_name) \
+    def __get_url(self, year, team_name):
+        return self._site_url(HockeyTeamScraper.__team_url_base).replace(SDS._team_token, team_name) \
             .replace(SDS._year_token, str(year))
 
     def __did_team_exist(self, team, year):
-        return len([x for x in self.all_team_names if x['Abbrev'] == team and x['Year'] == str(year)]) > 0
+        return self.team_directory.did_team_exist(team, year)
 
-    # Hockey-Reference does already have 2017 playoff data online, but the teams who made the
-    # playoffs in 2017 aren't yet marked as having done so on their franchise page. (2017-Jun-08)
     def __did_team_make_playoffs(self, team, year):
-        return len([x for x in self.all_team_names
-                    if x['Abbrev'] == team
-                    and x['Year'] == str(year)
-                    and x['Made_Playoffs'] == str(True).upper()]) > 0
+        return self.team_directory.did_team_make_playoffs(team, year)
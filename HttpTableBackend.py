@@ -0,0 +1,237 @@
+import csv
+import io
+import re
+import threading
+import urllib.error
+import urllib.request
+from html.parser import HTMLParser
+
+from ScrapeMetrics import ScrapeMetrics
+
+
+class TableNotFoundError(LookupError):
+    pass
+
+
+class PageNotFoundError(TableNotFoundError):
+    pass
+
+
+class PageNotModifiedError(Exception):
+    pass
+
+
+class _TableHtmlParser(HTMLParser):
+    """Collects every <table id=...> on a page as a list of rows, including the
+    ones Sports-Reference hides inside HTML comments until you scroll to them."""
+
+    __skipped_row_classes = ('thead', 'spacer')
+
+    def __init__(self, wanted_ids=None):
+        super().__init__(convert_charrefs=True)
+        self.wanted_ids = set(wanted_ids) if wanted_ids else None
+        self.tables = {}
+
+        self.__table_id = None
+        self.__section = None
+        self.__row = None
+        self.__cell = None
+
+    def handle_comment(self, data):
+        # hockey-reference ships most secondary tables as '<!-- <div ...><table>...</table></div> -->'
+        if '<table' in data:
+            sub_parser = _TableHtmlParser(self.wanted_ids)
+            sub_parser.feed(data)
+            sub_parser.close()
+            for table_id, rows in sub_parser.tables.items():
+                self.tables.setdefault(table_id, rows)
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+
+        if tag == 'table':
+            table_id = attrs.get('id')
+            if table_id and (self.wanted_ids is None or table_id in self.wanted_ids):
+                self.__table_id = table_id
+                self.tables[table_id] = []
+            return
+
+        if not self.__table_id:
+            return
+
+        if tag in ('thead', 'tbody', 'tfoot'):
+            self.__section = tag
+        elif tag == 'tr':
+            self.__row = {'section': self.__section,
+                          'classes': (attrs.get('class') or '').split(),
+                          'cells': []}
+        elif tag in ('th', 'td') and self.__row is not None:
+            self.__cell = {'text': [],
+                           'colspan': int(attrs.get('colspan') or 1),
+                           'append_csv': attrs.get('data-append-csv'),
+                           'data_stat': attrs.get('data-stat'),
+                           'links': []}
+        elif tag == 'a' and self.__cell is not None:
+            self.__cell['links'].append(attrs.get('href'))
+
+    def handle_endtag(self, tag):
+        if not self.__table_id:
+            return
+
+        if tag == 'table':
+            self.__table_id = None
+            self.__section = None
+        elif tag in ('thead', 'tbody', 'tfoot'):
+            self.__section = None
+        elif tag == 'tr' and self.__row is not None:
+            self.tables[self.__table_id].append(self.__row)
+            self.__row = None
+        elif tag in ('th', 'td') and self.__cell is not None:
+            self.__cell['text'] = ''.join(self.__cell['text']).strip()
+            self.__row['cells'].append(self.__cell)
+            self.__cell = None
+
+    def handle_data(self, data):
+        if self.__cell is not None:
+            self.__cell['text'].append(data)
+
+    @staticmethod
+    def row_is_csv_data(row, hide_partial_rows=False):
+        if row['section'] == 'tbody' and any(c in row['classes'] for c in _TableHtmlParser.__skipped_row_classes):
+            return False
+        if hide_partial_rows and 'partial_table' in row['classes']:
+            return False
+        return True
+
+
+class HttpTableBackend:
+    """Pulls raw pages over plain HTTP and rebuilds the "Get as CSV" text from the table markup,
+    so no browser is needed to read a table."""
+
+    _default_user_agent = 'Mozilla/5.0 (compatible; SportsDataScraper)'
+
+    # an offline backend only knows the pages it was given, so a missing table means missing, not "try a browser"
+    offline = False
+
+    def __init__(self, user_agent=None, timeout=30, fetch=None, rate_limiter=None, metrics=None, archive=None):
+        self._user_agent = user_agent or HttpTableBackend._default_user_agent
+        self._timeout = timeout
+        # anything that takes a url and returns the page's html will do, e.g. reading saved fixture pages
+        self._fetch = fetch
+        self._rate_limiter = rate_limiter
+        self._metrics = metrics or ScrapeMetrics()
+        # every page we download goes in here (see PageArchive.py), so it never has to be downloaded again to re-parse
+        self._archive = archive
+
+        # each crawler thread keeps its own last-parsed page
+        self.__local = threading.local()
+
+    def fetch_page(self, url, etag=None, last_modified=None):
+        # with an etag or last_modified from an earlier fetch, this is a conditional request,
+        # and raises PageNotModifiedError if the server says our copy is still current
+        if self._rate_limiter:
+            self._rate_limiter.acquire(url)
+
+        headers = {'User-Agent': self._user_agent}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+
+        try:
+            with urllib.request.urlopen(urllib.request.Request(url, headers=headers),
+                                        timeout=self._timeout) as response:
+                self.__local.validators = (url, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+                charset = response.headers.get_content_charset() or 'utf-8'
+                html = response.read().decode(charset, errors='replace')
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                raise PageNotModifiedError(url)
+            if e.code == 404:
+                if self._archive:
+                    self._archive.put_missing(url)
+                raise PageNotFoundError('There is no page at {0}'.format(url))
+            raise
+
+        if self._archive:
+            self._archive.put(url, html)
+        return html
+
+    def validators(self, url):
+        # the (etag, last_modified) this thread got the last time it downloaded url
+        last_url, etag, last_modified = getattr(self.__local, 'validators', (None, None, None))
+        return (etag, last_modified) if last_url == url else (None, None)
+
+    def get_tables(self, url, etag=None, last_modified=None):
+        # one download and one parse per page, no matter how many of its tables we ask for
+        local = self.__local
+        if getattr(local, 'url', None) != url:
+            with self._metrics.span('http_fetch', url=url):
+                html = self._fetch(url) if self._fetch else self.fetch_page(url, etag, last_modified)
+            with self._metrics.span('html_parse', url=url):
+                local.tables = HttpTableBackend.parse_tables(html)
+            local.url = url
+        return local.tables
+
+    def get_csv_table(self, url, css_table_name, hide_partial_rows=False):
+        csv_tables = self.get_csv_tables(url, [css_table_name], hide_partial_rows)
+        if css_table_name not in csv_tables:
+            raise TableNotFoundError('Could not find the table "{0}" on the page!'
+                                     .format(HttpTableBackend.table_id_for(css_table_name)))
+        return csv_tables[css_table_name]
+
+    def get_csv_tables(self, url, css_table_names, hide_partial_rows=False, etag=None, last_modified=None):
+        # tables that aren't on the page are simply left out, so the caller can decide what to do about them
+        tables = self.get_tables(url, etag, last_modified)
+        ret_val = {}
+        for css_table_name in css_table_names:
+            table_id = HttpTableBackend.table_id_for(css_table_name)
+            if table_id in tables:
+                with self._metrics.span('csv_extract', url=url, table=css_table_name):
+                    ret_val[css_table_name] = HttpTableBackend.rows_to_csv(tables[table_id], hide_partial_rows)
+        return ret_val
+
+    def close(self):
+        self.__local = threading.local()
+
+    @staticmethod
+    def table_id_for(css_table_name):
+        # the wrapper div is e.g., "#all_skaters" and the <table> inside it is "#skaters"
+        return re.sub('^#?(all[_-])?', '', css_table_name)
+
+    @staticmethod
+    def parse_tables(html, table_ids=None):
+        parser = _TableHtmlParser(table_ids)
+        parser.feed(html)
+        parser.close()
+        return parser.tables
+
+    @staticmethod
+    def extract_csv(html, css_table_name, hide_partial_rows=False):
+        table_id = HttpTableBackend.table_id_for(css_table_name)
+        tables = HttpTableBackend.parse_tables(html, [table_id])
+        if table_id not in tables:
+            raise TableNotFoundError('Could not find the table "{0}" on the page!'.format(table_id))
+        return HttpTableBackend.rows_to_csv(tables[table_id], hide_partial_rows)
+
+    @staticmethod
+    def rows_to_csv(rows, hide_partial_rows=False):
+        lines = []
+        for row in rows:
+            if not _TableHtmlParser.row_is_csv_data(row, hide_partial_rows):
+                continue
+
+            fields = []
+            for cell in row['cells']:
+                text = cell['text']
+                # player cells carry their id, e.g. "Phil Kessel\kesseph01", just like the site's own csv
+                if cell['append_csv']:
+                    text += '\\' + cell['append_csv']
+                fields.append(text)
+                fields.extend([''] * (cell['colspan'] - 1))
+
+            with io.StringIO() as line:
+                csv.writer(line, lineterminator='').writerow(fields)
+                lines.append(line.getvalue())
+
+        return '\n'.join(lines)
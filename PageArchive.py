@@ -0,0 +1,150 @@
+import collections
+import gzip
+import hashlib
+import os
+import threading
+import time
+
+from HttpTableBackend import HttpTableBackend, PageNotFoundError
+from SqliteDatabase import SqliteDatabase
+
+try:
+    import zstandard
+except ImportError:  # optional; gzip does the job, just a bit bigger and slower
+    zstandard = None
+
+
+ArchivedPage = collections.namedtuple('ArchivedPage', ['url', 'fetched_at', 'content_hash', 'source'])
+
+
+class PageNotArchivedError(LookupError):
+    pass
+
+
+class PageArchive:
+    """Every raw page we've downloaded, compressed and stored once per distinct body under its sha1, with an
+    index of which url returned which body when. Pages that 404'd are indexed too (with no body), so the
+    archive can tell "never fetched" apart from "doesn't exist". Anything we've ever scraped can then be
+    re-parsed, for new tables or after a table id changes, without going back to the site."""
+
+    def __init__(self, archive_root):
+        self._archive_root = archive_root
+        self._objects_root = os.path.join(archive_root, 'objects')
+        self._db = SqliteDatabase(os.path.join(archive_root, 'index.sqlite3'), schema=(
+            'CREATE TABLE IF NOT EXISTS pages ('
+            'url TEXT NOT NULL, fetched_at REAL NOT NULL, content_hash TEXT, source TEXT, '
+            'PRIMARY KEY (url, fetched_at))'))
+
+    @property
+    def archive_root(self):
+        return self._archive_root
+
+    def _connection(self):
+        return self._db.connection()
+
+    def put(self, url, html, source='http'):
+        data = html.encode('utf-8')
+        content_hash = hashlib.sha1(data).hexdigest()
+        if not self.__object_filename(content_hash):
+            self.__write_object(content_hash, data)
+        self.__index(url, content_hash, source)
+        return content_hash
+
+    def put_missing(self, url, source='http'):
+        self.__index(url, None, source)
+
+    def latest(self, url, as_of=None):
+        # the newest fetch of url, or the newest one at or before as_of (a unix timestamp)
+        query = 'SELECT url, fetched_at, content_hash, source FROM pages WHERE url = ?'
+        params = [url]
+        if as_of is not None:
+            query += ' AND fetched_at <= ?'
+            params.append(as_of)
+        row = self._connection().execute(query + ' ORDER BY fetched_at DESC LIMIT 1', params).fetchone()
+        return ArchivedPage(*row) if row else None
+
+    def history(self, url):
+        rows = self._connection().execute('SELECT url, fetched_at, content_hash, source FROM pages '
+                                          'WHERE url = ? ORDER BY fetched_at', (url,))
+        return [ArchivedPage(*row) for row in rows]
+
+    def get(self, url, as_of=None):
+        # the page's html, or raises PageNotFoundError if it 404'd and PageNotArchivedError if we never fetched it
+        page = self.latest(url, as_of)
+        if page is None:
+            raise PageNotArchivedError('{0} is not in the archive'.format(url))
+        if page.content_hash is None:
+            raise PageNotFoundError('There is no page at {0}'.format(url))
+        return self.read_object(page.content_hash)
+
+    def has(self, url):
+        return self.latest(url) is not None
+
+    def urls(self, prefix=''):
+        rows = self._connection().execute("SELECT DISTINCT url FROM pages WHERE url LIKE ? ESCAPE '\\' ORDER BY url",
+                                          (prefix.replace('%', r'\%').replace('_', r'\_') + '%',))
+        return [row[0] for row in rows]
+
+    def read_object(self, content_hash):
+        filename = self.__object_filename(content_hash)
+        if not filename:
+            raise PageNotArchivedError('No archived page has the hash {0}'.format(content_hash))
+
+        with open(filename, 'rb') as object_file:
+            data = object_file.read()
+        if filename.endswith('.zst'):
+            if zstandard is None:
+                raise ImportError('{0} is zstd-compressed; pip install zstandard to read it'.format(filename))
+            data = zstandard.ZstdDecompressor().decompress(data)
+        else:
+            data = gzip.decompress(data)
+        return data.decode('utf-8')
+
+    def __index(self, url, content_hash, source):
+        with self._connection() as conn:
+            conn.execute('INSERT OR REPLACE INTO pages (url, fetched_at, content_hash, source) VALUES (?, ?, ?, ?)',
+                         (url, time.time(), content_hash, source))
+
+    def __object_path(self, content_hash):
+        # objects/ab/abcdef..., so no one directory ends up with every page in it
+        return os.path.join(self._objects_root, content_hash[:2], content_hash)
+
+    def __object_filename(self, content_hash):
+        path = self.__object_path(content_hash)
+        for extension in ('.zst', '.gz'):
+            if os.path.exists(path + extension):
+                return path + extension
+        return None
+
+    def __write_object(self, content_hash, data):
+        if zstandard is not None:
+            extension, data = '.zst', zstandard.ZstdCompressor(level=10).compress(data)
+        else:
+            extension, data = '.gz', gzip.compress(data, compresslevel=6)
+
+        filename = self.__object_path(content_hash) + extension
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        # write then rename, so another thread (or another process sharing the archive, e.g. a WorkQueue worker)
+        # fetching the same page never sees half an object. thread ids are only unique within a process
+        temp_filename = '{0}.{1}.{2}.tmp'.format(filename, os.getpid(), threading.get_ident())
+        with open(temp_filename, 'wb') as object_file:
+            object_file.write(data)
+        os.replace(temp_filename, filename)
+
+
+class ArchiveBackend(HttpTableBackend):
+    """Reads tables out of a PageArchive instead of off the network, so a whole re-parse is local and CPU-bound.
+    Pages that were never archived raise PageNotArchivedError, which is never worth retrying; a table that isn't
+    on an archived page comes back empty rather than sending the scraper off to a browser.
+
+    as_of (a unix timestamp) re-parses the pages as they were at that time instead of the newest copies."""
+
+    offline = True
+
+    def __init__(self, archive, as_of=None, metrics=None):
+        self._source_archive = archive
+        self._as_of = as_of
+        HttpTableBackend.__init__(self, fetch=self.__read_page, metrics=metrics)
+
+    def __read_page(self, url):
+        return self._source_archive.get(url, self._as_of)
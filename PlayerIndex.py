@@ -0,0 +1,142 @@
+import collections
+import csv
+import io
+import os
+
+from CacheFollower import CacheFollower
+
+
+# one player's row from one team-season table. values is {column: text}, with repeated column names numbered
+# the way pandas does it (the second 'EV' is 'EV.1')
+PlayerRow = collections.namedtuple('PlayerRow', ['player', 'name', 'year', 'team', 'table', 'line', 'values'])
+
+
+class PlayerIndex(CacheFollower):
+    """An index of every player row in the cached team-season tables (rosters, skaters, goalies, playoffs,
+    shootouts, ...), so "all of Phil Kessel's seasons" or "every team's goalies from 1985 to 1995" is an indexed
+    query instead of a walk over cache/nhl/teams/ parsing every file. Each row is stored with where it came from,
+    (year, team, table, line in the csv), and the row itself, so queries never have to open the csv files.
+
+    It's a CacheFollower, kept up to date the same way as DerivedAggregates: every scraper hands it the tables it
+    caches, and sync() catches up on tables cached some other way. Only tables whose text changed are re-indexed."""
+
+    def __init__(self, db_filename=None, cache_store=None):
+        super().__init__(db_filename or os.path.join(os.path.curdir, 'cache', 'player_index.sqlite3'), (
+            'CREATE TABLE IF NOT EXISTS sources (league TEXT NOT NULL, year INTEGER NOT NULL, '
+            'team TEXT NOT NULL, table_name TEXT NOT NULL, content_hash TEXT NOT NULL, header TEXT, '
+            'PRIMARY KEY (league, table_name, year, team));'
+            'CREATE TABLE IF NOT EXISTS player_rows (league TEXT NOT NULL, year INTEGER NOT NULL, '
+            'team TEXT NOT NULL, table_name TEXT NOT NULL, line INTEGER NOT NULL, player_id TEXT NOT NULL, '
+            'name TEXT, row_text TEXT NOT NULL, PRIMARY KEY (league, table_name, year, team, line));'
+            'CREATE INDEX IF NOT EXISTS player_rows_by_player ON player_rows (player_id, year);'
+            'CREATE INDEX IF NOT EXISTS player_rows_by_name ON player_rows (name COLLATE NOCASE);'
+            'CREATE INDEX IF NOT EXISTS player_rows_by_year ON player_rows (league, year, team);'), cache_store)
+
+    def _follows(self, key):
+        return True  # every team-season table; ones without a Player column just have no rows
+
+    def _apply(self, conn, changed):
+        for key, csv_text, content_hash in changed:
+            source = (key.league, key.table, key.year, key.team)
+            header, rows = PlayerIndex.__player_rows(csv_text)
+            conn.execute('DELETE FROM player_rows WHERE league = ? AND table_name = ? AND year = ? AND team = ?',
+                         source)
+            conn.executemany('INSERT INTO player_rows (league, table_name, year, team, line, player_id, name, '
+                             'row_text) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', [source + r for r in rows])
+            conn.execute('INSERT OR REPLACE INTO sources (league, table_name, year, team, content_hash, header) '
+                         'VALUES (?, ?, ?, ?, ?, ?)', source + (content_hash, header))
+
+    def find_players(self, name, league='nhl'):
+        # {player id: name} for everyone whose name contains the given text, ignoring case
+        rows = self._connection().execute(
+            "SELECT DISTINCT player_id, name FROM player_rows WHERE league = ? AND name LIKE ? ESCAPE '\\' "
+            'ORDER BY player_id', (league, '%' + name.replace('\\', '\\\\').replace('%', '\\%')
+                                   .replace('_', '\\_') + '%'))
+        return dict(rows)
+
+    def seasons(self, player_id, league='nhl'):
+        # [(year, team, table)] for every table the player appears in, in order
+        return [tuple(row) for row in self._connection().execute(
+            'SELECT DISTINCT year, team, table_name FROM player_rows WHERE player_id = ? AND league = ? '
+            'ORDER BY year, team, table_name', (player_id, league))]
+
+    def rows(self, table=None, players=None, start_year=None, end_year=None, teams=None, league='nhl'):
+        # a PlayerRow for every row that matches all of the filters given (None matches everything), in
+        # (year, team, table, line) order, e.g. rows('goalies', start_year=1985, end_year=1995)
+        # or rows(players=['kesseph01'])
+        where = ['r.league = ?']
+        params = [league]
+        for column, values in (('r.table_name', table), ('r.player_id', players), ('r.team', teams)):
+            if values is None:
+                continue
+            values = [values] if isinstance(values, str) else list(values)
+            where.append('{0} IN ({1})'.format(column, ','.join('?' * len(values))))
+            params += values
+        if start_year is not None:
+            where.append('r.year >= ?')
+            params.append(int(start_year))
+        if end_year is not None:
+            where.append('r.year <= ?')
+            params.append(int(end_year))
+
+        query = ('SELECT r.player_id, r.name, r.year, r.team, r.table_name, r.line, r.row_text, s.header '
+                 'FROM player_rows r JOIN sources s ON s.league = r.league AND s.table_name = r.table_name '
+                 'AND s.year = r.year AND s.team = r.team WHERE {0} ORDER BY r.year, r.team, r.table_name, r.line'
+                 .format(' AND '.join(where)))
+        headers = {}  # the same few headers come back over and over
+        ret_val = []
+        for player_id, name, year, team, table_name, line, row_text, header in self._connection().execute(
+                query, params):
+            if header not in headers:
+                headers[header] = PlayerIndex.__unique_columns(PlayerIndex.__parse_line(header))
+            values = dict(zip(headers[header], PlayerIndex.__parse_line(row_text)))
+            ret_val.append(PlayerRow(player_id, name, year, team, table_name, line, values))
+        return ret_val
+
+    def frame(self, table, players=None, start_year=None, end_year=None, teams=None, league='nhl'):
+        # the matching rows of one kind of table as a DataFrame, with Year and Team columns like TableSchema's
+        import pandas as pd
+
+        rows = self.rows(table, players, start_year, end_year, teams, league)
+        records = [dict(row.values, Year=row.year, Team=row.team) for row in rows]
+        frame = pd.DataFrame.from_records(records)
+        if len(frame.columns):
+            frame = frame[['Year', 'Team'] + [c for c in frame.columns if c not in ('Year', 'Team')]]
+        return frame
+
+    @staticmethod
+    def __player_rows(csv_text):
+        # (header line, [(line, player id, name, row text)]). the header is the first of the first two lines with a
+        # Player column (a lot of tables start with a row that only categorizes the stats, e.g. ",,,Scoring,,,"),
+        # and player rows are the ones with a "Name\id" cell; totals and the like don't have one
+        lines = csv_text.splitlines()
+        header_index = None
+        for i, line in enumerate(lines[:2]):
+            if 'Player' in PlayerIndex.__parse_line(line):
+                header_index = i
+                break
+        if header_index is None:
+            return None, []
+
+        player_column = PlayerIndex.__parse_line(lines[header_index]).index('Player')
+        rows = []
+        for i in range(header_index + 1, len(lines)):
+            cells = PlayerIndex.__parse_line(lines[i])
+            name, _, player_id = (cells[player_column] if player_column < len(cells) else '').rpartition('\\')
+            if name and player_id:
+                rows.append((i, player_id, name, lines[i]))
+        return lines[header_index], rows
+
+    @staticmethod
+    def __parse_line(line):
+        return next(csv.reader(io.StringIO(line)), [])
+
+    @staticmethod
+    def __unique_columns(columns):
+        seen = {}
+        ret_val = []
+        for column in columns:
+            count = seen.get(column, 0)
+            seen[column] = count + 1
+            ret_val.append(column if not count else '{0}.{1}'.format(column, count))
+        return ret_val
@@ -0,0 +1,189 @@
+import collections
+import contextlib
+import json
+import random
+import threading
+import time
+
+
+class ScrapeMetrics:
+    """Times each stage of the scrape pipeline (navigation, element lookups, scroll/hover/click, http fetches,
+    html parsing, csv extraction, cache reads and writes, DataFrame assembly) and hands every timing to its
+    sinks. With no sinks attached, a span costs next to nothing."""
+
+    def __init__(self, sinks=None):
+        self._sinks = list(sinks or [])
+
+    def add_sink(self, sink):
+        self._sinks.append(sink)
+        return sink
+
+    @contextlib.contextmanager
+    def span(self, stage, **labels):
+        if not self._sinks:
+            yield
+            return
+
+        started = time.time()
+        perf_started = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            event = {'stage': stage,
+                     'start': started,
+                     'seconds': time.perf_counter() - perf_started,
+                     'thread': threading.current_thread().name}
+            if error:
+                event['error'] = error
+            event.update(labels)
+            for sink in self._sinks:
+                sink.record(event)
+
+    def close(self):
+        for sink in self._sinks:
+            sink.close()
+
+
+class JsonLinesTraceSink:
+    """Every span as one json object per line, for digging into a single slow page after the fact."""
+
+    def __init__(self, filename):
+        self._file = open(filename, 'a')
+        self._lock = threading.Lock()
+
+    def record(self, event):
+        line = json.dumps(event, default=str)
+        with self._lock:
+            self._file.write(line + '\n')
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class StageStats:
+    """One stage's timings in constant memory, however long the crawl runs: exact count, total, min and max, plus
+    a fixed-size uniform sample of the durations (reservoir sampling) for the percentiles."""
+
+    def __init__(self, reservoir_size=1024, seed=None):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self._reservoir_size = reservoir_size
+        self._reservoir = []
+        self._random = random.Random(seed)
+
+    def add(self, seconds, error=False):
+        self.count += 1
+        self.errors += 1 if error else 0
+        self.total += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = seconds if self.max is None else max(self.max, seconds)
+
+        # every duration so far has the same reservoir_size / count chance of being in the sample
+        if len(self._reservoir) < self._reservoir_size:
+            self._reservoir.append(seconds)
+        else:
+            i = self._random.randrange(self.count)
+            if i < self._reservoir_size:
+                self._reservoir[i] = seconds
+
+    def percentile(self, q):
+        # exact until there are more durations than the reservoir holds, an estimate after that
+        if not self._reservoir:
+            return None
+        ordered = sorted(self._reservoir)
+        return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+class SummarySink:
+    """Count, total, mean, p50, p99 and max seconds per stage, printed when the run is over. Each stage is kept
+    in a StageStats, so the percentiles come from a sample of reservoir_size durations once there are more."""
+
+    def __init__(self, print_on_close=True, reservoir_size=1024):
+        self._print_on_close = print_on_close
+        self._reservoir_size = reservoir_size
+        self._stages = {}  # stage -> StageStats
+        self._lock = threading.Lock()
+
+    def record(self, event):
+        with self._lock:
+            stats = self._stages.get(event['stage'])
+            if stats is None:
+                stats = self._stages[event['stage']] = StageStats(self._reservoir_size)
+            stats.add(event['seconds'], 'error' in event)
+
+    def summary(self):
+        ret_val = {}
+        with self._lock:
+            for stage, stats in self._stages.items():
+                ret_val[stage] = {'count': stats.count,
+                                  'errors': stats.errors,
+                                  'total': stats.total,
+                                  'mean': stats.total / stats.count,
+                                  'p50': stats.percentile(0.5),
+                                  'p99': stats.percentile(0.99),
+                                  'max': stats.max}
+        return ret_val
+
+    def report(self):
+        lines = ['{0:<16} {1:>8} {2:>7} {3:>10} {4:>9} {5:>9} {6:>9}'
+                 .format('stage', 'count', 'errors', 'total s', 'p50 ms', 'p99 ms', 'max ms')]
+        stats = self.summary()
+        for stage in sorted(stats, key=lambda s: stats[s]['total'], reverse=True):
+            s = stats[stage]
+            lines.append('{0:<16} {1:>8} {2:>7} {3:>10.2f} {4:>9.2f} {5:>9.2f} {6:>9.2f}'
+                         .format(stage, s['count'], s['errors'], s['total'], s['p50'] * 1000, s['p99'] * 1000,
+                                 s['max'] * 1000))
+        return '\n'.join(lines)
+
+    def close(self):
+        if self._print_on_close and self._stages:
+            print(self.report())
+
+
+class PrometheusTextSink:
+    """Per-stage call, error and seconds counters in the Prometheus text format, written out on close
+    (or whenever write() is called), e.g. for node_exporter's textfile collector."""
+
+    def __init__(self, filename, prefix='sports_scraper'):
+        self._filename = filename
+        self._prefix = prefix
+        self._calls = collections.Counter()
+        self._errors = collections.Counter()
+        self._seconds = collections.Counter()
+        self._lock = threading.Lock()
+
+    def record(self, event):
+        with self._lock:
+            self._calls[event['stage']] += 1
+            self._seconds[event['stage']] += event['seconds']
+            if 'error' in event:
+                self._errors[event['stage']] += 1
+
+    def text(self):
+        lines = []
+        with self._lock:
+            for name, kind, help_text, values in (
+                    ('stage_calls_total', 'counter', 'Times each pipeline stage ran.', self._calls),
+                    ('stage_errors_total', 'counter', 'Times each pipeline stage raised.', self._errors),
+                    ('stage_seconds_total', 'counter', 'Seconds spent in each pipeline stage.', self._seconds)):
+                metric = '{0}_{1}'.format(self._prefix, name)
+                lines.append('# HELP {0} {1}'.format(metric, help_text))
+                lines.append('# TYPE {0} {1}'.format(metric, kind))
+                for stage in sorted(self._calls):
+                    lines.append('{0}{{stage="{1}"}} {2}'.format(metric, stage, values[stage]))
+        return '\n'.join(lines) + '\n'
+
+    def write(self):
+        with open(self._filename, 'w') as prom_file:
+            prom_file.write(self.text())
+
+    def close(self):
+        self.write()
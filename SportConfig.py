@@ -2,6 +2,7 @@ class SportConfig:
     __minimum_year = 0
     __maximum_year = 0
     __league_name = ''
+    __site_root = ''
 
     @property
     def minimum_year(self):
@@ -15,11 +16,16 @@ class SportConfig:
     def league_name(self):
         return self.__league_name
 
-    def __init__(self, league, min_year, max_year):
+    @property
+    def site_root(self):
+        return self.__site_root
+
+    def __init__(self, league, min_year, max_year, site_root='http://www.hockey-reference.com'):
         self.__league_name = league
         self.__minimum_year = min_year
         self.__maximum_year = max_year
+        self.__site_root = site_root.rstrip('/')
 
     @staticmethod
-    def NHL():
-        return SportConfig('nhl', 1918, 2017)
+    def NHL(site_root='http://www.hockey-reference.com'):
+        return SportConfig('nhl', 1918, 2017, site_root)
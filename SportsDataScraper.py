@@ -1,19 +1,16 @@
 import abc
 import os
+import threading
 import time
 
-from selenium import webdriver
-from selenium.common.exceptions import NoSuchElementException
-from selenium.webdriver.common.action_chains import ActionChains
-from selenium.webdriver.firefox.webdriver import WebDriver
-
-
-def __get_if_needed(self, url):
-    if self.current_url != url:
-        self.get(url)
-
-
-WebDriver.get_if_needed = __get_if_needed
+from CacheStore import FileCacheStore, MemoryCacheStore
+from CrawlManifest import CrawlManifest
+from CrawlScheduler import CrawlScheduler, HostRateLimiter
+from HttpTableBackend import HttpTableBackend, PageNotFoundError, PageNotModifiedError
+from PageArchive import PageArchive, PageNotArchivedError
+from ScrapeMetrics import ScrapeMetrics
+from TableInventory import TableInventory
+from WebDriverPool import WebDriverPool
 
 
 class SportsDataScraper:
@@ -21,25 +18,86 @@ class SportsDataScraper:
 
     _debug = False
     _config = None
-    _driver = webdriver.Firefox()
+    _backend = None
+    _scheduler = None
+    # shared by every scraper and every thread, so the whole process stays within one budget per host
+    _rate_limiter = HostRateLimiter()
+    _driver_pool = None
+    _manifest = None
+    _archive = None
+    _inventory = None
+    _refresh_age = 24 * 60 * 60  # how long a table from a season that's still being played stays fresh, in seconds
+    _element_timeout = 10  # how long the browser gets to put an element in the page, in seconds
+    _csv_timeout = 3  # how long "Get as CSV" gets to fill in the csv before we open the menu and click it ourselves
+    # every scraper reads and writes its cached tables through this, with the most recently used ones kept in memory;
+    # swap in e.g. MemoryCacheStore(SqliteCacheStore()) with set_cache_store
+    _cache_store = MemoryCacheStore(FileCacheStore())
+    # called with {filename: csv text} after every cache write, from every scraper
+    _cache_listeners = []
+    # the player index and the rollups, handed what each scraper caches unless it was made with derived=False
+    _player_index = None
+    _aggregates = None
+    # timings for every pipeline stage go here; attach sinks (see ScrapeMetrics.py) to see them
+    _metrics = ScrapeMetrics()
     _year_token = '-YEAR-'
     _league_token = '-LEAGUE-'
     _player_token = '-PLAYER-'
     _team_token = '-TEAM-'
     _css_selector_token = '-CSSBASE-'
+    _site_token = '-SITE-'
 
     __hasmore_css_path = _css_selector_token + ' > div.section_heading > div > ul > li.hasmore '
     __csv_button_selector = ' > div > ul > li:nth-child(4) > button'
 
-    def __init__(self, debug=False):
+    def __init__(self, debug=False, backend=None, workers=4, driver_pool=None, manifest=None, metrics=None,
+                 archive=None, inventory=None, derived=True):
         self._debug = debug
-
-    def __del__(self):
-        try:
-            if self._driver:
-                self._driver.quit()
-        except:
-            pass
+        self._metrics = metrics or SportsDataScraper._metrics
+        # every raw page we load, over http or in the browser, is kept in here; archive=False turns that off
+        if archive is None and self._config:
+            archive = PageArchive(os.path.join(self._get_base_cache_path_for_sport(), 'pages'))
+        self._archive = archive or None
+        # backend=False skips the http backend and always drives the browser
+        if backend is None:
+            backend = HttpTableBackend(rate_limiter=SportsDataScraper._rate_limiter, metrics=self._metrics,
+                                       archive=self._archive)
+        self._backend = backend
+        # no browser is started until something actually needs one
+        self._driver_pool = driver_pool or WebDriverPool(size=workers)
+        # a page that isn't in the archive won't be there on the next try either
+        self._scheduler = CrawlScheduler(workers=workers, debug=debug, after_unit=self._driver_pool.release,
+                                         permanent_errors=(PageNotArchivedError,))
+        # manifest=False turns off the bookkeeping, and "is it cached" goes back to being the only skip logic
+        if manifest is None and self._config:
+            manifest = CrawlManifest(os.path.join(self._get_base_cache_path_for_sport(), 'crawl_manifest.sqlite3'))
+        self._manifest = manifest or None
+        # which tables each page actually has, so nobody waits on a table that isn't there. inventory=False turns it
+        # off, and a table missing from a page we could read goes back to being looked for in the browser
+        if inventory is None and self._config:
+            inventory = TableInventory(os.path.join(self._get_base_cache_path_for_sport(), 'table_inventory.sqlite3'))
+        self._inventory = inventory or None
+        # whatever this scraper caches goes straight into the player index and the rollups; derived=False leaves
+        # them to catch up later with sync(), whatever other scrapers in the process do
+        self._derived = bool(derived and self._config)
+        if self._derived:
+            SportsDataScraper._track_derived()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def _driver(self):
+        # each thread gets its own browser from the pool, and keeps it until the pool gets it back
+        return self._driver_pool.acquire()
+
+    def close(self):
+        # the metrics are left open, since they're usually shared with other scrapers; close those when the run's over
+        self._driver_pool.shutdown()
+        if self._backend:
+            self._backend.close()
 
     def get_element_by_css(self, url, css):
         ret_val = None
@@ -50,64 +108,285 @@ class SportsDataScraper:
 
     def get_elements_by_css(self, url, css):
         driver = self._driver
-        driver.get_if_needed(url)
-        return driver.find_elements_by_css_selector(css)
+        self._get_if_needed(driver, url)
+        from selenium.webdriver.common.by import By
+
+        with self._metrics.span('element_lookup', url=url):
+            return driver.find_elements(By.CSS_SELECTOR, css)
 
     def get_html_table(self, url, css_table_name):
         return self.get_element_by_css(url, 'div' + css_table_name + ' > div.table_outer_container')
 
+    def needs_fetch(self, url, css_table_names, cache_filenames=None, max_age=None):
+        # whether get_csv_tables would have to go to the site for any of these tables. only looks at the cache
+        # and the manifest, so it's safe for planning and monitoring: nothing is downloaded and no browser starts
+        cache_filenames = cache_filenames or {}
+        records = self._manifest.get_many(url, css_table_names) if self._manifest else {}
+        cached = SportsDataScraper._cached_filenames([f for f in cache_filenames.values() if f])
+
+        for css_table_name in css_table_names:
+            record = records.get(css_table_name)
+            fresh = max_age is None or CrawlManifest.is_fresh(record, max_age)
+            known_empty = record and record.status == CrawlManifest.EMPTY
+            if not fresh or not (known_empty or cache_filenames.get(css_table_name) in cached):
+                return True
+        return False
+
+    def get_page_table_names(self, url):
+        # the css name of every table on the page (e.g. ['#all_stats_basic_plus_nhl', ...]), for pages whose tables
+        # vary, like players'. over http the page stays parsed, so get_csv_tables on the same url won't load it again
+        if self._backend:
+            try:
+                table_ids = self._backend.get_tables(url)
+                self._record_inventory(url, table_ids, 'archive' if self._backend.offline else 'http')
+                return ['#all_' + t for t in table_ids]
+            except OSError as e:
+                self._dbg_print('Could not read {0} over http ({1}), falling back to the browser.'.format(url, e))
+
+        driver = self._driver
+        self._get_if_needed(driver, url)
+        with self._metrics.span('html_parse', url=url):
+            return ['#all_' + t for t in HttpTableBackend.parse_tables(driver.page_source)]
+
     def get_csv_table(self, url, css_table_name, read_cache=True,
                       write_cache=True, cache_filename='',
-                      hide_partial_rows=False):
+                      hide_partial_rows=False, max_age=None):
+        cache_filenames = {css_table_name: cache_filename} if cache_filename else None
+        return self.get_csv_tables(url, [css_table_name], read_cache, write_cache, cache_filenames,
+                                   hide_partial_rows, max_age)[css_table_name]
+
+    def get_csv_tables(self, url, css_table_names, read_cache=True,
+                       write_cache=True, cache_filenames=None,
+                       hide_partial_rows=False, max_age=None):
+        # same as get_csv_table, but for many tables on one page: one page load, one parse, one batch of cache writes.
+        # cache_filenames is a dict of css_table_name -> filename; returns a dict of css_table_name -> csv text.
+        # max_age (in seconds) is for tables that can still change, like the current season's: older copies get
+        # re-checked with the server. without it, anything we've already got is good forever.
+        cache_filenames = cache_filenames or {}
+        records = self._manifest.get_many(url, css_table_names) if self._manifest else {}
+        ret_val = {}
+        stale_stats = {}
+
+        if read_cache:
+            wanted_filenames = [cache_filenames[t] for t in css_table_names if cache_filenames.get(t)]
+            with self._metrics.span('cache_read', url=url, tables=len(wanted_filenames)):
+                cached_stats = SportsDataScraper._read_cache_batch(wanted_filenames)
+            for css_table_name in css_table_names:
+                record = records.get(css_table_name)
+                data = cached_stats.get(cache_filenames.get(css_table_name))
+                fresh = max_age is None or CrawlManifest.is_fresh(record, max_age)
+
+                if record and record.status == CrawlManifest.EMPTY and fresh:
+                    ret_val[css_table_name] = ''  # we've looked before, and there's nothing there
+                elif data and fresh:
+                    ret_val[css_table_name] = data
+                elif data:
+                    stale_stats[css_table_name] = data
+
+            if len(ret_val) == len(css_table_names):
+                self._dbg_print('found cached copies of all {0} tables from {1}, not contacting the web after all.'
+                                .format(len(ret_val), url))
+                return ret_val
+
+        missing_tables = [t for t in css_table_names if t not in ret_val]
+        if self._manifest:
+            self._manifest.mark_in_progress(url, missing_tables)
+
+        try:
+            fetched_stats, validators = self.__fetch_csv_tables(url, missing_tables, hide_partial_rows,
+                                                                records, stale_stats)
+        except Exception as e:
+            if self._manifest:
+                self._manifest.record_failure(url, missing_tables, e)
+            raise
+
+        if fetched_stats is None:  # not modified since we last looked
+            self._dbg_print('{0} has not changed since we last fetched it.'.format(url))
+            if self._manifest:
+                self._manifest.record_not_modified(url, missing_tables)
+            ret_val.update(stale_stats)
+            return ret_val
+
+        # a table that isn't there isn't cached as an empty file; the manifest's EMPTY status is what remembers it
+        written = {cache_filenames[t]: data for t, data in fetched_stats.items() if cache_filenames.get(t) and data}
+        if write_cache and written:
+            with self._metrics.span('cache_write', url=url, tables=len(written)):
+                SportsDataScraper._write_cache_batch(written, self._derived)
+        if self._manifest:
+            self._manifest.record_results(url, fetched_stats, *validators)
+
+        ret_val.update(fetched_stats)
+        return ret_val
+
+    def __fetch_csv_tables(self, url, css_table_names, hide_partial_rows, records, stale_stats):
+        # returns ({css_table_name: csv text}, (etag, last_modified)), or (None, None) if the server says
+        # nothing has changed since the copies in stale_stats were fetched
+        fetched_stats = {}
+        validators = (None, None)
+        inventoried = False  # whether we've just taken stock of what's on the page
+
+        if self._backend:
+            # only ask conditionally when every table we'd be refreshing has a copy to fall back on
+            etag, last_modified = None, None
+            if stale_stats and all(t in stale_stats for t in css_table_names):
+                record = records.get(css_table_names[0])
+                etag, last_modified = (record.etag, record.last_modified) if record else (None, None)
+
+            try:
+                fetched_stats = self._backend.get_csv_tables(url, css_table_names, hide_partial_rows,
+                                                             etag, last_modified)
+                validators = self._backend.validators(url)
+                # the page is already parsed, so taking stock of its tables is free
+                inventoried = self._record_inventory(url, self._backend.get_tables(url),
+                                                     'archive' if self._backend.offline else 'http')
+            except PageNotModifiedError:
+                return None, None
+            except PageNotFoundError:
+                # e.g. there's no 2004-05 season page. record these as empty so we don't keep asking
+                return {t: '' for t in css_table_names}, validators
+            except OSError as e:
+                self._dbg_print('Could not read {0} over http ({1}), falling back to the browser.'.format(url, e))
+
+        offline = self._backend and self._backend.offline
+        browser_tables = [t for t in css_table_names if t not in fetched_stats]
+        if browser_tables and self._inventory and not offline and not inventoried:
+            self.__load_in_browser(url)  # takes stock of the page, before we wait on any of its tables
+        on_page = self._inventory.tables_on(url) if self._inventory else None
+
+        for css_table_name in browser_tables:
+            if offline or (on_page and HttpTableBackend.table_id_for(css_table_name) not in on_page):
+                fetched_stats[css_table_name] = ''  # it's not on the page, so it's as good as empty
+            else:
+                fetched_stats[css_table_name] = self._get_csv_table_from_browser(url, css_table_name,
+                                                                                 hide_partial_rows)
+
+        return fetched_stats, validators
 
-        if read_cache and cache_filename:
-            cached_stats = SportsDataScraper._read_cache_data(cache_filename)
+    def _get_csv_table_from_browser(self, url, css_table_name, hide_partial_rows=False):
+        # selenium is only imported once something actually needs the browser
+        from selenium.common.exceptions import (ElementNotInteractableException, MoveTargetOutOfBoundsException,
+                                                NoSuchElementException, WebDriverException)
+
+        try:
+            return self.__get_csv_table_from_browser(url, css_table_name, hide_partial_rows)
+        except (NoSuchElementException, ElementNotInteractableException, MoveTargetOutOfBoundsException):
+            raise  # the page is missing something, or it's in the way; the browser is fine
+        except WebDriverException:
+            # the browser itself is in trouble; throw it away so the retry gets a fresh one
+            self._driver_pool.discard()
+            raise
 
-            if cached_stats:
-                self._dbg_print('found a cached copy of {0}\'s {1} table, not contacting the web after all.'
-                                .format(url, css_table_name))
-                return cached_stats
+    def __get_csv_table_from_browser(self, url, css_table_name, hide_partial_rows=False):
+        from selenium.common.exceptions import NoSuchElementException
 
         selector_base = SportsDataScraper.__hasmore_css_path.replace(SportsDataScraper._css_selector_token,
                                                                      css_table_name)
+        # the web version of the table is e.g., "#all_skaters" and the <pre>-wrapped csv is "#csv_skaters"
+        csv_css = css_table_name.replace('#all', '#csv')
 
-        if not self._driver or self._driver.start_client():
-            self._driver = webdriver.Firefox()
         driver = self._driver
-
-        driver.get_if_needed(url)
+        self._get_if_needed(driver, url)
 
         if hide_partial_rows:
-            partial_rows_button = driver.find_element_by_css_selector(css_table_name +
-                                                                      " button[id$='_toggle_partial_table']")
-
-            if partial_rows_button:
-                partial_rows_button.click()
-            else:
-                print('Could not find the partial rows button. = (')
+            with self._metrics.span('element_lookup', url=url, table=css_table_name):
+                partial_rows_button = self._wait_for_element(css_table_name + " button[id$='_toggle_partial_table']")
+            with self._metrics.span('click', url=url, table=css_table_name):
+                driver.execute_script('arguments[0].click();', partial_rows_button)
+
+        # the "Get as CSV" button is in the page (hidden in the "Share & more" menu) as soon as the site's script
+        # has set the table up, and clicking it from script works without scrolling to the menu and opening it
+        with self._metrics.span('element_lookup', url=url, table=css_table_name):
+            get_csv_button = self._wait_for_element(selector_base + self.__csv_button_selector)
+        with self._metrics.span('click', url=url, table=css_table_name):
+            driver.execute_script('arguments[0].click();', get_csv_button)
 
-        sharing_dropdown = driver.find_element_by_css_selector(selector_base + '> span')
-        if sharing_dropdown:
+        try:
+            with self._metrics.span('csv_extract', url=url, table=css_table_name):
+                return self._wait_for_text(csv_css)
+        except NoSuchElementException:
+            self._dbg_print('Clicking "Get as CSV" from script did nothing for {0} on {1}, using the menu instead.'
+                            .format(css_table_name, url))
+
+        # the way a person would do it: bring the menu into view, open it, click the button
+        with self._metrics.span('element_lookup', url=url, table=css_table_name):
+            sharing_dropdown = self._wait_for_element(selector_base + '> span', visible=True)
+        with self._metrics.span('scroll', url=url, table=css_table_name):
             self._scroll_to_element(sharing_dropdown)
+        with self._metrics.span('hover', url=url, table=css_table_name):
             self._hover_element(sharing_dropdown)
-        else:
-            raise NoSuchElementException('Could not find the "Sharing" dropdown!')
+        with self._metrics.span('element_lookup', url=url, table=css_table_name):
+            get_csv_button = self._wait_for_element(selector_base + self.__csv_button_selector, visible=True)
+        with self._metrics.span('click', url=url, table=css_table_name):
+            get_csv_button.click()
+        with self._metrics.span('csv_extract', url=url, table=css_table_name):
+            return self._wait_for_text(csv_css)
+
+    def _wait_for_element(self, css, visible=False, timeout=None):
+        # waits for the element to show up in the page (and to be displayed, if visible), instead of hoping
+        # it's there by the time we look. a NoSuchElementException if it never does
+        from selenium.common.exceptions import NoSuchElementException, TimeoutException
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        timeout = timeout or self._element_timeout
+        condition = expected_conditions.visibility_of_element_located if visible else \
+            expected_conditions.presence_of_element_located
+        try:
+            return WebDriverWait(self._driver, timeout).until(condition((By.CSS_SELECTOR, css)))
+        except TimeoutException:
+            raise NoSuchElementException('Gave up waiting for "{0}" after {1}s'.format(css, timeout))
 
-        get_csv_button = driver.find_element_by_css_selector(selector_base + self.__csv_button_selector)
+    def _wait_for_text(self, css, timeout=None):
+        # the text of the element, once it has some; the csv <pre> is filled in by the site's script
+        from selenium.common.exceptions import NoSuchElementException, TimeoutException
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support.ui import WebDriverWait
 
-        if get_csv_button:
-            get_csv_button.click()
+        def element_text(driver):
+            elements = driver.find_elements(By.CSS_SELECTOR, css)
+            return elements[0].text if elements and elements[0].text else False
 
-            # the web version of the table is e.g., "#all_skaters" and the <pre>-wrapped csv is "#csv_skaters"
-            csv_stats = driver.find_element_by_css_selector(css_table_name.replace('#all', '#csv')).text
-            # self._dbg_print('Woo, found some stats!\n\n{0}\n'.format(csv_stats))
-        else:
-            raise NoSuchElementException('Could not find the button to get CSV stats!')
+        timeout = timeout or self._csv_timeout
+        try:
+            return WebDriverWait(self._driver, timeout).until(element_text)
+        except TimeoutException:
+            raise NoSuchElementException('Gave up waiting for the text of "{0}" after {1}s'.format(css, timeout))
 
-        if write_cache and cache_filename:
-            SportsDataScraper._write_cache_data(csv_stats, cache_filename)
+    def __load_in_browser(self, url):
+        from selenium.common.exceptions import WebDriverException
 
-        return csv_stats
+        try:
+            self._get_if_needed(self._driver, url)
+        except WebDriverException:
+            self._driver_pool.discard()  # same as for a table: a fresh browser for the retry
+            raise
+
+    def _get_if_needed(self, driver, url):
+        if driver.current_url != url:
+            SportsDataScraper._rate_limiter.acquire(url)
+            with self._metrics.span('navigate', url=url):
+                driver.get(url)
+            self._driver_pool.note_page(driver)
+            if self._archive or self._inventory:
+                html = driver.page_source
+                if self._archive:
+                    self._archive.put(url, html, source='browser')
+                if self._inventory:
+                    with self._metrics.span('html_parse', url=url):
+                        self._record_inventory(url, HttpTableBackend.parse_tables(html), 'browser')
+
+    def _record_inventory(self, url, table_ids, source):
+        # a page with no tables at all is more likely an error page than the real thing, so it isn't believed
+        if not self._inventory or not table_ids:
+            return False
+        self._inventory.record(url, table_ids, *self._page_kind(url), source=source)
+        return True
+
+    def _page_kind(self, url):
+        # (page type, year) for one of this scraper's urls, e.g. ('team', 2017), so the inventory can plan the
+        # rest of that season's pages of the same kind from it. scrapers with more than one kind of page override it
+        return '', 0
 
     @staticmethod
     def validate_start_end_years(start_year, end_year, config):
@@ -142,30 +421,112 @@ class SportsDataScraper:
 
         self._dbg_print('Writing team stats ({0}-{1}) to file: {2}'.format(start_year, end_year, output_filename))
 
-        if output_filename:
+        if output_filename and scrape_data is not None:
             scrape_data.to_csv(output_filename)
 
+    @staticmethod
+    def set_cache_store(cache_store):
+        SportsDataScraper._cache_store = cache_store
+
+    @staticmethod
+    def add_cache_listener(listener):
+        SportsDataScraper._cache_listeners.append(listener)
+
+    @staticmethod
+    def remove_cache_listener(listener):
+        SportsDataScraper._cache_listeners.remove(listener)
+
+    @staticmethod
+    def _track_derived():
+        # opens the player index and the rollups, once per process however many scrapers there are. they're only
+        # handed the writes of scrapers that want them (see __notify_cache_listeners)
+        if SportsDataScraper._player_index is None:
+            from PlayerIndex import PlayerIndex
+            SportsDataScraper._player_index = PlayerIndex()
+        if SportsDataScraper._aggregates is None:
+            from DerivedAggregates import DerivedAggregates
+            SportsDataScraper._aggregates = DerivedAggregates()
+
     @staticmethod
     def _read_cache_data(filename):
-        data = None
-        if os.path.exists(filename):
-            copy_file = open(filename, 'r')
-            data = ''.join(copy_file.readlines())
-            copy_file.close()
-        return data
+        return SportsDataScraper._cache_store.read(filename)
+
+    @staticmethod
+    def _read_cache_batch(filenames):
+        return SportsDataScraper._cache_store.read_many(filenames)
+
+    @staticmethod
+    def _cached_filenames(filenames):
+        # the subset of filenames that are already in the cache, checked in bulk
+        return SportsDataScraper._cache_store.exists_many(filenames)
+
+    @staticmethod
+    def _preload_cache(filenames):
+        # for stores with a memory layer: pull everything a scrape is about to read into memory in one sweep
+        preload_files = getattr(SportsDataScraper._cache_store, 'preload_files', None)
+        if preload_files:
+            preload_files(filenames)
+
+    @staticmethod
+    def _preloader(batches):
+        # for crawls too big to preload in one go (the memory store would push the first seasons back out before
+        # anyone read them): batches are lists of cache filenames in the order they'll be read, e.g. one per season.
+        # call what this returns with a batch's index before reading from it, and that batch and the next are
+        # pulled into memory, so the preload stays a batch ahead of whoever's reading
+        lock = threading.Lock()
+        started = set()
+
+        def preload(index):
+            for i in (index, index + 1):
+                with lock:
+                    if i >= len(batches) or i in started:
+                        continue
+                    started.add(i)
+                SportsDataScraper._preload_cache(batches[i])
+        return preload
+
+    @staticmethod
+    def _read_cache_columns(filename, columns):
+        return SportsDataScraper._cache_store.read_columns(filename, columns)
 
     @staticmethod
-    def _write_cache_data(data, filename):
-        cache_dir = os.path.dirname(os.path.realpath(filename))
-        if not os.path.exists(cache_dir):
-            os.makedirs(cache_dir)
+    def _cached_tables(table_name):
+        # (CacheKey, filename) for every cached copy of one kind of table, e.g. every team-season's 'roster'
+        store = SportsDataScraper._cache_store
+        for filename in store.filenames():
+            key = store.key_for(filename)
+            if key.table == table_name:
+                yield key, filename
 
+    @staticmethod
+    def _write_cache_data(data, filename, derived=True):
         if type(data) is list:
             data = '\n'.join(data)
+        SportsDataScraper._cache_store.write(filename, data)
+        SportsDataScraper.__notify_cache_listeners({filename: data}, derived)
+
+    @staticmethod
+    def _write_cache_batch(data_by_filename, derived=True):
+        data_by_filename = {f: '\n'.join(d) if type(d) is list else d for f, d in data_by_filename.items()}
+        SportsDataScraper._cache_store.write_many(data_by_filename)
+        SportsDataScraper.__notify_cache_listeners(data_by_filename, derived)
 
-        debug_file = open(filename, 'w')
-        debug_file.write(data)
-        debug_file.close()
+    @staticmethod
+    def __notify_cache_listeners(data_by_filename, derived=True):
+        for listener in list(SportsDataScraper._cache_listeners):
+            listener(data_by_filename)
+        # derived=False is a scraper that opted out of the player index and the rollups
+        for follower in (SportsDataScraper._player_index, SportsDataScraper._aggregates) if derived else ():
+            if follower is not None:
+                follower.on_cache_write(data_by_filename)
+
+    def _site_url(self, url_template):
+        # url templates start with _site_token, so the scrapers can be pointed at a stand-in for the real site
+        return url_template.replace(SportsDataScraper._site_token, self._config.site_root)
+
+    def _max_age_for_year(self, year):
+        # seasons that are over never change, so only the latest one ever needs refreshing
+        return self._refresh_age if int(year) >= self._config.maximum_year else None
 
     def _get_base_cache_path_for_sport(self):
         return os.path.join(os.path.curdir, 'cache', self._config.league_name)
@@ -180,30 +541,25 @@ class SportsDataScraper:
                 self._dbg_print(
                     'Tried to screenshot element with text "{0}", but can\'t find it!'.format(element.text))
 
-        driver = self._driver
-        driver.execute_script('arguments[0].scrollIntoView(true);', element)
-        driver.execute_script('window.scrollBy(0, -250);')
+        # the middle of the window keeps it out from under the site's sticky header
+        self._driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", element)
 
     def _hover_element(self, element):
-        try:
-            # self._dbg_print('trying to hover to element with text "{0}"...'.format(element.text))
-            driver = self._driver
-
-            if self._debug:
-                if element and element.screenshot_as_png:
-                    element.screenshot('hover_me.png')
-                else:
-                    self._dbg_print(
-                        'Tried to screenshot element with text "{0}", but can\'t find it!',
-                        element.text)
-
-            hov = ActionChains(driver).move_to_element(element)
-            hov.perform()
-        except Exception as e:
-            print(e)
-            pass
+        from selenium.webdriver.common.action_chains import ActionChains
+
+        # self._dbg_print('trying to hover to element with text "{0}"...'.format(element.text))
+        driver = self._driver
+
+        if self._debug:
+            if element and element.screenshot_as_png:
+                element.screenshot('hover_me.png')
+            else:
+                self._dbg_print('Tried to screenshot element with text "{0}", but can\'t find it!', element.text)
+
+        # if this fails, the click after it would too, so let the caller hear about it
+        ActionChains(driver).move_to_element(element).perform()
 
     def _dbg_print(self, s, *args):
         if self._debug:
-            st = s.format(args)
+            st = s.format(*args) if args else s
             print('[{0}]:\t{1}'.format(time.asctime(time.localtime()), st))
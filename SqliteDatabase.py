@@ -0,0 +1,48 @@
+import os
+import sqlite3
+import threading
+
+
+class SqliteDatabase:
+    """One SQLite file that every thread of a process can use. sqlite connections can't be shared between threads,
+    so each thread gets its own the first time it asks. Every connection runs in WAL mode, so readers in other
+    threads and processes don't wait on a writer, and gets the schema (CREATE ... IF NOT EXISTS statements) and
+    then upgrade(conn), if given, applied to it.
+
+    Nothing touches the disk until the first connection is made, and connection(create=False) doesn't make the
+    file at all: it returns None if there's no file yet, so lookups can come back empty instead of leaving an
+    empty database behind. autocommit=True leaves transactions to the caller (isolation_level=None), so a writer
+    can take the write lock up front with BEGIN IMMEDIATE."""
+
+    def __init__(self, db_filename, schema='', autocommit=False, upgrade=None):
+        self._db_filename = db_filename
+        self._schema = schema
+        self._autocommit = autocommit
+        self._upgrade = upgrade
+        self._local = threading.local()
+
+    @property
+    def filename(self):
+        return self._db_filename
+
+    def exists(self):
+        return os.path.exists(self._db_filename)
+
+    def connection(self, create=True):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            if not create and not self.exists():
+                return None
+            db_dir = os.path.dirname(os.path.realpath(self._db_filename))
+            os.makedirs(db_dir, exist_ok=True)
+            if self._autocommit:
+                conn = sqlite3.connect(self._db_filename, timeout=60, isolation_level=None)
+            else:
+                conn = sqlite3.connect(self._db_filename, timeout=60)
+            conn.execute('PRAGMA journal_mode=WAL')
+            if self._schema:
+                conn.executescript(self._schema)
+            if self._upgrade:
+                self._upgrade(conn)
+            self._local.conn = conn
+        return conn
@@ -0,0 +1,91 @@
+import collections
+import threading
+import time
+
+from HttpTableBackend import HttpTableBackend, PageNotFoundError
+from PageArchive import PageNotArchivedError
+from SqliteDatabase import SqliteDatabase
+
+
+class TableInventory:
+    """Which tables are actually on each page we've loaded, and so which tables each kind of page has in each
+    season. Scrapers use it to plan: a page we've inventoried is only asked for the tables it has, and a page
+    we haven't is only asked for the tables its kind of page had that season (e.g. no stats_adv_rs before
+    2007-08), instead of guessing from hard-coded cutoffs. A table that isn't there is never looked for again,
+    which matters most in the browser, where looking for one means a full navigate/wait cycle for nothing.
+
+    Pages are inventoried as they're loaded, over http or in the browser, and discover() backfills it from
+    the PageArchive without touching the site. Kept in cache/<league>/table_inventory.sqlite3."""
+
+    def __init__(self, db_filename):
+        self._db = SqliteDatabase(db_filename, schema=(
+            'CREATE TABLE IF NOT EXISTS pages (url TEXT PRIMARY KEY, page_type TEXT NOT NULL, '
+            'year INTEGER NOT NULL, table_ids TEXT NOT NULL, source TEXT, inventoried_at REAL)'))
+        self._lock = threading.Lock()
+        self._pages = None  # url -> (page type, year, frozenset of table ids), loaded on first use
+        self._seasons = None  # (page type, year) -> set of table ids seen on any page of that kind that season
+
+    def _connection(self, create=True):
+        # planning from an inventory that doesn't exist yet shouldn't leave an empty one behind
+        return self._db.connection(create)
+
+    def record(self, url, table_ids, page_type='', year=0, source='http'):
+        # what's on the page, as of now. page_type and year (e.g. 'team', 2017) let other pages of the same
+        # kind and season be planned from it
+        table_ids = frozenset(table_ids)
+        with self._connection() as conn:
+            conn.execute('INSERT OR REPLACE INTO pages (url, page_type, year, table_ids, source, inventoried_at) '
+                         'VALUES (?, ?, ?, ?, ?, ?)',
+                         (url, page_type, int(year), '\n'.join(sorted(table_ids)), source, time.time()))
+        with self._lock:
+            if self._pages is not None:
+                self.__remember(url, page_type, int(year), table_ids)
+
+    def tables_on(self, url):
+        # the table ids on the page, or None if we haven't inventoried it
+        page = self.__load().get(url)
+        return page[2] if page else None
+
+    def season_tables(self, page_type, year):
+        # every table id seen on any page of this kind in this season, or None if we haven't seen one
+        self.__load()
+        return self._seasons.get((page_type, int(year)))
+
+    def inventoried_urls(self):
+        return set(self.__load())
+
+    def discover(self, archive, page_kind, prefix=''):
+        # inventories every archived page we haven't already, straight from the archive. page_kind maps a url to
+        # (page type, year), e.g. SportsDataScraper._page_kind. returns how many pages were added
+        known = self.inventoried_urls()
+        added = 0
+        for url in archive.urls(prefix):
+            if url in known:
+                continue
+            try:
+                html = archive.get(url)
+            except (PageNotFoundError, PageNotArchivedError):
+                continue  # there's no page, so there's nothing to inventory
+            table_ids = HttpTableBackend.parse_tables(html)
+            if not table_ids:
+                continue  # an error page, most likely; better to look again than to believe it
+            self.record(url, table_ids, *page_kind(url), source='archive')
+            added += 1
+        return added
+
+    def __load(self):
+        with self._lock:
+            if self._pages is None:
+                self._pages = {}
+                self._seasons = collections.defaultdict(set)
+                conn = self._connection(create=False)
+                for url, page_type, year, table_ids in (conn.execute(
+                        'SELECT url, page_type, year, table_ids FROM pages') if conn else []):
+                    self.__remember(url, page_type, year, frozenset(t for t in table_ids.split('\n') if t))
+            return self._pages
+
+    def __remember(self, url, page_type, year, table_ids):
+        # caller must hold self._lock
+        self._pages[url] = (page_type, year, table_ids)
+        if page_type:
+            self._seasons[(page_type, year)].update(table_ids)
@@ -0,0 +1,102 @@
+import collections
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from CacheStore import FileCacheStore
+
+
+def _parse_chunk(items):
+    # runs in a worker process: items are (table name, year, team, filename, csv text or None to read the file).
+    # returns {table name: one frame for the whole chunk}, so only a few frames have to be pickled back
+    import pandas as pd
+    from TableSchema import TableSchema
+
+    frames = collections.defaultdict(list)
+    for table_name, year, team, filename, csv_text in items:
+        if csv_text is None:
+            with open(filename, 'r') as csv_file:
+                csv_text = csv_file.read()
+        frame = TableSchema.read_frame(csv_text, table_name, year=year or None, team=team or None)
+        if len(frame.columns):
+            frames[table_name].append(frame)
+
+    # numbers are typed here, once per chunk; the categoricals are left to the main process,
+    # so every chunk's categories end up in one set
+    return {table_name: TableSchema.compact(pd.concat(table_frames, ignore_index=True), table_name)
+            for table_name, table_frames in frames.items()}
+
+
+class TableParseEngine:
+    """Turns a lot of cached tables into one DataFrame per kind of table (every season's skaters in one frame,
+    every season's goalies in another, ...) on a pool of processes, since parsing is all CPU.
+
+    Files are handed out in chunks of the same kind of table. Each worker applies TableSchema's fixes (category rows,
+    footers, header fixes, Year/Team labels, compact numeric dtypes) and sends back one frame per chunk. The main
+    process just concatenates each kind of table once and sets up the categoricals."""
+
+    def __init__(self, processes=None, chunk_size=100, cache_store=None):
+        self._processes = processes or os.cpu_count() or 1
+        self._chunk_size = chunk_size
+        self._cache_store = cache_store
+
+    @property
+    def cache_store(self):
+        if self._cache_store is None:
+            from SportsDataScraper import SportsDataScraper
+            return SportsDataScraper._cache_store
+        return self._cache_store
+
+    def parse_cache(self, league='nhl', years=None, teams=None, tables=None):
+        # every cached season and team table for the league that matches the filters (None matches everything)
+        years = set(int(y) for y in years) if years is not None else None
+        filenames = []
+        for filename in self.cache_store.filenames():
+            key = self.cache_store.key_for(filename)
+            if key.league != league or not key.year:  # players, team lists and the like aren't per-season tables
+                continue
+            if years is not None and key.year not in years:
+                continue
+            if (teams is not None and key.team not in teams) or (tables is not None and key.table not in tables):
+                continue
+            filenames.append(filename)
+        return self.parse_files(filenames)
+
+    def parse_files(self, filenames):
+        # {table name: DataFrame} for the given cache files
+        from TableSchema import TableSchema
+
+        items = self.__work_items(filenames)
+        chunks = [items[i:i + self._chunk_size] for i in range(0, len(items), self._chunk_size)]
+
+        frames = collections.defaultdict(list)
+        pool = ProcessPoolExecutor(max_workers=self._processes) if self._processes > 1 and len(chunks) > 1 else None
+        try:
+            for result in (pool.map if pool else map)(_parse_chunk, chunks):
+                for table_name, frame in result.items():
+                    frames[table_name].append(frame)
+        finally:
+            if pool:
+                pool.shutdown()
+
+        # chunks of one table can disagree on a dtype (int8 in one, int16 in another, text in a third), so the
+        # columns get one more, cheap, pass over the whole table
+        return {table_name: TableSchema.concat(table_frames, table_name)
+                for table_name, table_frames in sorted(frames.items())}
+
+    def __work_items(self, filenames):
+        store = self.cache_store
+        # when the tables are plain files, the workers read them themselves; otherwise they come from the store here
+        file_store = getattr(store, 'store', store)
+        reads_files = type(file_store) is FileCacheStore
+        data = {} if reads_files else store.read_many(filenames)
+
+        items = []
+        for filename in filenames:
+            if not reads_files and filename not in data:
+                continue
+            key = store.key_for(filename)
+            items.append((key.table, key.year, key.team, filename, data.get(filename)))
+
+        # chunks of one kind of table concatenate cleanly in the workers, and come out in year order
+        items.sort(key=lambda item: (item[0], item[1], item[2]))
+        return items
@@ -0,0 +1,134 @@
+import csv
+import io
+import re
+
+import pandas as pd
+
+
+class TableSchema:
+    """Column types for the tables we scrape. Anything not listed as text or categorical is treated as a stat,
+    and stored in the smallest int/float dtype that holds it; columns that turn out not to be numbers
+    (e.g. TOI's "12:34") are left alone.
+
+    Some tables also need fixing up before they're read: header_fixes are (pattern, replacement) pairs for the
+    header line, and rows whose second field is one of the footers (e.g. 'League Average', 'Team Total') are
+    dropped before anything is typed."""
+
+    _team_footers = ['Team Total', 'League Average']
+    _schemas = {
+        # the season table leaves the team name's header blank, maybe so nobody joins on it: the Winnipeg Jets
+        # (2011-) are not the Winnipeg Jets (1979-1995). the former were the Atlanta Thrashers, the latter are
+        # now the Arizona Coyotes
+        'seasons': {'categorical': ['Year', 'Team'], 'text': [], 'header_fixes': [('^Rk,,', 'Rk,Team,')],
+                    'footers': ['League Average']},
+        # the player tables on a team page end with a 'Team Total' row (and the odd 'League Average'), which isn't
+        # a player and would turn every stat column into floats if it made it to typing
+        'roster': {'categorical': ['Year', 'Team', 'Pos', 'Flag', 'S/C'], 'text': ['Player', 'Birth Date', 'Summary'],
+                   'footers': _team_footers},
+        'skaters': {'categorical': ['Year', 'Team', 'Pos'], 'text': ['Player'], 'footers': _team_footers},
+        'skaters_playoffs': {'categorical': ['Year', 'Team', 'Pos'], 'text': ['Player'], 'footers': _team_footers},
+        'goalies': {'categorical': ['Year', 'Team'], 'text': ['Player'], 'footers': _team_footers},
+        'goalies_playoffs': {'categorical': ['Year', 'Team'], 'text': ['Player'], 'footers': _team_footers},
+        'games': {'categorical': ['Year', 'Team', 'Opponent'], 'text': ['Date', 'Notes']},
+        'games_playoffs': {'categorical': ['Year', 'Team', 'Opponent'], 'text': ['Date', 'Notes']},
+    }
+    _default_schema = {'categorical': ['Year', 'Team'], 'text': ['Player'], 'footers': _team_footers}
+
+    @staticmethod
+    def for_table(table_name):
+        return TableSchema._schemas.get(table_name, TableSchema._default_schema)
+
+    @staticmethod
+    def csv_to_frame(csv_text, table_name, year=None, team=None):
+        # one cached table as a typed frame, labelled with the season and team it came from
+        return TableSchema.apply(TableSchema.read_frame(csv_text, table_name, year, team), table_name)
+
+    @staticmethod
+    def read_frame(csv_text, table_name, year=None, team=None):
+        # the same frame, fixed up and labelled but not typed yet. typing works a column at a time, so when a lot of
+        # tables are going to be concatenated it's much cheaper to type them afterwards, all together (see concat)
+        lines = TableSchema.normalise_lines(csv_text, table_name)
+        if len(lines) < 2:  # nothing but a header, or nothing at all (still cursing the 04-05 lockout)
+            return pd.DataFrame()
+
+        # pandas' C parser reads straight into typed columns, no lists of python strings in between
+        with io.StringIO('\n'.join(lines)) as csv_file:
+            frame = pd.read_csv(csv_file)
+
+        if team is not None and 'Team' not in frame.columns:
+            frame.insert(0, 'Team', team)
+        if year is not None and 'Year' not in frame.columns:
+            frame.insert(0, 'Year', year)
+        return frame
+
+    @staticmethod
+    def normalise_lines(csv_text, table_name):
+        schema = TableSchema.for_table(table_name)
+        lines = (csv_text or '').splitlines()
+        if len(lines) > 1 and TableSchema.is_category_row(lines[0]):
+            lines = lines[1:]  # e.g. ",,,Scoring,,,Goals,," sits above the real header on a lot of tables
+        if not lines:
+            return lines
+
+        for pattern, replacement in schema.get('header_fixes', []):
+            lines[0] = re.sub(pattern, replacement, lines[0])
+
+        footers = schema.get('footers')
+        if footers:
+            rows = csv.reader(lines[1:])
+            lines = [lines[0]] + [line for line, row in zip(lines[1:], rows) if len(row) < 2 or row[1] not in footers]
+        return lines
+
+    @staticmethod
+    def concat(frames, table_name, compact=True):
+        # one concatenation for all of them, then typed all at once. the categoricals always come last,
+        # so every frame's categories end up in one set
+        frames = [f for f in frames if len(f.columns)]
+        if not frames:
+            return pd.DataFrame()
+        combined = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+        if compact:
+            combined = TableSchema.compact(combined, table_name)
+        return TableSchema.categorize(combined, table_name)
+
+    @staticmethod
+    def is_category_row(line):
+        # category rows only label a few column groups, so most of their fields are empty
+        fields = next(csv.reader([line]), [])
+        return sum(1 for f in fields if f.strip()) * 2 < len(fields)
+
+    @staticmethod
+    def apply(frame, table_name):
+        return TableSchema.categorize(TableSchema.compact(frame, table_name), table_name)
+
+    @staticmethod
+    def compact(frame, table_name):
+        schema = TableSchema.for_table(table_name)
+        for column in frame.columns:
+            if column not in schema['categorical'] and column not in schema['text']:
+                frame[column] = TableSchema.to_compact_numeric(frame[column])
+        return frame
+
+    @staticmethod
+    def categorize(frame, table_name):
+        for column in TableSchema.for_table(table_name)['categorical']:
+            if column in frame.columns:
+                frame[column] = frame[column].astype('category')
+        return frame
+
+    @staticmethod
+    def to_compact_numeric(series):
+        if pd.api.types.is_bool_dtype(series):
+            return series
+
+        numbers = series
+        if not pd.api.types.is_numeric_dtype(series):
+            as_text = series.fillna('').astype(str).str.strip()
+            as_text = as_text.where(as_text != '', None)
+            numbers = pd.to_numeric(as_text, errors='coerce')
+            if numbers.isna().sum() > as_text.isna().sum():
+                return series  # some of these weren't numbers after all, so leave the column as text
+
+        if numbers.isna().any() or (numbers != numbers.round()).any():
+            return pd.to_numeric(numbers, downcast='float')  # missing values or fractions need a float
+        return pd.to_numeric(numbers.astype('int64'), downcast='integer')
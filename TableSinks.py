@@ -0,0 +1,72 @@
+import csv
+import os
+
+
+class ConsolidatedCsvSink:
+    """Appends each kind of table to one consolidated csv as records come in, e.g. every season's skaters
+    in <output_dir>/skaters.csv, so nothing has to hold the whole multi-season dataset in memory. Every frame is
+    flushed as soon as it's written, so the files can be read while the crawl is still going, and whatever was
+    written before a crash is still there.
+
+    A csv can't grow new columns halfway down, so each file's header is fixed when it's opened: from columns
+    ({table name: [column, ...]}) when the caller knows them up front (HockeyTeamScraper.scrape_to_file takes them
+    from the newest season's pages), otherwise from the table's first frame. Later frames are lined up with it,
+    blank where they don't have a column (older seasons mostly track a subset of the same stats), and a frame with
+    a column the header doesn't have raises ValueError instead of quietly losing it."""
+
+    def __init__(self, output_dir, debug=False, columns=None):
+        self._output_dir = output_dir
+        self._debug = debug
+        self._files = {}  # table name -> open file
+        self._columns = dict(columns or {})  # table name -> the columns in that file's header
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def filename_for(self, table_name):
+        return os.path.join(self._output_dir, '{0}.csv'.format(table_name))
+
+    def columns_for(self, table_name):
+        return self._columns.get(table_name)
+
+    def set_columns(self, table_name, columns):
+        # only before the table's file is opened; after that its header is what it is
+        if table_name in self._files:
+            raise ValueError('{0} already has a header'.format(self.filename_for(table_name)))
+        self._columns[table_name] = list(columns)
+
+    def write(self, record):
+        frame = record.frame
+        if frame is None or frame.empty:
+            return
+
+        table_name = record.table
+        columns = self._columns.setdefault(table_name, list(frame.columns))
+        unexpected = [c for c in frame.columns if c not in columns]
+        if unexpected:
+            raise ValueError('{0} for {1} {2} has columns that {3} has no place for: {4}'
+                             .format(table_name, record.team, record.year, self.filename_for(table_name), unexpected))
+
+        out_file = self._files.get(table_name)
+        if out_file is None:
+            os.makedirs(self._output_dir, exist_ok=True)
+            if self._debug:
+                print('Writing {0} to {1}'.format(table_name, self.filename_for(table_name)))
+            out_file = self._files[table_name] = open(self.filename_for(table_name), 'w', newline='')
+            csv.writer(out_file, lineterminator=os.linesep).writerow(columns)  # like to_csv's rows
+
+        frame.reindex(columns=columns).to_csv(out_file, header=False, index=False)
+        out_file.flush()
+
+    def write_all(self, records):
+        for record in records:
+            self.write(record)
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+
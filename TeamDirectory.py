@@ -0,0 +1,82 @@
+import collections
+import csv
+import io
+
+
+class TeamDirectory:
+    """Every (team, season) from team_identities.csv, indexed once so that asking whether a team existed or
+    made the playoffs in a year is a dict lookup instead of a scan over every identity we know about.
+
+    Identity rows are dicts with Year, League, Abbrev, Name and Made_Playoffs, plus the abbreviation of the
+    Franchise they belong to (older caches don't have that column, so each abbreviation is its own franchise)."""
+
+    def __init__(self, identities, defunct_tag=' (defunct)'):
+        self._by_team_season = {}  # (abbrev, year) -> identity row
+        self._seasons = collections.defaultdict(set)  # abbrev -> years
+        self._teams_by_year = collections.defaultdict(set)  # year -> abbrevs
+        self._lineage = collections.defaultdict(list)  # franchise -> [(year, abbrev, name)], oldest first
+        self._franchise_by_name = {}
+
+        for row in identities:
+            year = int(row['Year'])
+            abbrev = row['Abbrev']
+            franchise = row.get('Franchise') or abbrev
+            self._by_team_season[(abbrev, year)] = row
+            self._seasons[abbrev].add(year)
+            self._teams_by_year[year].add(abbrev)
+            self._lineage[franchise].append((year, abbrev, row['Name']))
+
+        for franchise in self._lineage:
+            self._lineage[franchise].sort()
+
+        # a franchise is known by its most recent name. when two franchises share one (hello, Winnipeg Jets),
+        # the one that played more recently keeps it and the other gets the defunct tag, same as the overview does
+        for franchise in sorted(self._lineage, key=lambda f: self._lineage[f][-1][0], reverse=True):
+            name = self._lineage[franchise][-1][2]
+            if name in self._franchise_by_name:
+                name += defunct_tag
+            self._franchise_by_name.setdefault(name, franchise)
+
+    @staticmethod
+    def from_csv(csv_text):
+        with io.StringIO(csv_text) as in_file:
+            return TeamDirectory(list(csv.DictReader(in_file)))
+
+    @property
+    def abbrevs(self):
+        return set(self._seasons)
+
+    @property
+    def franchises(self):
+        return set(self._lineage)
+
+    def did_team_exist(self, abbrev, year):
+        return (abbrev, int(year)) in self._by_team_season
+
+    # Hockey-Reference does already have 2017 playoff data online, but the teams who made the
+    # playoffs in 2017 aren't yet marked as having done so on their franchise page. (2017-Jun-08)
+    def did_team_make_playoffs(self, abbrev, year):
+        row = self._by_team_season.get((abbrev, int(year)))
+        return bool(row) and str(row['Made_Playoffs']).upper() == str(True).upper()
+
+    def identity(self, abbrev, year):
+        return self._by_team_season.get((abbrev, int(year)))
+
+    def seasons_for_team(self, abbrev):
+        return sorted(self._seasons.get(abbrev, ()))
+
+    def lineage(self, franchise):
+        return list(self._lineage.get(franchise, ()))
+
+    def franchise_for_name(self, name):
+        return self._franchise_by_name.get(name)
+
+    def team_seasons(self, years, teams=None):
+        # only the (year, team) pairs that actually happened, in the order the years were given
+        ret_val = []
+        for year in years:
+            season_teams = self._teams_by_year.get(int(year), set())
+            if teams is not None:
+                season_teams = season_teams.intersection(teams)
+            ret_val.extend((year, abbrev) for abbrev in sorted(season_teams))
+        return ret_val
@@ -0,0 +1,188 @@
+import atexit
+import contextlib
+import threading
+
+
+class WebDriverPool:
+    """Hands out one browser per crawler thread. Nothing is launched until a thread actually asks for a
+    driver, drivers are health-checked before they're handed out, and each one is retired after
+    max_pages page loads (or as soon as it crashes) so a dead browser can't stall the whole run.
+
+    Browsers start with a lean profile: we only ever want the tables and the site's own "Get as CSV" script,
+    so images, web fonts, autoplaying media, prefetching, the disk cache and known ad/tracker hosts are all
+    switched off, and page loads return as soon as the DOM is ready instead of waiting for every last ad."""
+
+    lean_preferences = {
+        'permissions.default.image': 2,  # don't load images
+        'gfx.downloadable_fonts.enabled': False,
+        'browser.display.use_document_fonts': 0,
+        'media.autoplay.default': 5,  # block all autoplay
+        'privacy.trackingprotection.enabled': True,  # ad, analytics and social scripts from the blocklists
+        'privacy.trackingprotection.socialtracking.enabled': True,
+        'privacy.trackingprotection.cryptomining.enabled': True,
+        'privacy.trackingprotection.fingerprinting.enabled': True,
+        'browser.cache.disk.enable': False,  # every page is loaded once (and archived), so nothing's worth keeping
+        'browser.cache.memory.enable': True,  # ...but the site's scripts and css are the same from page to page
+        'network.prefetch-next': False,
+        'network.dns.disablePrefetch': True,
+        'network.http.speculative-parallel-limit': 0,
+        'browser.shell.checkDefaultBrowser': False,
+        'app.update.auto': False,
+        'datareporting.healthreport.uploadEnabled': False,
+        'toolkit.telemetry.enabled': False,
+    }
+
+    def __init__(self, size=1, max_pages=250, headless=True, driver_factory=None, lean=True, page_load_timeout=60):
+        self._size = max(int(size), 1)
+        self._max_pages = max_pages
+        self._headless = headless
+        self._lean = lean
+        self._page_load_timeout = page_load_timeout
+        self._driver_factory = driver_factory or self._create_driver
+
+        self._condition = threading.Condition()
+        self._idle = []
+        self._leases = {}  # thread id -> driver
+        self._page_counts = {}  # driver -> pages loaded
+        self._retired = set()
+        self._starting = 0
+        self._registered_atexit = False
+
+    @property
+    def live_drivers(self):
+        return len(self._page_counts) + self._starting
+
+    def acquire(self):
+        thread_id = threading.get_ident()
+        while True:
+            with self._condition:
+                if thread_id in self._leases:
+                    return self._leases[thread_id]
+
+                while not self._idle and self.live_drivers >= self._size:
+                    self._condition.wait()
+                if not self._idle:
+                    # reserve the slot before letting go of the lock, since starting a browser takes a while
+                    self._starting += 1
+                    break
+                # it keeps its slot (it's still in _page_counts) while it's being checked
+                driver = self._idle.pop()
+
+            # a health check is a round trip to the browser, and a wedged one can take a while to answer, so the
+            # other threads aren't kept waiting on the lock for it
+            healthy = WebDriverPool.is_healthy(driver)
+            with self._condition:
+                if driver not in self._page_counts:
+                    continue  # the pool was shut down in the meantime
+                if healthy:
+                    self._leases[thread_id] = driver
+                    return driver
+                self.__untrack(driver)
+                self._condition.notify()
+            WebDriverPool.__quit(driver)
+
+        try:
+            driver = self._driver_factory()
+        except BaseException:
+            with self._condition:
+                self._starting -= 1
+                self._condition.notify()
+            raise
+
+        # the new driver takes over its reserved slot in one step, so live_drivers never dips in between and lets
+        # another thread start a browser it shouldn't
+        with self._condition:
+            self._starting -= 1
+            self._page_counts[driver] = 0
+            self._leases[thread_id] = driver
+            if not self._registered_atexit:
+                atexit.register(self.shutdown)
+                self._registered_atexit = True
+        return driver
+
+    def release(self):
+        with self._condition:
+            driver = self._leases.pop(threading.get_ident(), None)
+            if driver is None:
+                return
+
+            if driver in self._retired:
+                self.__forget(driver)
+            else:
+                self._idle.append(driver)
+            self._condition.notify()
+
+    @contextlib.contextmanager
+    def lease(self):
+        try:
+            yield self.acquire()
+        finally:
+            self.release()
+
+    def note_page(self, driver):
+        with self._condition:
+            if driver in self._page_counts:
+                self._page_counts[driver] += 1
+                if self._max_pages and self._page_counts[driver] >= self._max_pages:
+                    self._retired.add(driver)
+
+    def discard(self):
+        # the current thread's driver crashed (or is otherwise unusable); throw it away and free up its slot
+        with self._condition:
+            driver = self._leases.pop(threading.get_ident(), None)
+            if driver is not None:
+                self.__forget(driver)
+            self._condition.notify()
+
+    def shutdown(self):
+        with self._condition:
+            for driver in list(self._page_counts):
+                self.__forget(driver)
+            self._idle = []
+            self._leases = {}
+            self._condition.notify_all()
+
+    def __forget(self, driver):
+        # caller must hold self._condition
+        self.__untrack(driver)
+        WebDriverPool.__quit(driver)
+
+    def __untrack(self, driver):
+        # caller must hold self._condition
+        self._page_counts.pop(driver, None)
+        self._retired.discard(driver)
+        if driver in self._idle:
+            self._idle.remove(driver)
+
+    @staticmethod
+    def __quit(driver):
+        try:
+            driver.quit()
+        except Exception:
+            pass  # it's already dead, which is why we're here
+
+    @staticmethod
+    def is_healthy(driver):
+        try:
+            driver.current_url  # a cheap round trip to the browser
+            return True
+        except Exception:
+            return False
+
+    def _create_driver(self):
+        # selenium is only imported once someone actually needs a browser
+        from selenium import webdriver
+
+        options = webdriver.FirefoxOptions()
+        if self._headless:
+            options.add_argument('-headless')
+        if self._lean:
+            for name, value in WebDriverPool.lean_preferences.items():
+                options.set_preference(name, value)
+            # driver.get returns once the DOM is ready; anything else we need gets an explicit wait
+            options.page_load_strategy = 'eager'
+
+        driver = webdriver.Firefox(options=options)
+        if self._page_load_timeout:
+            driver.set_page_load_timeout(self._page_load_timeout)
+        return driver
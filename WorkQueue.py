@@ -0,0 +1,330 @@
+"""A crawl split across processes (or hosts sharing one cache directory) through a lease-based SQLite work queue.
+
+    python WorkQueue.py plan --start 1990 --end 2017 --seasons --teams
+    python WorkQueue.py work --workers 4
+    python WorkQueue.py status
+"""
+import argparse
+import collections
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from SqliteDatabase import SqliteDatabase
+
+
+QueueItem = collections.namedtuple('QueueItem', ['id', 'league', 'year', 'team', 'page', 'status', 'attempts',
+                                                 'owner', 'lease_expires', 'error'])
+
+
+class WorkQueue:
+    """Work units are (league, year, team, page), e.g. ('nhl', 2017, 'PIT', 'games') or ('nhl', 2017, '', 'season').
+    A worker leases a few at a time for lease_seconds and keeps renewing them with heartbeat() while it works.
+    A lease that runs out (the worker crashed, or its host went away) goes back in the queue for someone else,
+    and a unit that keeps failing, or keeps outliving its leases, is given up on after max_attempts.
+
+    Everything lives in one SQLite file, so any process that can open it can take part; across hosts, that means
+    a shared filesystem whose locking SQLite trusts."""
+
+    PENDING = 'pending'
+    LEASED = 'leased'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    def __init__(self, db_filename, max_attempts=4):
+        self._max_attempts = max_attempts
+        # autocommit, so lease() can take the write lock up front with BEGIN IMMEDIATE
+        self._db = SqliteDatabase(db_filename, autocommit=True, schema=(
+            'CREATE TABLE IF NOT EXISTS work_items ('
+            'id INTEGER PRIMARY KEY, league TEXT NOT NULL, year INTEGER NOT NULL, team TEXT NOT NULL, '
+            'page TEXT NOT NULL, status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, '
+            'owner TEXT, lease_expires REAL, error TEXT, UNIQUE (league, year, team, page));'
+            'CREATE INDEX IF NOT EXISTS work_items_status ON work_items (status, lease_expires);'))
+
+    def _connection(self):
+        return self._db.connection()
+
+    def enqueue(self, league, pages):
+        # pages are (year, team, page) tuples; units that are already queued, finished or not, are left alone
+        conn = self._connection()
+        before = conn.total_changes
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany('INSERT OR IGNORE INTO work_items (league, year, team, page, status) '
+                             'VALUES (?, ?, ?, ?, ?)',
+                             [(league, int(year), team or '', page, WorkQueue.PENDING) for year, team, page in pages])
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return conn.total_changes - before
+
+    def lease(self, owner, count=1, lease_seconds=300):
+        conn = self._connection()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')  # one worker at a time hands itself work, so no unit goes out twice
+        try:
+            self.__requeue_expired(conn, now)
+            rows = conn.execute('SELECT id FROM work_items WHERE status = ? ORDER BY year DESC, team, page LIMIT ?',
+                                (WorkQueue.PENDING, count)).fetchall()
+            ids = [row[0] for row in rows]
+            conn.executemany('UPDATE work_items SET status = ?, owner = ?, lease_expires = ?, '
+                             'attempts = attempts + 1 WHERE id = ?',
+                             [(WorkQueue.LEASED, owner, now + lease_seconds, i) for i in ids])
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return self.__items(ids)
+
+    def heartbeat(self, owner, item_ids, lease_seconds=300):
+        # returns the ids this owner still holds; anything missing was reclaimed and may be someone else's now
+        if not item_ids:
+            return set()
+        conn = self._connection()
+        placeholders = ','.join('?' * len(item_ids))
+        conn.execute('UPDATE work_items SET lease_expires = ? WHERE status = ? AND owner = ? AND id IN ({0})'
+                     .format(placeholders), [time.time() + lease_seconds, WorkQueue.LEASED, owner] + list(item_ids))
+        rows = conn.execute('SELECT id FROM work_items WHERE status = ? AND owner = ? AND id IN ({0})'
+                            .format(placeholders), [WorkQueue.LEASED, owner] + list(item_ids))
+        return set(row[0] for row in rows)
+
+    def complete(self, owner, item_id):
+        self._connection().execute('UPDATE work_items SET status = ?, lease_expires = NULL, error = NULL '
+                                   'WHERE id = ? AND owner = ?', (WorkQueue.DONE, item_id, owner))
+
+    def fail(self, owner, item_id, error):
+        # back in the queue for another try, unless it's already had max_attempts of them
+        self._connection().execute('UPDATE work_items SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, '
+                                   'lease_expires = NULL, error = ? WHERE id = ? AND owner = ?',
+                                   (self._max_attempts, WorkQueue.FAILED, WorkQueue.PENDING, str(error), item_id,
+                                    owner))
+
+    def requeue_expired(self):
+        conn = self._connection()
+        with conn:
+            return self.__requeue_expired(conn, time.time())
+
+    def retry_failed(self):
+        cursor = self._connection().execute('UPDATE work_items SET status = ?, attempts = 0, owner = NULL '
+                                            'WHERE status = ?', (WorkQueue.PENDING, WorkQueue.FAILED))
+        return cursor.rowcount
+
+    def progress(self):
+        # {status: count}, counting leases that have run out as whatever they'll be requeued as
+        rows = self._connection().execute(
+            'SELECT CASE WHEN status = ? AND lease_expires < ? THEN CASE WHEN attempts >= ? THEN ? ELSE ? END '
+            'ELSE status END, COUNT(*) FROM work_items GROUP BY 1',
+            (WorkQueue.LEASED, time.time(), self._max_attempts, WorkQueue.FAILED, WorkQueue.PENDING))
+        ret_val = dict.fromkeys((WorkQueue.PENDING, WorkQueue.LEASED, WorkQueue.DONE, WorkQueue.FAILED), 0)
+        for status, count in rows:
+            ret_val[status] += count
+        return ret_val
+
+    def is_drained(self):
+        progress = self.progress()
+        return not progress[WorkQueue.PENDING] and not progress[WorkQueue.LEASED]
+
+    def failures(self):
+        rows = self._connection().execute('SELECT * FROM work_items WHERE status = ? ORDER BY year, team, page',
+                                          (WorkQueue.FAILED,))
+        return [QueueItem(*row) for row in rows]
+
+    def __items(self, ids):
+        if not ids:
+            return []
+        rows = self._connection().execute('SELECT * FROM work_items WHERE id IN ({0}) ORDER BY year DESC, team, page'
+                                          .format(','.join('?' * len(ids))), ids)
+        return [QueueItem(*row) for row in rows]
+
+    def __requeue_expired(self, conn, now):
+        # a lease that ran out counts as a failed attempt: a unit whose worker keeps dying on it (a page that
+        # crashes the browser, say) is given up on after max_attempts like any other failure
+        cursor = conn.execute('UPDATE work_items SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, '
+                              "error = CASE WHEN attempts >= ? THEN 'lease expired' ELSE error END, "
+                              'owner = NULL, lease_expires = NULL WHERE status = ? AND lease_expires < ?',
+                              (self._max_attempts, WorkQueue.FAILED, WorkQueue.PENDING, self._max_attempts,
+                               WorkQueue.LEASED, now))
+        return cursor.rowcount
+
+
+class QueueWorker:
+    """Leases units from a WorkQueue and scrapes them until the queue is drained. Each worker has its own scrapers,
+    so its own http session and browser, and a background thread that keeps its leases alive while it works."""
+
+    def __init__(self, queue, owner=None, batch_size=4, lease_seconds=300, idle_seconds=2, site_root=None,
+                 debug=False):
+        self._queue = queue
+        self._owner = owner or '{0}:{1}'.format(socket.gethostname(), os.getpid())
+        self._batch_size = batch_size
+        self._lease_seconds = lease_seconds
+        self._idle_seconds = idle_seconds
+        self._site_root = site_root
+        self._debug = debug
+        self._scrapers = {}
+        self._held = set()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def run(self):
+        heartbeat = threading.Thread(target=self.__heartbeat, name='lease-heartbeat', daemon=True)
+        heartbeat.start()
+        try:
+            while True:
+                items = self._queue.lease(self._owner, self._batch_size, self._lease_seconds)
+                if not items:
+                    if self._queue.is_drained():
+                        break
+                    time.sleep(self._idle_seconds)  # others hold the rest; wait in case their leases run out
+                    continue
+
+                with self._lock:
+                    self._held.update(i.id for i in items)
+                for item in items:
+                    self.__work_on(item)
+        finally:
+            self._stopped.set()
+            heartbeat.join()
+            for scraper in self._scrapers.values():
+                scraper.close()
+
+    def __work_on(self, item):
+        try:
+            if item.id not in self.__still_held():
+                return  # our lease ran out before we got to it, so it's someone else's now
+            self._scraper_for(item).scrape_page(item.year, item.team, item.page)
+        except Exception as e:
+            self._queue.fail(self._owner, item.id, e)
+            print('[{0}] {1} {2} {3} failed: {4}'.format(self._owner, item.year, item.team, item.page, e))
+        else:
+            self._queue.complete(self._owner, item.id)
+        finally:
+            with self._lock:
+                self._held.discard(item.id)
+
+    def __still_held(self):
+        with self._lock:
+            held = set(self._held)
+        return self._queue.heartbeat(self._owner, held, self._lease_seconds)
+
+    def __heartbeat(self):
+        # renew well before the lease could run out, even if a page takes a while
+        while not self._stopped.wait(self._lease_seconds / 3.0):
+            self.__still_held()
+
+    def _scraper_for(self, item):
+        # one unit at a time per process; to go faster, run more processes
+        kind = 'seasons' if item.page == 'season' else 'teams'
+        if kind not in self._scrapers:
+            if kind == 'seasons':
+                from HockeySeasonScraper import HockeySeasonScraper as scraper_class
+            else:
+                from HockeyTeamScraper import HockeyTeamScraper as scraper_class
+            self._scrapers[kind] = QueueWorker.scraper(scraper_class, self._site_root, debug=self._debug)
+        return self._scrapers[kind]
+
+    @staticmethod
+    def scraper(scraper_class, site_root=None, **kwargs):
+        scraper = scraper_class(workers=1, **kwargs)
+        if site_root:
+            from SportConfig import SportConfig
+            scraper._config = SportConfig.NHL(site_root)  # e.g. a mirror, or the benchmarks' stand-in
+        return scraper
+
+
+def default_queue_filename(league='nhl'):
+    return os.path.join(os.path.curdir, 'cache', league, 'work_queue.sqlite3')
+
+
+def format_progress(progress):
+    total = sum(progress.values())
+    finished = progress[WorkQueue.DONE] + progress[WorkQueue.FAILED]
+    return '{0}/{1} done ({2:.1f}%), {3} leased, {4} pending, {5} failed'.format(
+        progress[WorkQueue.DONE], total, 100.0 * finished / total if total else 100.0, progress[WorkQueue.LEASED],
+        progress[WorkQueue.PENDING], progress[WorkQueue.FAILED])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--queue', help='queue file (default: cache/nhl/work_queue.sqlite3)')
+    parser.add_argument('--site-root', help='scrape somewhere other than www.hockey-reference.com')
+    subparsers = parser.add_subparsers(dest='command')
+
+    plan = subparsers.add_parser('plan', help='queue up the pages for a range of seasons')
+    plan.add_argument('--start', type=int, required=True, help='first season')
+    plan.add_argument('--end', type=int, required=True, help='last season (included, like --start)')
+    plan.add_argument('--seasons', action='store_true', help='season summary pages')
+    plan.add_argument('--teams', action='store_true', help='team-season and games pages')
+    plan.add_argument('--team', action='append', help='only these teams (repeatable)')
+
+    work = subparsers.add_parser('work', help='start worker processes and report progress until the queue is empty')
+    work.add_argument('--workers', type=int, default=2)
+    work.add_argument('--batch', type=int, default=4, help='units each worker leases at a time')
+    work.add_argument('--lease', type=float, default=300, help='lease length, in seconds')
+    work.add_argument('--interval', type=float, default=10, help='seconds between progress reports')
+    work.add_argument('--requests-per-minute', type=float, default=20,
+                      help='for all of these workers together; each one gets an equal share')
+    work.add_argument('--debug', action='store_true')
+
+    subparsers.add_parser('status', help='show how far along the queue is')
+    subparsers.add_parser('retry', help='put failed units back in the queue')
+
+    worker = subparsers.add_parser('worker', help=argparse.SUPPRESS)
+    worker.add_argument('--batch', type=int, default=4)
+    worker.add_argument('--lease', type=float, default=300)
+    worker.add_argument('--requests-per-minute', type=float, default=20)
+    worker.add_argument('--debug', action='store_true')
+
+    args = parser.parse_args()
+    queue_filename = args.queue or default_queue_filename()
+    queue = WorkQueue(queue_filename)
+
+    if args.command == 'plan':
+        from SportConfig import SportConfig
+        pages = []
+        if args.seasons:
+            from HockeySeasonScraper import HockeySeasonScraper
+            with QueueWorker.scraper(HockeySeasonScraper, args.site_root) as scraper:
+                pages += scraper.plan_pages(args.start, args.end)
+        if args.teams:
+            from HockeyTeamScraper import HockeyTeamScraper
+            with QueueWorker.scraper(HockeyTeamScraper, args.site_root) as scraper:
+                pages += scraper.plan_pages(args.start, args.end, args.team)
+        added = queue.enqueue(SportConfig.NHL().league_name, pages)
+        print('Queued {0} new units ({1} already queued). {2}'.format(added, len(pages) - added,
+                                                                      format_progress(queue.progress())))
+    elif args.command == 'work':
+        command = [sys.executable, os.path.abspath(__file__), '--queue', queue_filename] + \
+                  (['--site-root', args.site_root] if args.site_root else []) + ['worker',
+                   '--batch', str(args.batch), '--lease', str(args.lease),
+                   '--requests-per-minute', str(args.requests_per_minute / max(args.workers, 1))] + \
+                  (['--debug'] if args.debug else [])
+        processes = [subprocess.Popen(command) for _ in range(max(args.workers, 1))]
+        while any(p.poll() is None for p in processes):
+            print(format_progress(queue.progress()))
+            sys.stdout.flush()
+            time.sleep(args.interval)
+        print(format_progress(queue.progress()))
+        for item in queue.failures():
+            print('Gave up on {0} {1} {2} after {3} attempts: {4}'.format(item.year, item.team, item.page,
+                                                                          item.attempts, item.error))
+    elif args.command == 'worker':
+        # the rate limiter only covers one process, so the processes split the host's budget between them
+        from CrawlScheduler import HostRateLimiter
+        from SportsDataScraper import SportsDataScraper
+        SportsDataScraper._rate_limiter = HostRateLimiter(requests_per_minute=args.requests_per_minute)
+        QueueWorker(queue, batch_size=args.batch, lease_seconds=args.lease, site_root=args.site_root,
+                    debug=args.debug).run()
+    elif args.command == 'retry':
+        print('Retrying {0} failed units.'.format(queue.retry_failed()))
+    elif args.command == 'status':
+        print(format_progress(queue.progress()))
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,414 @@
+import hashlib
+import html
+import random
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FixtureSite:
+    """A made-up but hockey-reference-shaped league: the same urls, table ids, "Share & more -> Get as CSV"
+    widgets and commented-out tables as the real site, generated from a fixed seed so every run sees the
+    same pages."""
+
+    _franchises = [('BOS', 'Boston Bruins'), ('MTL', 'Montreal Canadiens'), ('TOR', 'Toronto Maple Leafs'),
+                   ('CHI', 'Chicago Blackhawks'), ('DET', 'Detroit Red Wings'), ('NYR', 'New York Rangers'),
+                   ('PIT', 'Pittsburgh Penguins'), ('PHI', 'Philadelphia Flyers'), ('STL', 'St. Louis Blues'),
+                   ('LAK', 'Los Angeles Kings'), ('BUF', 'Buffalo Sabres'), ('VAN', 'Vancouver Canucks')]
+    _positions = ['C', 'LW', 'RW', 'D', 'D', 'C', 'LW', 'RW', 'D']
+
+    # the widget and the script behind "Get as CSV": uncomment the table if needed, then write it out as csv
+    # into a <pre id="csv_..."> the same way the real site does
+    _csv_script = '''<script>
+function sr_get_csv(wrapper_id) {
+  var wrapper = document.getElementById(wrapper_id);
+  if (!wrapper.querySelector('table')) {
+    for (var node of wrapper.querySelectorAll('div')) {
+      for (var child of node.childNodes) {
+        if (child.nodeType === Node.COMMENT_NODE) { node.innerHTML = child.nodeValue; }
+      }
+    }
+  }
+  var lines = [];
+  for (var row of wrapper.querySelectorAll('table tr')) {
+    if (row.parentNode.tagName === 'TBODY' && row.classList.contains('thead')) { continue; }
+    var fields = [];
+    for (var cell of row.children) {
+      var text = cell.textContent.trim();
+      if (cell.dataset.appendCsv) { text += '\\\\' + cell.dataset.appendCsv; }
+      fields.push(text.indexOf(',') >= 0 ? '"' + text + '"' : text);
+      for (var i = 1; i < (cell.colSpan || 1); i++) { fields.push(''); }
+    }
+    lines.push(fields.join(','));
+  }
+  var pre = document.createElement('pre');
+  pre.id = wrapper_id.replace(/^all/, 'csv');
+  pre.textContent = lines.join('\\n');
+  wrapper.appendChild(pre);
+}
+</script>'''
+
+    def __init__(self, first_year=1918, last_year=2017, teams=8, seed=0):
+        self.first_year = first_year
+        self.last_year = last_year
+        self.franchises = FixtureSite._franchises[:teams]
+        self.seed = seed
+
+    def page(self, path):
+        # the html served at path, or None for a 404
+        if path == '/teams/':
+            return self.teams_page()
+
+        match = re.match(r'^/teams/([A-Z]{3})/$', path)
+        if match and self.__is_franchise(match.group(1)):
+            return self.franchise_page(match.group(1))
+
+        match = re.match(r'^/teams/([A-Z]{3})/(\d{4})(_games)?\.html$', path)
+        if match and self.__is_franchise(match.group(1)) and self.__is_season(int(match.group(2))):
+            if match.group(3):
+                return self.games_page(match.group(1), int(match.group(2)))
+            return self.team_page(match.group(1), int(match.group(2)))
+
+        match = re.match(r'^/leagues/NHL_(\d{4})\.html$', path)
+        if match and self.__is_season(int(match.group(1))):
+            return self.season_page(int(match.group(1)))
+
+        match = re.match(r'^/players/([a-z])/(\1[a-z]{1,6}0\d)\.html$', path)
+        if match:
+            return self.player_page(match.group(2))
+
+        return None
+
+    def team_identities_csv(self):
+        # what HockeyTeamScraper would build from /teams/ and every franchise page
+        lines = ['Year,League,Abbrev,Name,Made_Playoffs,Franchise']
+        for year in range(self.first_year, self.last_year + 1):
+            for abbrev, name in self.franchises:
+                lines.append('{0},NHL,{1},{2},{3},{1}'.format(year, abbrev, name, self.made_playoffs(abbrev, year)))
+        return '\n'.join(lines)
+
+    def made_playoffs(self, abbrev, year):
+        return self.__random(abbrev, year, 'playoffs').random() < 0.6
+
+    def teams_page(self):
+        header = ['Franchise', 'Lg', 'From', 'To', 'Yrs', 'GP', 'W', 'L', 'T', 'OL', 'PTS', 'PTS%']
+        rows = []
+        for abbrev, name in self.franchises:
+            rng = self.__random(abbrev, 'franchise')
+            rows.append([('<a href="/teams/{0}/">{1}</a>'.format(abbrev, html.escape(name)), {}), ('NHL', {}),
+                         (self.first_year, {}), (self.last_year, {}), (self.last_year - self.first_year + 1, {})] +
+                        [(rng.randint(100, 6000), {}) for _ in header[5:]])
+        body = self.__table_section('active_franchises', 'Active Franchises', [header], rows, commented=False)
+        body += self.__table_section('defunct_franchises', 'Defunct Franchises', [header], [], commented=True)
+        return self.__page('NHL Teams', body)
+
+    def franchise_page(self, abbrev):
+        name = dict(self.franchises)[abbrev]
+        header = ['Season', 'Lg', 'Team', 'GP', 'W', 'L', 'PTS']
+        rows = []
+        for year in range(self.last_year, self.first_year - 1, -1):
+            link = '<a href="/teams/{0}/{1}.html">{2}</a>{3}'.format(
+                abbrev, year, html.escape(name), '*' if self.made_playoffs(abbrev, year) else '')
+            rng = self.__random(abbrev, year, 'record')
+            rows.append([('{0}-{1}'.format(year - 1, str(year)[2:]), {}), ('NHL', {}), (link, {}), (82, {}),
+                         (rng.randint(20, 55), {}), (rng.randint(20, 50), {}), (rng.randint(50, 120), {})])
+        return self.__page(name, self.__table_section(abbrev, name, [header], rows, commented=False))
+
+    def season_page(self, year):
+        over_header = [('', 2), ('', 4), ('Scoring', 2), ('Special Teams', 2)]
+        header = ['Rk', '', 'AvAge', 'GP', 'W', 'L', 'GF', 'GA', 'PP%', 'PK%']
+        rows = []
+        for rank, (abbrev, name) in enumerate(self.franchises, start=1):
+            rng = self.__random(abbrev, year, 'season')
+            playoff_mark = '*' if self.made_playoffs(abbrev, year) else ''
+            rows.append([(rank, {}), ('<a href="/teams/{0}/{1}.html">{2}</a>{3}'
+                                      .format(abbrev, year, html.escape(name), playoff_mark), {}),
+                         ('{0:.1f}'.format(rng.uniform(25, 30)), {}), (82, {}), (rng.randint(20, 55), {}),
+                         (rng.randint(20, 50), {}), (rng.randint(180, 300), {}), (rng.randint(180, 300), {}),
+                         ('{0:.1f}'.format(rng.uniform(12, 25)), {}), ('{0:.1f}'.format(rng.uniform(75, 88)), {})])
+        footer = [[('', {}), ('League Average', {}), ('27.9', {}), (82, {}), (41, {}), (41, {}), (240, {}),
+                   (240, {}), ('18.0', {}), ('82.0', {})]]
+        # the real season page asks for '#all-stats'
+        body = self.__table_section('stats', 'Team Statistics', [header], rows, commented=False,
+                                    over_header=over_header, footer=footer, wrapper_id='all-stats')
+        return self.__page('{0} NHL Season Summary'.format(year), body)
+
+    def team_page(self, abbrev, year):
+        players = self.__players(abbrev, year)
+        playoffs = self.made_playoffs(abbrev, year)
+        sections = [self.__roster_section(players),
+                    self.__skaters_section('skaters', 'Scoring Regular Season', players, year, commented=False),
+                    self.__goalies_section('goalies', 'Goalies', players, year, commented=True)]
+        if playoffs:
+            sections += [self.__skaters_section('skaters_playoffs', 'Scoring Playoffs', players, year + 1, True),
+                         self.__goalies_section('goalies_playoffs', 'Goalies Playoffs', players, year + 1, True)]
+        if year > 2007:
+            sections += [self.__simple_section('stats_adv_rs', 'Advanced Regular Season', players, year,
+                                               ['CF', 'CA', 'CF%', 'FF', 'FA', 'oiSH%', 'oiSV%']),
+                         self.__simple_section('stats_toi', 'Time on Ice', players, year,
+                                               ['Shift', 'EV TOI', 'PP TOI', 'SH TOI'])]
+            if playoffs:
+                sections.append(self.__simple_section('stats_adv_pl', 'Advanced Playoffs', players, year + 1,
+                                                      ['CF', 'CA', 'CF%', 'FF', 'FA', 'oiSH%', 'oiSV%']))
+        if year > 2008:
+            sections += [self.__simple_section('shootout', 'Shootout', players, year, ['Att', 'Made', 'Miss', '%']),
+                         self.__simple_section('shootout_goalies', 'Shootout Goalies', players[-2:], year,
+                                               ['Att', 'Made', 'Miss', '%'])]
+        return self.__page('{0} {1} Roster and Statistics'.format(year, dict(self.franchises)[abbrev]),
+                           ''.join(sections))
+
+    def player_page(self, player_id):
+        # any well-formed id has a page; a career of a few seasons, with the misc stats hidden in a comment
+        rng = self.__random(player_id, 'career')
+        first_season = rng.randint(self.first_year, self.last_year)
+        seasons = range(first_season, min(first_season + rng.randint(1, 12), self.last_year + 1))
+
+        over_header = [('', 4), ('Scoring', 4)]
+        header = ['Season', 'Age', 'Tm', 'Lg', 'GP', 'G', 'A', 'PTS', '+/-', 'PIM', 'S', 'S%']
+        misc_header = ['Season', 'Age', 'Tm', 'Lg', 'GP', 'GC', 'G/GP', 'A/GP', 'PTS/GP', 'TGF', 'TGA']
+        rows, misc_rows = [], []
+        for age, year in enumerate(seasons, start=rng.randint(18, 22)):
+            season = ('{0}-{1}'.format(year - 1, str(year)[2:]), {})
+            team = (rng.choice(self.franchises)[0], {})
+            games, goals, shots = rng.randint(1, 82), rng.randint(0, 50), rng.randint(50, 320)
+            rows.append([season, (age, {}), team, ('NHL', {}), (games, {}), (goals, {}), (rng.randint(0, 60), {}),
+                         (rng.randint(0, 110), {}), (rng.randint(-25, 35), {}), (rng.randint(0, 150), {}),
+                         (shots, {}), ('{0:.1f}'.format(100.0 * goals / shots), {})])
+            misc_rows.append([season, (age, {}), team, ('NHL', {}), (games, {}), (rng.randint(0, 40), {})] +
+                             [('{0:.2f}'.format(rng.uniform(0, 1.2)), {}) for _ in range(3)] +
+                             [(rng.randint(10, 120), {}), (rng.randint(10, 120), {})])
+
+        body = self.__table_section('stats_basic_plus_nhl', 'NHL Standard', [header], rows, commented=False,
+                                    over_header=over_header)
+        body += self.__table_section('stats_misc_plus_nhl', 'NHL Miscellaneous', [misc_header], misc_rows,
+                                     commented=True)
+        return self.__page(player_id, body)
+
+    def games_page(self, abbrev, year):
+        header = ['GP', 'Date', 'Opponent', 'GF', 'GA', '', 'OT', 'W', 'L', 'OL', 'Streak']
+        sections = [self.__games_section('games', 'Regular Season', abbrev, year, 82, header)]
+        if self.made_playoffs(abbrev, year):
+            sections.append(self.__games_section('games_playoffs', 'Playoffs', abbrev, year + 1, 16, header))
+        return self.__page('{0} {1} Schedule and Results'.format(year, dict(self.franchises)[abbrev]),
+                           ''.join(sections))
+
+    def __games_section(self, table_id, title, abbrev, year, games, header):
+        rng = self.__random(abbrev, year, table_id)
+        opponents = [name for a, name in self.franchises if a != abbrev]
+        rows, wins, losses = [], 0, 0
+        for game in range(1, games + 1):
+            gf, ga = rng.randint(0, 7), rng.randint(0, 7)
+            won = gf > ga
+            wins, losses = wins + won, losses + (not won)
+            rows.append([(game, {}), ('{0}-{1:02d}-{2:02d}'.format(year - 1, 10 + game // 31 % 3, game % 28 + 1), {}),
+                         (rng.choice(opponents), {}), (gf, {}), (ga, {}), ('W' if won else 'L', {}), ('', {}),
+                         (wins, {}), (losses, {}), (0, {}), ('W 1' if won else 'L 1', {})])
+        return self.__table_section(table_id, title, [header], rows, commented=table_id != 'games')
+
+    def __roster_section(self, players):
+        header = ['No.', 'Player', 'Flag', 'Age', 'Pos', 'Ht', 'Wt', 'S/C', 'Exp', 'Birth Date', 'Summary']
+        rows = []
+        for number, (player_id, name, age, position) in enumerate(players, start=1):
+            rows.append([(number, {}), self.__player_cell(player_id, name), ('ca', {}), (age, {}),
+                         (position, {}), ('6-0', {}), (190, {}), ('L', {}), (max(age - 20, 0), {}),
+                         ('January 1, {0}'.format(1990 - age), {}), ('{0} GP'.format(age * 3), {})])
+        return self.__table_section('roster', 'Roster', [header], rows, commented=False)
+
+    def __skaters_section(self, table_id, title, players, seed_year, commented):
+        over_header = [('', 5), ('Scoring', 3), ('', 2), ('Goals', 4), ('Assists', 3), ('Shots', 2), ('Ice Time', 2)]
+        header = ['Rk', 'Player', 'Age', 'Pos', 'GP', 'G', 'A', 'PTS', '+/-', 'PIM', 'EV', 'PP', 'SH', 'GW',
+                  'EV', 'PP', 'SH', 'S', 'S%', 'TOI', 'ATOI']
+        rows = []
+        skaters = [p for p in players if p[3] != 'G']
+        for rank, (player_id, name, age, position) in enumerate(skaters, start=1):
+            rng = self.__random(player_id, seed_year, table_id)
+            goals, shots = rng.randint(0, 45), rng.randint(45, 320)
+            rows.append([(rank, {}), self.__player_cell(player_id, name), (age, {}), (position, {}),
+                         (rng.randint(10, 82), {}), (goals, {}), (rng.randint(0, 60), {}), (rng.randint(0, 100), {}),
+                         (rng.randint(-20, 30), {}), (rng.randint(0, 120), {}), (goals // 2, {}), (goals // 3, {}),
+                         (goals // 10, {}), (goals // 8, {}), (rng.randint(0, 30), {}), (rng.randint(0, 20), {}),
+                         (rng.randint(0, 3), {}), (shots, {}), ('{0:.1f}'.format(100.0 * goals / shots), {}),
+                         (rng.randint(200, 1800), {}), ('{0}:{1:02d}'.format(rng.randint(8, 24), rng.randint(0, 59)),
+                                                        {})])
+        footer = [[('', {}), ('Team Total', {})] + [('', {})] * (len(header) - 2)]
+        return self.__table_section(table_id, title, [header], rows, commented, over_header=over_header,
+                                    footer=footer)
+
+    def __goalies_section(self, table_id, title, players, seed_year, commented):
+        header = ['Rk', 'Player', 'Age', 'GP', 'GS', 'W', 'L', 'T/O', 'GA', 'SA', 'SV', 'SV%', 'GAA', 'SO', 'MIN']
+        rows = []
+        goalies = [p for p in players if p[3] == 'G']
+        for rank, (player_id, name, age, position) in enumerate(goalies, start=1):
+            rng = self.__random(player_id, seed_year, table_id)
+            shots = rng.randint(300, 2000)
+            saves = shots - rng.randint(20, 200)
+            rows.append([(rank, {}), self.__player_cell(player_id, name), (age, {})] +
+                        [(rng.randint(1, 70), {}) for _ in range(5)] +
+                        [(shots - saves, {}), (shots, {}), (saves, {}), ('{0:.3f}'.format(saves / shots)[1:], {}),
+                         ('{0:.2f}'.format(rng.uniform(1.8, 4.0)), {}), (rng.randint(0, 8), {}),
+                         (rng.randint(500, 4000), {})])
+        return self.__table_section(table_id, title, [header], rows, commented)
+
+    def __simple_section(self, table_id, title, players, seed_year, stats):
+        header = ['Rk', 'Player', 'Age', 'Pos'] + stats
+        rows = []
+        for rank, (player_id, name, age, position) in enumerate(players, start=1):
+            rng = self.__random(player_id, seed_year, table_id)
+            rows.append([(rank, {}), self.__player_cell(player_id, name), (age, {}), (position, {})] +
+                        [('{0:.1f}'.format(rng.uniform(0, 60)), {}) for _ in stats])
+        return self.__table_section(table_id, title, [header], rows, commented=True)
+
+    def __players(self, abbrev, year):
+        # (player id, name, age, position); a few players stay with a team for several seasons, like the real thing
+        players = []
+        for slot in range(22):
+            rng = self.__random(abbrev, year // 4, slot)
+            last_name = ''.join(rng.choice('abcdefghiklmnoprstuvwy') for _ in range(rng.randint(4, 8)))
+            first_name = ''.join(rng.choice('abcdefghiklmnoprstuvwy') for _ in range(rng.randint(3, 6)))
+            player_id = '{0}{1}0{2}'.format(last_name[:5], first_name[:2], slot % 9 + 1)
+            position = 'G' if slot >= 20 else FixtureSite._positions[slot % len(FixtureSite._positions)]
+            players.append((player_id, '{0} {1}'.format(first_name.title(), last_name.title()),
+                            rng.randint(19, 33) + year % 4, position))
+        return players
+
+    @staticmethod
+    def __player_cell(player_id, name):
+        link = '<a href="/players/{0}/{1}.html">{2}</a>'.format(player_id[0], player_id, html.escape(name))
+        return link, {'data-append-csv': player_id, 'data-stat': 'player'}
+
+    @staticmethod
+    def __table_section(table_id, title, headers, rows, commented, over_header=None, footer=None, wrapper_id=None):
+        wrapper_id = wrapper_id or 'all_{0}'.format(table_id)
+
+        thead = ''
+        if over_header:
+            thead += '<tr class="over_header">' + ''.join('<th colspan="{1}">{0}</th>'.format(html.escape(t), span)
+                                                          for t, span in over_header) + '</tr>'
+        for header in headers:
+            thead += '<tr>' + ''.join('<th>{0}</th>'.format(html.escape(h)) for h in header) + '</tr>'
+
+        tbody = ''
+        for i, row in enumerate(rows):
+            if i and i % 20 == 0:  # the site repeats the header every 20 rows
+                tbody += '<tr class="thead">' + ''.join('<th>{0}</th>'.format(html.escape(h))
+                                                        for h in headers[-1]) + '</tr>'
+            tbody += '<tr>' + ''.join(FixtureSite.__cell(j, value, attrs) for j, (value, attrs) in enumerate(row))
+            tbody += '</tr>'
+
+        tfoot = ''
+        for row in footer or []:
+            tfoot += '<tr>' + ''.join(FixtureSite.__cell(j, v, a) for j, (v, a) in enumerate(row)) + '</tr>'
+
+        table = ('<div class="table_outer_container"><div class="overthrow table_container">'
+                 '<table class="sortable stats_table" id="{0}"><caption>{1}</caption><thead>{2}</thead>'
+                 '<tbody>{3}</tbody><tfoot>{4}</tfoot></table></div></div>'
+                 .format(table_id, html.escape(title), thead, tbody, tfoot))
+        if commented:
+            table = '<div class="placeholder"></div><!--\n{0}\n-->'.format(table)
+
+        return ('<div id="{0}" class="table_wrapper">'
+                '<div class="section_heading"><h2>{1}</h2><div><ul><li class="hasmore"><span>Share &amp; more</span>'
+                '<div><ul><li><button>Modify &amp; Share Table</button></li><li><button>Get table as HTML</button></li>'
+                '<li><button>Get Link to Table</button></li><li><button onclick="sr_get_csv(\'{0}\')">'
+                'Get as CSV (for Excel)</button></li></ul></div></li></ul></div></div>{2}</div>'
+                .format(wrapper_id, html.escape(title), table))
+
+    @staticmethod
+    def __cell(index, value, attrs):
+        tag = 'th' if index == 0 else 'td'
+        attributes = ''.join(' {0}="{1}"'.format(k, html.escape(str(v))) for k, v in attrs.items())
+        return '<{0}{1}>{2}</{0}>'.format(tag, attributes, value)
+
+    @staticmethod
+    def __page(title, body):
+        return ('<!DOCTYPE html><html><head><title>{0} | Hockey-Reference.com</title>{1}</head>'
+                '<body><div id="wrap"><div id="content">{2}</div></div></body></html>'
+                .format(html.escape(title), FixtureSite._csv_script, body))
+
+    def __is_franchise(self, abbrev):
+        return abbrev in dict(self.franchises)
+
+    def __is_season(self, year):
+        return self.first_year <= year <= self.last_year
+
+    def __random(self, *parts):
+        return random.Random('{0}:{1}'.format(self.seed, ':'.join(str(p) for p in parts)))
+
+
+class FixtureServer:
+    """Serves a FixtureSite on localhost, with ETags so conditional requests get a 304 like they would for real.
+    GET /_fixture/requests returns how many pages have been asked for so far (not counting itself)."""
+
+    requests_path = '/_fixture/requests'
+
+    def __init__(self, site, port=0):
+        self.site = site
+        self.requests = 0
+        self.__lock = threading.Lock()
+        self.__pages = {}
+        self.__server = ThreadingHTTPServer(('127.0.0.1', port), self.__handler())
+        self.__thread = None
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{0}'.format(self.__server.server_port)
+
+    def start(self):
+        self.__thread = threading.Thread(target=self.__server.serve_forever, daemon=True)
+        self.__thread.start()
+        return self.url
+
+    def stop(self):
+        self.__server.shutdown()
+        self.__server.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def page(self, path):
+        with self.__lock:
+            self.requests += 1
+            if path not in self.__pages:
+                body = self.site.page(path)
+                self.__pages[path] = body.encode('utf-8') if body is not None else None
+            return self.__pages[path]
+
+    def __handler(self):
+        fixture_server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == FixtureServer.requests_path:
+                    body = str(fixture_server.requests).encode('utf-8')
+                    self.send_response(200)
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+
+                body = fixture_server.page(self.path)
+                if body is None:
+                    self.send_error(404)
+                    return
+
+                etag = '"{0}"'.format(hashlib.sha1(body).hexdigest())
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('ETag', etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,167 @@
+"""Offline throughput benchmarks for HockeySeasonScraper, HockeyTeamScraper and HockeyPlayerScraper.
+
+Serves a FixtureSite on localhost and runs each scenario in its own process (so peak RSS means something),
+in a scratch directory with its own cache. Prints one line per scenario, or json with --json.
+
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --scenario teams-decade-cold --workers 8 --json
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from FixtureSite import FixtureServer, FixtureSite  # noqa: E402
+
+
+# name -> (scraper, start year, end year, warm cache?). both years are included, like --start/--end.
+# player scenarios scrape the teams first (untimed), since the player list comes from the cached rosters
+SCENARIOS = {
+    'season-single-cold': ('seasons', 2016, 2016, False),
+    'season-single-warm': ('seasons', 2016, 2016, True),
+    'seasons-decade-cold': ('seasons', 2008, 2017, False),
+    'seasons-decade-warm': ('seasons', 2008, 2017, True),
+    'teams-single-season-cold': ('teams', 2016, 2016, False),
+    'teams-single-season-warm': ('teams', 2016, 2016, True),
+    'teams-decade-cold': ('teams', 2008, 2017, False),
+    'teams-decade-warm': ('teams', 2008, 2017, True),
+    'players-decade-cold': ('players', 2008, 2017, False),
+    'players-decade-warm': ('players', 2008, 2017, True),
+}
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024.0 * 1024.0) if sys.platform == 'darwin' else peak / 1024.0  # bytes on macOS, KiB elsewhere
+
+
+def pages_served(site_url):
+    with urllib.request.urlopen(site_url + FixtureServer.requests_path) as response:
+        return int(response.read())
+
+
+def run_scenario(name, site_url, workers, teams):
+    # runs inside the child process, from inside its scratch directory
+    from CrawlScheduler import HostRateLimiter
+    from SportConfig import SportConfig
+    from SportsDataScraper import SportsDataScraper
+
+    scraper_kind, start_year, end_year, warm = SCENARIOS[name]
+
+    # the stand-in server is ours, so there's no need to be polite to it
+    SportsDataScraper._rate_limiter = HostRateLimiter(requests_per_minute=10 ** 7, burst=10 ** 4)
+
+    if scraper_kind == 'seasons':
+        from HockeySeasonScraper import HockeySeasonScraper as scraper_class
+    elif scraper_kind == 'players':
+        from HockeyPlayerScraper import HockeyPlayerScraper as scraper_class
+    else:
+        from HockeyTeamScraper import HockeyTeamScraper as scraper_class
+
+    if scraper_kind != 'seasons':
+        # the team list comes from the franchise pages through the browser, so hand it over up front
+        SportsDataScraper._write_cache_data(FixtureSite(teams=teams).team_identities_csv(),
+                                            os.path.join(os.path.curdir, 'cache', 'nhl', 'team_identities.csv'))
+
+    latencies = []
+
+    def scrape(scraper_class=scraper_class):
+        with scraper_class(workers=workers) as scraper:
+            scraper._config = SportConfig.NHL(site_url)
+            get_csv_tables = scraper.get_csv_tables
+
+            def timed_get_csv_tables(url, css_table_names, *args, **kwargs):
+                started = time.perf_counter()
+                ret_val = get_csv_tables(url, css_table_names, *args, **kwargs)
+                elapsed = time.perf_counter() - started
+                latencies.extend([elapsed / max(len(ret_val), 1)] * len(ret_val))
+                return ret_val
+
+            scraper.get_csv_tables = timed_get_csv_tables
+            scraper.scrape(start_year, end_year)
+
+    if scraper_kind == 'players':
+        from HockeyTeamScraper import HockeyTeamScraper
+        scrape(HockeyTeamScraper)
+        del latencies[:]
+
+    if warm:
+        scrape()
+        del latencies[:]
+
+    pages_before = pages_served(site_url)
+    started = time.perf_counter()
+    scrape()
+    elapsed = time.perf_counter() - started
+    pages = pages_served(site_url) - pages_before
+
+    return {'scenario': name,
+            'workers': workers,
+            'seconds': elapsed,
+            'pages': pages,
+            'pages_per_sec': pages / elapsed if elapsed else None,
+            'tables': len(latencies),
+            'tables_per_sec': len(latencies) / elapsed if elapsed else None,
+            'p50_table_ms': percentile(latencies, 0.50) * 1000 if latencies else None,
+            'p99_table_ms': percentile(latencies, 0.99) * 1000 if latencies else None,
+            'peak_rss_mb': peak_rss_mb()}
+
+
+def run_in_child(name, server, workers, teams):
+    with tempfile.TemporaryDirectory(prefix='scraper-bench-') as scratch:
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', name,
+                                 '--site', server.url, '--workers', str(workers), '--teams', str(teams)],
+                                cwd=scratch, check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+        return json.loads(output.strip().splitlines()[-1])
+
+
+def format_result(result):
+    def number(value, spec):
+        return format(value, spec) if value is not None else '-'
+
+    return ('{0:<26} {1:>8}s {2:>6} pages {3:>9} pages/s {4:>6} tables {5:>9} tables/s '
+            'p50 {6:>8}ms p99 {7:>8}ms peak {8:>7}MB'
+            .format(result['scenario'], number(result['seconds'], '.2f'), result['pages'],
+                    number(result['pages_per_sec'], '.1f'), result['tables'], number(result['tables_per_sec'], '.1f'),
+                    number(result['p50_table_ms'], '.2f'), number(result['p99_table_ms'], '.2f'),
+                    number(result['peak_rss_mb'], '.1f')))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help='scenario to run (repeatable); defaults to all of them')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--teams', type=int, default=8, help='how many franchises the fixture league has')
+    parser.add_argument('--json', action='store_true', help='print one json object per scenario')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--site', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_scenario(args.child, args.site, args.workers, args.teams)))
+        return
+
+    with FixtureServer(FixtureSite(teams=args.teams)) as server:
+        for name in args.scenario or sorted(SCENARIOS):
+            result = run_in_child(name, server, args.workers, args.teams)
+            print(json.dumps(result) if args.json else format_result(result))
+            sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+"""Scrape Hockey-Reference.com from the command line.
+
+    python runme.py seasons --start 1990 --end 2017 --output seasons.csv
+    python runme.py teams --start 2010 --end 2017 --output nhl_teams
+    python runme.py overview --output teams_overview.csv
+    python runme.py plan --check        # what's left to scrape, from the cache alone; exits 1 if anything is
+    python runme.py status              # how the last crawls went
+    python runme.py aggregates --shooting   # bring the rollups up to date with the cache, then show S% by age/position
+    python runme.py player kessel --table skaters   # every season of every matching player, from the player index
+
+Nothing heavy is imported until a subcommand needs it: plan and status never load selenium or pandas,
+and never start a browser, so they're cheap enough for cron jobs and monitoring checks.
+"""
+import argparse
+import os
+import sys
+
+
+def _scraper(scraper_class, args):
+    scraper = scraper_class(debug=args.debug, workers=args.workers)
+    if args.site_root:
+        from SportConfig import SportConfig
+        scraper._config = SportConfig.NHL(args.site_root)
+    return scraper
+
+
+def seasons(args):
+    from HockeySeasonScraper import HockeySeasonScraper
+
+    with _scraper(HockeySeasonScraper, args) as scraper:
+        scraper.scrape_to_file(args.output, args.start, args.end, not args.no_read_cache, not args.no_write_cache)
+    return 0
+
+
+def teams(args):
+    from HockeyTeamScraper import HockeyTeamScraper
+
+    with _scraper(HockeyTeamScraper, args) as scraper:
+        if args.team:
+            scraper.scrape_teams(args.start, args.end, args.team, not args.no_read_cache, not args.no_write_cache)
+        else:
+            scraper.scrape_to_file(args.output, args.start, args.end, not args.no_read_cache, not args.no_write_cache)
+    return 0
+
+
+def overview(args):
+    import csv
+    from HockeyTeamScraper import HockeyTeamScraper
+
+    with _scraper(HockeyTeamScraper, args) as scraper:
+        rows = scraper.get_teams_overview(not args.no_read_cache, not args.no_write_cache)
+
+    out_file = open(args.output, 'w', newline='') if args.output else sys.stdout
+    try:
+        if rows:
+            writer = csv.DictWriter(out_file, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+    finally:
+        if args.output:
+            out_file.close()
+    return 0
+
+
+def plan(args):
+    from HockeySeasonScraper import HockeySeasonScraper
+    from HockeyTeamScraper import HockeyTeamScraper
+
+    remaining = []
+    # neither scraper starts a browser or touches the network until it's asked to scrape something
+    if args.seasons or not args.teams:
+        with _scraper(HockeySeasonScraper, args) as scraper:
+            remaining += scraper.remaining_pages(args.start or scraper._config.minimum_year,
+                                                 args.end or scraper._config.maximum_year)
+    if args.teams or not args.seasons:
+        with _scraper(HockeyTeamScraper, args) as scraper:
+            try:
+                remaining += scraper.remaining_pages(args.start, args.end, args.team)
+            except LookupError as e:
+                print(e)
+                return 2
+
+    if args.verbose:
+        for year, team, page in sorted(remaining):
+            print('{0}\t{1}\t{2}'.format(year, team or '-', page))
+    pages_by_kind = {}
+    for year, team, page in remaining:
+        pages_by_kind[page] = pages_by_kind.get(page, 0) + 1
+    print('{0} pages left to scrape{1}'.format(len(remaining), ': ' + ', '.join(
+        '{0} {1}'.format(count, page) for page, count in sorted(pages_by_kind.items())) if remaining else ''))
+
+    return 1 if args.check and remaining else 0
+
+
+def status(args):
+    from CrawlManifest import CrawlManifest
+    from SportConfig import SportConfig
+
+    league_dir = os.path.join(os.path.curdir, 'cache', SportConfig.NHL().league_name)
+    manifest_filename = os.path.join(league_dir, 'crawl_manifest.sqlite3')
+    if not os.path.exists(manifest_filename):
+        print('Nothing has been scraped yet ({0} does not exist).'.format(manifest_filename))
+        return 0
+
+    manifest = CrawlManifest(manifest_filename)
+    summary = manifest.summary()
+    print('Tables: ' + ', '.join('{0} {1}'.format(count, state) for state, count in sorted(summary.items())))
+
+    unfinished = manifest.unfinished()
+    for record in unfinished[:args.limit]:
+        error = ' '.join((record.error or '').split())  # tracebacks and the like on one line
+        print('{0}\t{1}\t{2}\t{3}'.format(record.status, record.url, record.table, error))
+    if len(unfinished) > args.limit:
+        print('... and {0} more'.format(len(unfinished) - args.limit))
+
+    queue_filename = os.path.join(league_dir, 'work_queue.sqlite3')
+    if os.path.exists(queue_filename):
+        from WorkQueue import WorkQueue, format_progress
+        print('Work queue: ' + format_progress(WorkQueue(queue_filename).progress()))
+
+    return 1 if args.check and unfinished else 0
+
+
+def aggregates(args):
+    from DerivedAggregates import DerivedAggregates
+
+    derived = DerivedAggregates()
+    print('{0} tables changed since the last sync'.format(derived.sync()))
+    if args.shooting:
+        print('Age\tPos\tSeasons\tG\tS\tS%')
+        for row in derived.shooting_by_age_position(min_shots=args.min_shots):
+            # nobody took a (counted) shot before 1959-60, so old groups have goals but no S or S%
+            print('\t'.join([str(row['Age']), row['Pos'], str(row['Player Seasons'])] +
+                            ['{0:.0f}'.format(row[s]) if s in row else '' for s in ('G', 'S')] +
+                            [str(row.get('S%', ''))]))
+    return 0
+
+
+def player(args):
+    from PlayerIndex import PlayerIndex
+
+    # the scrapers keep the index current as they go; --sync catches up on anything cached some other way
+    index = PlayerIndex()
+    if args.sync:
+        index.sync()
+    players = index.find_players(args.name)
+    if not players and index.seasons(args.name):
+        players = {args.name: args.name}
+    if not players:
+        print('Nobody called "{0}" is in the index.'.format(args.name))
+        return 1
+
+    for row in index.rows(args.table, players=sorted(players)):
+        stats = ','.join('{0}={1}'.format(k, v) for k, v in row.values.items() if k not in ('Rk', 'Player') and v)
+        print('{0}\t{1}\t{2}\t{3}\t{4}'.format(row.name, row.year, row.team, row.table, stats))
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--debug', action='store_true')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--site-root', help='scrape somewhere other than www.hockey-reference.com')
+    subparsers = parser.add_subparsers(dest='command')
+
+    def add_years(subparser):
+        subparser.add_argument('--start', type=int, help='first season (default: the earliest there is)')
+        subparser.add_argument('--end', type=int, help='last season (default: the latest there is)')
+
+    def add_cache_flags(subparser):
+        subparser.add_argument('--no-read-cache', action='store_true', help='fetch everything again')
+        subparser.add_argument('--no-write-cache', action='store_true', help="don't save what's fetched")
+
+    sub = subparsers.add_parser('seasons', help='league-wide stats for each season')
+    add_years(sub)
+    add_cache_flags(sub)
+    sub.add_argument('--output', help='csv file for the combined seasons')
+    sub.set_defaults(run=seasons)
+
+    sub = subparsers.add_parser('teams', help="every team's tables for each season")
+    add_years(sub)
+    add_cache_flags(sub)
+    sub.add_argument('--team', action='append', help='only these teams (repeatable); results stay in the cache')
+    sub.add_argument('--output', help='directory for one consolidated csv per table')
+    sub.set_defaults(run=teams)
+
+    sub = subparsers.add_parser('overview', help='every franchise, active and defunct')
+    add_cache_flags(sub)
+    sub.add_argument('--output', help='csv file (default: print it)')
+    sub.set_defaults(run=overview)
+
+    sub = subparsers.add_parser('plan', help="what's left to scrape, worked out from the cache alone")
+    add_years(sub)
+    sub.add_argument('--seasons', action='store_true', help='only season pages')
+    sub.add_argument('--teams', action='store_true', help='only team pages')
+    sub.add_argument('--team', action='append', help='only these teams (repeatable)')
+    sub.add_argument('--verbose', '-v', action='store_true', help='list every page')
+    sub.add_argument('--check', action='store_true', help='exit 1 if anything is left to scrape')
+    sub.set_defaults(run=plan)
+
+    sub = subparsers.add_parser('status', help='failed and unfinished tables, and the work queue')
+    sub.add_argument('--limit', type=int, default=20, help='how many unfinished tables to list')
+    sub.add_argument('--check', action='store_true', help='exit 1 if anything failed or never finished')
+    sub.set_defaults(run=status)
+
+    sub = subparsers.add_parser('aggregates', help='update the rollups in cache/aggregates.sqlite3 from the cache')
+    sub.add_argument('--shooting', action='store_true', help='print shooting percentage by age and position')
+    sub.add_argument('--min-shots', type=int, default=0, help='leave out age/position groups with fewer shots')
+    sub.set_defaults(run=aggregates)
+
+    sub = subparsers.add_parser('player', help="a player's rows from every cached team table, via the player index")
+    sub.add_argument('name', help='part of the player\'s name, or their id (e.g. kesseph01)')
+    sub.add_argument('--table', action='append', help='only these tables (repeatable), e.g. skaters')
+    sub.add_argument('--sync', action='store_true', help='catch cache/player_index.sqlite3 up with the cache first')
+    sub.set_defaults(run=player)
+
+    args = parser.parse_args(argv)
+    if not args.command:
+        parser.print_help()
+        return 2
+    return args.run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# the modules live at the top of the repo, and the fixture site with the benchmarks
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [root, os.path.join(root, 'benchmarks')]
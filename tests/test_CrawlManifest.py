@@ -0,0 +1,49 @@
+import os
+
+from CrawlManifest import CrawlManifest
+from TableInventory import TableInventory
+
+
+def test_lookups_leave_no_empty_manifest_behind(tmp_path):
+    manifest_filename = str(tmp_path / 'cache' / 'nhl' / 'crawl_manifest.sqlite3')
+    manifest = CrawlManifest(manifest_filename)
+    url = 'https://www.hockey-reference.com/teams/PIT/2017.html'
+
+    # what plan and status do
+    assert manifest.get(url, 'skaters') is None
+    assert manifest.summary() == {}
+    assert manifest.unfinished() == []
+    assert TableInventory(str(tmp_path / 'cache' / 'nhl' / 'table_inventory.sqlite3')).tables_on(url) is None
+    assert not os.path.exists(str(tmp_path / 'cache'))
+
+    manifest.record_results(url, {'skaters': 'Rk,Player\n1,Phil Kessel\n', 'stats_toi': ''})
+    assert manifest.get(url, 'skaters').status == CrawlManifest.DONE
+    assert manifest.summary() == {CrawlManifest.DONE: 1, CrawlManifest.EMPTY: 1}
+
+
+def test_absent_table_is_remembered_by_the_manifest_not_an_empty_file(tmp_path, monkeypatch):
+    from CacheStore import FileCacheStore
+    from FixtureSite import FixtureSite
+    from HockeySeasonScraper import HockeySeasonScraper
+    from PageArchive import ArchiveBackend, PageArchive
+    from SportsDataScraper import SportsDataScraper
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(SportsDataScraper, '_cache_store', FileCacheStore())
+    site = FixtureSite(teams=1)
+    abbrev = site.franchises[0][0]
+    url = 'https://www.hockey-reference.com/teams/{0}/2000.html'.format(abbrev)
+    archive = PageArchive(str(tmp_path / 'pages'))
+    archive.put(url, site.team_page(abbrev, 2000))  # no time on ice tables before 2007-08
+    manifest = CrawlManifest(str(tmp_path / 'crawl_manifest.sqlite3'))
+    cache_filenames = {'#all_' + t: os.path.join('cache', 'nhl', 'teams', '2000', abbrev, t + '.csv')
+                       for t in ('skaters', 'stats_toi')}
+
+    with HockeySeasonScraper(backend=ArchiveBackend(archive), manifest=manifest, archive=False, inventory=False,
+                             derived=False) as scraper:
+        tables = scraper.get_csv_tables(url, list(cache_filenames), cache_filenames=cache_filenames)
+        assert tables['#all_skaters'] and tables['#all_stats_toi'] == ''
+        assert os.path.exists(cache_filenames['#all_skaters'])
+        assert not os.path.exists(cache_filenames['#all_stats_toi'])
+        assert manifest.get(url, '#all_stats_toi').status == CrawlManifest.EMPTY
+        assert not scraper.needs_fetch(url, list(cache_filenames), cache_filenames)
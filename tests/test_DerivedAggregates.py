@@ -0,0 +1,68 @@
+import sqlite3
+
+from CacheStore import CacheKey
+from DerivedAggregates import DerivedAggregates
+
+header = 'Rk,Player,Age,Pos,GP,G,A,PTS,+/-,PIM,S,TOI'
+# shots weren't counted before 1959-60, so the old line has goals but no S
+old_skaters = '\n'.join([header, '1,Old Timer\\oldtiol01,25,C,70,30,20,50,,10,,', ',Team Total,,,,30,20,50,,10,,'])
+new_skaters = '\n'.join([header, '1,New Kid\\newkine01,25,C,82,10,15,25,3,8,100,1500'])
+
+
+def aggregates(tmp_path):
+    derived = DerivedAggregates(str(tmp_path / 'aggregates.sqlite3'))
+    derived.update_many([(CacheKey('nhl', 1950, 'BOS', 'skaters'), old_skaters),
+                         (CacheKey('nhl', 2010, 'BOS', 'skaters'), new_skaters)])
+    return derived
+
+
+def test_pre_shot_era_lines_stay_in_one_age_group(tmp_path):
+    rows = aggregates(tmp_path).shooting_by_age_position()
+
+    assert rows == [{'Age': 25, 'Pos': 'C', 'Player Seasons': 2, 'G': 40.0, 'S': 100.0, 'S%': 10.0}]
+
+
+def test_a_group_with_only_pre_shot_era_lines_has_no_shots(tmp_path):
+    derived = DerivedAggregates(str(tmp_path / 'aggregates.sqlite3'))
+    derived.update(CacheKey('nhl', 1950, 'BOS', 'skaters'), old_skaters)
+
+    assert derived.shooting_by_age_position() == [{'Age': 25, 'Pos': 'C', 'Player Seasons': 1, 'G': 30.0}]
+    assert derived.shooting_by_age_position(min_shots=1) == []
+
+
+def test_old_age_position_table_is_rebuilt(tmp_path):
+    db_filename = str(tmp_path / 'aggregates.sqlite3')
+    aggregates(tmp_path)
+    conn = sqlite3.connect(db_filename)
+    conn.executescript('DROP TABLE age_position;'
+                       'CREATE TABLE age_position (league TEXT NOT NULL, table_name TEXT NOT NULL, '
+                       'age INTEGER NOT NULL, pos TEXT NOT NULL, stat TEXT NOT NULL, value REAL NOT NULL, '
+                       'player_seasons INTEGER NOT NULL, PRIMARY KEY (league, table_name, age, pos, stat));')
+    conn.close()
+
+    rows = DerivedAggregates(db_filename).shooting_by_age_position()
+    assert rows == [{'Age': 25, 'Pos': 'C', 'Player Seasons': 2, 'G': 40.0, 'S': 100.0, 'S%': 10.0}]
+
+
+def test_scraper_that_opted_out_is_left_out_of_the_rollups(tmp_path, monkeypatch):
+    from CacheStore import FileCacheStore
+    from HockeySeasonScraper import HockeySeasonScraper
+    from SportsDataScraper import SportsDataScraper
+
+    monkeypatch.chdir(tmp_path)
+    store = FileCacheStore()
+    derived = DerivedAggregates(str(tmp_path / 'aggregates.sqlite3'), cache_store=store)
+    monkeypatch.setattr(SportsDataScraper, '_cache_store', store)
+    monkeypatch.setattr(SportsDataScraper, '_aggregates', derived)
+    monkeypatch.setattr(SportsDataScraper, '_player_index', None)
+
+    # one scraper in the process tracking the rollups doesn't sign the others up too
+    with HockeySeasonScraper(archive=False, manifest=False, inventory=False) as tracked, \
+            HockeySeasonScraper(archive=False, manifest=False, inventory=False, derived=False) as untracked:
+        for scraper, year in ((untracked, 2009), (tracked, 2010)):
+            filename = store.filename_for(CacheKey('nhl', year, 'BOS', 'skaters'))
+            SportsDataScraper._write_cache_batch({filename: new_skaters}, scraper._derived)
+
+    assert [row['Year'] for row in derived.team_totals()] == [2010]
+    assert derived.sync() == 1
+    assert [row['Year'] for row in derived.team_totals()] == [2009, 2010]
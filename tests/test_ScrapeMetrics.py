@@ -0,0 +1,22 @@
+from ScrapeMetrics import ScrapeMetrics, SummarySink
+
+
+def test_summary_stays_bounded_and_exact_where_it_can_be():
+    sink = SummarySink(print_on_close=False, reservoir_size=100)
+    metrics = ScrapeMetrics([sink])
+    for i in range(1, 10001):
+        sink.record({'stage': 'http_fetch', 'seconds': i / 1000.0})
+    sink.record({'stage': 'http_fetch', 'seconds': 0.5, 'error': 'HTTPError'})
+    with metrics.span('cache_read'):
+        pass
+
+    summary = sink.summary()
+    fetches = summary['http_fetch']
+    assert fetches['count'] == 10001
+    assert fetches['errors'] == 1
+    assert abs(fetches['total'] - (50005.0 + 0.5)) < 1e-6
+    assert fetches['max'] == 10.0
+    assert len(sink._stages['http_fetch']._reservoir) == 100
+    assert 2.0 < fetches['p50'] < 8.0  # a sample of a uniform spread, so roughly the middle
+    assert summary['cache_read']['count'] == 1
+    assert summary['cache_read']['p50'] == summary['cache_read']['max']
@@ -0,0 +1,29 @@
+import pandas as pd
+
+from FixtureSite import FixtureSite
+from HttpTableBackend import HttpTableBackend
+from TableSchema import TableSchema
+
+
+def fixture_table(table_name, team='BOS', year=2013):
+    html = FixtureSite().page('/teams/{0}/{1}.html'.format(team, year))
+    return HttpTableBackend.extract_csv(html, table_name)
+
+
+def test_roster_has_no_footer_row():
+    csv_text = fixture_table('roster')
+    frame = TableSchema.csv_to_frame(csv_text, 'roster', 2013, 'BOS')
+
+    assert len(frame) == len(TableSchema.normalise_lines(csv_text, 'roster')) - 1
+    assert not frame['Player'].isin(['Team Total', 'League Average']).any()
+    assert frame['Player'].str.contains('\\\\').all()  # every row is a player
+
+
+def test_team_total_is_dropped_before_typing():
+    csv_text = fixture_table('skaters')
+    assert ',Team Total,' in csv_text
+
+    frame = TableSchema.csv_to_frame(csv_text, 'skaters', 2013, 'BOS')
+    assert not frame['Player'].isin(['Team Total']).any()
+    assert pd.api.types.is_integer_dtype(frame['GP'])
+    assert pd.api.types.is_integer_dtype(frame['G'])
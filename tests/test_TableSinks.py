@@ -0,0 +1,36 @@
+import collections
+import csv
+
+import pandas as pd
+import pytest
+
+from TableSinks import ConsolidatedCsvSink
+
+Record = collections.namedtuple('Record', ['year', 'team', 'table', 'frame'])
+
+
+def read_rows(filename):
+    with open(filename, newline='') as csv_file:
+        return list(csv.reader(csv_file))
+
+
+def test_rows_are_readable_as_they_arrive_under_a_fixed_header(tmp_path):
+    columns = {'skaters': ['Year', 'Team', 'Player', 'G', 'S']}
+    sink = ConsolidatedCsvSink(str(tmp_path), columns=columns)
+    # an old season comes out of the cache before the newest one is fetched
+    sink.write(Record(1950, 'BOS', 'skaters', pd.DataFrame({'Year': [1950], 'Team': ['BOS'], 'Player': ['a, b'],
+                                                           'G': [30]})))
+    assert read_rows(sink.filename_for('skaters')) == [columns['skaters'], ['1950', 'BOS', 'a, b', '30', '']]
+
+    sink.write(Record(2017, 'PIT', 'skaters', pd.DataFrame({'Year': [2017], 'Team': ['PIT'], 'S': [100],
+                                                           'Player': ['c'], 'G': [10]})))
+    sink.close()
+    assert read_rows(sink.filename_for('skaters'))[1:] == [['1950', 'BOS', 'a, b', '30', ''],
+                                                           ['2017', 'PIT', 'c', '10', '100']]
+
+
+def test_a_column_the_header_has_no_place_for_is_an_error(tmp_path):
+    with ConsolidatedCsvSink(str(tmp_path)) as sink:
+        sink.write(Record(2017, 'PIT', 'goalies', pd.DataFrame({'Player': ['a'], 'GA': [1]})))
+        with pytest.raises(ValueError):
+            sink.write(Record(2016, 'PIT', 'goalies', pd.DataFrame({'Player': ['b'], 'GA': [2], 'SA': [20]})))
@@ -0,0 +1,67 @@
+import threading
+
+from WebDriverPool import WebDriverPool
+
+
+class FakeDriver:
+    def __init__(self, answering=None):
+        self.answering = answering  # an Event the health check waits on, like a browser that's slow to answer
+        self.checking = threading.Event()
+        self.quit_called = False
+
+    @property
+    def current_url(self):
+        self.checking.set()
+        if self.answering is not None and not self.answering.wait(10):
+            raise RuntimeError('no answer')
+        return 'about:blank'
+
+    def quit(self):
+        self.quit_called = True
+
+
+def test_health_check_runs_without_the_lock_held():
+    answering = threading.Event()
+    slow = FakeDriver(answering)
+    drivers = [slow, FakeDriver()]
+    pool = WebDriverPool(size=2, driver_factory=lambda: drivers.pop(0))
+
+    def first_lease():
+        pool.acquire()
+        pool.release()  # slow is idle now, and its next health check hangs until answering is set
+        leased.append(pool.acquire())
+
+    leased = []
+    checking = threading.Thread(target=first_lease)
+    checking.start()
+    assert slow.checking.wait(5)
+
+    # while that thread waits on the slow browser, another one can still start a browser of its own
+    other = []
+    starting = threading.Thread(target=lambda: other.append(pool.acquire()))
+    starting.start()
+    starting.join(5)
+    assert other and not answering.is_set()
+
+    answering.set()
+    checking.join(5)
+    assert leased == [slow] and other[0] is not slow
+    assert pool.live_drivers == 2
+
+
+def test_unhealthy_idle_driver_is_replaced():
+    class DeadDriver(FakeDriver):
+        @property
+        def current_url(self):
+            raise RuntimeError('browser went away')
+
+    dead = DeadDriver()
+    drivers = [dead, FakeDriver()]
+    pool = WebDriverPool(size=1, driver_factory=lambda: drivers.pop(0))
+    with pool.lease() as driver:
+        assert driver is dead
+
+    with pool.lease() as driver:
+        assert driver is not dead
+    assert dead.quit_called
+    assert pool.live_drivers == 1
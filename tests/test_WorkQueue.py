@@ -0,0 +1,53 @@
+import os
+import sys
+
+from WorkQueue import WorkQueue
+
+
+def test_unit_whose_lease_keeps_expiring_is_given_up_on(tmp_path):
+    queue = WorkQueue(str(tmp_path / 'work_queue.sqlite3'), max_attempts=3)
+    queue.enqueue('nhl', [(2017, 'PIT', 'team')])
+
+    # a worker that leases the unit and dies before finishing it, over and over
+    for attempt in range(1, 4):
+        items = queue.lease('crashy:{0}'.format(attempt), lease_seconds=-1)
+        assert [(i.page, i.attempts) for i in items] == [('team', attempt)]
+
+    assert queue.lease('crashy:4', lease_seconds=-1) == []
+    assert queue.is_drained()
+    assert queue.progress()[WorkQueue.FAILED] == 1
+    failures = queue.failures()
+    assert [(f.team, f.attempts, f.error, f.owner) for f in failures] == [('PIT', 3, 'lease expired', None)]
+
+
+def test_expired_lease_goes_back_in_the_queue_until_then(tmp_path):
+    queue = WorkQueue(str(tmp_path / 'work_queue.sqlite3'), max_attempts=3)
+    queue.enqueue('nhl', [(2017, 'PIT', 'team')])
+
+    queue.lease('crashy', lease_seconds=-1)
+    assert queue.progress()[WorkQueue.PENDING] == 1
+    assert queue.requeue_expired() == 1
+
+    item = queue.lease('steady')[0]
+    queue.complete('steady', item.id)
+    assert queue.progress()[WorkQueue.DONE] == 1
+    assert queue.failures() == []
+
+
+def test_plan_queues_both_end_seasons(tmp_path, monkeypatch):
+    import WorkQueue as work_queue_module
+    from FixtureSite import FixtureSite
+    from SportsDataScraper import SportsDataScraper
+
+    monkeypatch.chdir(tmp_path)
+    SportsDataScraper._write_cache_data(FixtureSite(teams=2).team_identities_csv(),
+                                        os.path.join('cache', 'nhl', 'team_identities.csv'))
+    queue_filename = str(tmp_path / 'work_queue.sqlite3')
+    monkeypatch.setattr(sys, 'argv', ['WorkQueue.py', '--queue', queue_filename,
+                                      'plan', '--start', '1990', '--end', '2017', '--seasons', '--teams'])
+    work_queue_module.main()
+
+    years = {}
+    for item in WorkQueue(queue_filename).lease('planner', count=1000):
+        years.setdefault(item.page, set()).add(item.year)
+    assert years == {page: set(range(1990, 2018)) for page in ('season', 'team', 'games')}